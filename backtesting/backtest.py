@@ -2,12 +2,19 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+from instrumentation import count, elapsed, finish_run, stage, start_run
+from ledger import save_ledger
+from registry import register_ledger
+from orb_engine import trade_excursion
 
-# Carichiamo il dataset pulito
-df = pd.read_csv('./data/qqq_30Min.csv')
+start_run('backtest')
 
-# Convertiamo la colonna trading_day in datetime
-df['trading_day'] = pd.to_datetime(df['trading_day'])
+with stage('load'):
+    # Carichiamo il dataset pulito
+    df = pd.read_csv('./data/qqq_30Min.csv')
+
+    # Convertiamo la colonna trading_day in datetime
+    df['trading_day'] = pd.to_datetime(df['trading_day'])
 
 # Filtriamo solo i dati del 2024
 #df = df[df['trading_day'].dt.year > 2016]
@@ -105,6 +112,7 @@ def execute_trade(day_data, signal_type, first_candle, entry_price, stop_loss, p
         return None
 
     entry_candle = None
+    exit_candle = None
     exit_price = None
     exit_reason = 'EOD'
     
@@ -123,19 +131,23 @@ def execute_trade(day_data, signal_type, first_candle, entry_price, stop_loss, p
             if candle['low'] <= stop_loss:
                 exit_price = stop_loss
                 exit_reason = 'SL'
+                exit_candle = candle
                 break
             elif candle['high'] >= take_profit:
                 exit_price = take_profit
                 exit_reason = 'TP'
+                exit_candle = candle
                 break
         else:  # SHORT
             if candle['high'] >= stop_loss:
                 exit_price = stop_loss
                 exit_reason = 'SL'
+                exit_candle = candle
                 break
             elif candle['low'] <= take_profit:
                 exit_price = take_profit
                 exit_reason = 'TP'
+                exit_candle = candle
                 break
     
     # Se non siamo mai entrati, nessun trade
@@ -145,12 +157,20 @@ def execute_trade(day_data, signal_type, first_candle, entry_price, stop_loss, p
     # Se non abbiamo hittato stop loss, usiamo chiusura fine giornata
     if exit_reason == 'EOD':
         exit_price = candles_after_signal.iloc[-1]['close']
+        exit_candle = candles_after_signal.iloc[-1]
+
+    # MAE/MFE e candele in posizione sulla parte di giornata con il trade aperto
+    in_trade = (candles_after_signal.index >= entry_candle.name) & (candles_after_signal.index <= exit_candle.name)
+    excursion = trade_excursion(candles_after_signal['high'], candles_after_signal['low'], in_trade, signal_type, entry_price, exit_price, exit_reason)
 
     reward = abs(exit_price - entry_price)
     rr_ratio = reward / risk if risk > 0 else 0
 
     total_commission = ibkr_commission(position_size)
 
+    # Risultato lordo per unità in punti, usato da cost_model.py per ricalcolare i costi
+    gross_points = exit_price - entry_price if signal_type == 'LONG' else entry_price - exit_price
+
     # Calcolo PnL
     if signal_type == 'LONG':
         pnl = (exit_price - entry_price) * position_size - total_commission
@@ -167,7 +187,13 @@ def execute_trade(day_data, signal_type, first_candle, entry_price, stop_loss, p
         'pnl': pnl,
         'R:R': rr_ratio,
         'commission': total_commission,
+        'gross_points': gross_points,
+        'point_value': 1,
+        'mae': excursion['mae'],
+        'mfe': excursion['mfe'],
+        'bars_in_trade': excursion['bars_in_trade'],
         'entry_time': entry_candle['timestamp'] if entry_candle is not None else None,
+        'exit_time': exit_candle['timestamp'] if exit_candle is not None else None,
     }
 
 def analyze_trading_day(day_data, current_equity):
@@ -175,56 +201,61 @@ def analyze_trading_day(day_data, current_equity):
     Analizza una giornata di trading
     """
     current_date = day_data.iloc[0]['trading_day']
+    count('days')
     
-    # Troviamo i 14 giorni di trading precedenti
-    previous_dates = df[df['trading_day'] < current_date]['trading_day'].unique()
-    if len(previous_dates) < 14:
-        return None
+    with stage('atr'):
+        # Troviamo i 14 giorni di trading precedenti
+        previous_dates = df[df['trading_day'] < current_date]['trading_day'].unique()
+        if len(previous_dates) < 14:
+            return None
+            
+        # Prendiamo esattamente gli ultimi 14 giorni
+        previous_dates = sorted(previous_dates)[-14:]
+        previous_data = df[df['trading_day'].isin(previous_dates)]
         
-    # Prendiamo esattamente gli ultimi 14 giorni
-    previous_dates = sorted(previous_dates)[-14:]
-    previous_data = df[df['trading_day'].isin(previous_dates)]
-    
-    # Calcola l'ATR
-    atr_value = calculate_ATR(previous_data)
+        # Calcola l'ATR
+        atr_value = calculate_ATR(previous_data)
 
-    first_candle = day_data.iloc[0]
-    # No trade se candela Doji
-    if first_candle['open'] == first_candle['close']:
-        return None
-    
-    # Determina la direzione della candela
-    candle_direction = 'bullish' if first_candle['close'] > first_candle['open'] else 'bearish'
-    
-    # Calcola il DR (9:30-9:35) ET
-    dr = calculate_dr_for_day(first_candle)
-    if not dr:
-        return None
-    
-    # Trova le candele dopo il DR
-    candles_after_dr = day_data.iloc[2:]
-    
-    if len(candles_after_dr) == 0:
-        return None
-    
-    # Determina il tipo di trade basato sulla direzione della candela
-    if candle_direction == 'bullish':
-        signal_type = 'LONG'
-        entry_price = dr['high']
-        stop_loss = entry_price - (atr_value * 0.1)
-    else:  # bearish
-        signal_type = 'SHORT'
-        entry_price = dr['low']
-        stop_loss = entry_price + (atr_value * 0.1)
-    
-    position_size = calculate_position_size(entry_price, stop_loss, current_equity)
-    
-    if position_size == 0:
-        return None
+    with stage('signal'):
+        first_candle = day_data.iloc[0]
+        # No trade se candela Doji
+        if first_candle['open'] == first_candle['close']:
+            return None
+        
+        # Determina la direzione della candela
+        candle_direction = 'bullish' if first_candle['close'] > first_candle['open'] else 'bearish'
+        
+        # Calcola il DR (9:30-9:35) ET
+        dr = calculate_dr_for_day(first_candle)
+        if not dr:
+            return None
+        
+        # Trova le candele dopo il DR
+        candles_after_dr = day_data.iloc[2:]
+        
+        if len(candles_after_dr) == 0:
+            return None
+        
+        # Determina il tipo di trade basato sulla direzione della candela
+        if candle_direction == 'bullish':
+            signal_type = 'LONG'
+            entry_price = dr['high']
+            stop_loss = entry_price - (atr_value * 0.1)
+        else:  # bearish
+            signal_type = 'SHORT'
+            entry_price = dr['low']
+            stop_loss = entry_price + (atr_value * 0.1)
+        
+        position_size = calculate_position_size(entry_price, stop_loss, current_equity)
+        
+        if position_size == 0:
+            return None
     
     # Esegui il trade
-    trade_result = execute_trade(day_data, signal_type, first_candle, entry_price, stop_loss, position_size)
+    with stage('fills'):
+        trade_result = execute_trade(day_data, signal_type, first_candle, entry_price, stop_loss, position_size)
     if trade_result is not None:
+        count('trades')
         trade_result['date'] = day_data.iloc[0]['timestamp']
         trade_result['ATR'] = atr_value
         #trade_result['relative_volume'] = rel_vol
@@ -238,14 +269,22 @@ current_equity = STARTING_CAPITAL
 results = []
 
 # Loop principale
-for day, day_data in df.groupby('trading_day'):
-    result = analyze_trading_day(day_data, current_equity)
-    if result is not None:
-        results.append(result)
-        #current_equity += result['pnl']
+with stage('day_loop'):
+    for day, day_data in df.groupby('trading_day'):
+        result = analyze_trading_day(day_data, current_equity)
+        if result is not None:
+            results.append(result)
+            #current_equity += result['pnl']
+
+with stage('output'):
+    # Creiamo un DataFrame con i risultati
+    trading_results = pd.DataFrame(results)
 
-# Creiamo un DataFrame con i risultati
-trading_results = pd.DataFrame(results)
+    trading_results.to_csv('outputs/trading_results_30Min.csv', index=False)
+    save_ledger('outputs/trading_results_30Min.npz', trading_results, variant='backtest_30Min',
+                params={'stop_atr_mult': 0.1, 'tp_r_mult': 10, 'risk_pct': 0.01, 'starting_capital': STARTING_CAPITAL},
+                data_path='./data/qqq_30Min.csv')
+    register_ledger('outputs/trading_results_30Min.npz', wall_time=elapsed(), starting_capital=STARTING_CAPITAL)
+print(f"\nRisultati salvati in 'trading_results_TP.csv'")
 
-trading_results.to_csv('outputs/trading_results_30Min.csv', index=False)
-print(f"\nRisultati salvati in 'trading_results_TP.csv'")
\ No newline at end of file
+finish_run()
\ No newline at end of file
@@ -2,13 +2,20 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
+from instrumentation import count, elapsed, finish_run, stage, start_run
+from ledger import save_ledger
+from registry import register_ledger
+from orb_engine import trade_excursion
 
-# Carichiamo il dataset pulito
-df = pd.read_csv('./data/qqq_5Min.csv')
+start_run('backtest_IVB')
 
-# Convertiamo la colonna trading_day in datetime
-df['trading_day'] = pd.to_datetime(df['trading_day'])
-df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_localize(None)
+with stage('load'):
+    # Carichiamo il dataset pulito
+    df = pd.read_csv('./data/qqq_5Min.csv')
+
+    # Convertiamo la colonna trading_day in datetime
+    df['trading_day'] = pd.to_datetime(df['trading_day'])
+    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.tz_localize(None)
 
 # Filtriamo solo i dati del 2024
 #df = df[df['trading_day'].dt.year > 2016]
@@ -94,6 +101,7 @@ def execute_trade(candles, bias, entry_price, stop_loss, take_profit, position_s
     risk = abs(entry_price - stop_loss)
 
     entry_candle = None
+    exit_candle = None
     exit_price = None
     exit_reason = 'EOD'
     
@@ -112,19 +120,23 @@ def execute_trade(candles, bias, entry_price, stop_loss, take_profit, position_s
             if candle['low'] <= stop_loss:
                 exit_price = stop_loss
                 exit_reason = 'SL'
+                exit_candle = candle
                 break
             elif candle['high'] >= take_profit:
                 exit_price = take_profit
                 exit_reason = 'TP'
+                exit_candle = candle
                 break
         else:  # SHORT
             if candle['high'] >= stop_loss:
                 exit_price = stop_loss
                 exit_reason = 'SL'
+                exit_candle = candle
                 break
             elif candle['low'] <= take_profit:
                 exit_price = take_profit
                 exit_reason = 'TP'
+                exit_candle = candle
                 break
     
     # Se non siamo mai entrati, nessun trade
@@ -134,12 +146,20 @@ def execute_trade(candles, bias, entry_price, stop_loss, take_profit, position_s
     # Se non abbiamo hittato stop loss, usiamo chiusura fine giornata
     if exit_reason == 'EOD':
         exit_price = candles.iloc[-1]['close']
+        exit_candle = candles.iloc[-1]
+
+    # MAE/MFE e candele in posizione sulla parte di giornata con il trade aperto
+    in_trade = (candles.index >= entry_candle.name) & (candles.index <= exit_candle.name)
+    excursion = trade_excursion(candles['high'], candles['low'], in_trade, bias, entry_price, exit_price, exit_reason)
 
     reward = abs(exit_price - entry_price)
     rr_ratio = reward / risk if risk > 0 else 0
 
     total_commission = ibkr_commission(position_size)
 
+    # Risultato lordo per unità in punti, usato da cost_model.py per ricalcolare i costi
+    gross_points = exit_price - entry_price if bias == 'LONG' else entry_price - exit_price
+
     # Calcolo PnL
     if bias == 'LONG':
         pnl = (exit_price - entry_price) * position_size - total_commission
@@ -156,7 +176,13 @@ def execute_trade(candles, bias, entry_price, stop_loss, take_profit, position_s
         'pnl': pnl,
         'R:R': rr_ratio,
         'commission': total_commission,
+        'gross_points': gross_points,
+        'point_value': 1,
+        'mae': excursion['mae'],
+        'mfe': excursion['mfe'],
+        'bars_in_trade': excursion['bars_in_trade'],
         'entry_time': entry_candle['timestamp'] if entry_candle is not None else None,
+        'exit_time': exit_candle['timestamp'] if exit_candle is not None else None,
     }
 
 def analyze_trading_day(day_data, current_equity):
@@ -164,104 +190,109 @@ def analyze_trading_day(day_data, current_equity):
     Analizza una giornata di trading
     """
     current_date = day_data.iloc[0]['trading_day']
+    count('days')
     
-    # Troviamo i 14 giorni di trading precedenti
-    previous_dates = df[df['trading_day'] < current_date]['trading_day'].unique()
-    if len(previous_dates) < 14:
-        return None
+    with stage('atr'):
+        # Troviamo i 14 giorni di trading precedenti
+        previous_dates = df[df['trading_day'] < current_date]['trading_day'].unique()
+        if len(previous_dates) < 14:
+            return None
         
-    # Prendiamo esattamente gli ultimi 14 giorni
-    previous_dates = sorted(previous_dates)[-14:]
-    previous_data = df[df['trading_day'].isin(previous_dates)]
+        # Prendiamo esattamente gli ultimi 14 giorni
+        previous_dates = sorted(previous_dates)[-14:]
+        previous_data = df[df['trading_day'].isin(previous_dates)]
     
-    # Calcola l'ATR
-    atr_value = calculate_ATR(previous_data)
+        # Calcola l'ATR
+        atr_value = calculate_ATR(previous_data)
         
-    # Calcola il DR (9:30-10:00) ET
-    dr = calculate_dr_for_day(day_data)
-    if not dr:
-        return None
+    with stage('signal'):
+        # Calcola il DR (9:30-10:00) ET
+        dr = calculate_dr_for_day(day_data)
+        if not dr:
+            return None
     
-    # Trova le candele dopo le 10:30
-    target_time = pd.Timestamp(current_date.date()).replace(hour=10, minute=00)
-    candles_after_dr = day_data[day_data['timestamp'] > target_time]
+        # Trova le candele dopo le 10:30
+        target_time = pd.Timestamp(current_date.date()).replace(hour=10, minute=00)
+        candles_after_dr = day_data[day_data['timestamp'] > target_time]
     
-    if len(candles_after_dr) == 0:
-        return None
+        if len(candles_after_dr) == 0:
+            return None
     
-    # Cerca la prima rottura del DR
-    breakout_candle = None
-    confirmation_candle = None
-    bias = None
+        # Cerca la prima rottura del DR
+        breakout_candle = None
+        confirmation_candle = None
+        bias = None
     
-    for idx, candle in candles_after_dr.iterrows():
-        # Aggiorna il DR se necessario
-        if candle['high'] > dr['high'] and candle['close'] < dr['high'] and breakout_candle is None:
-            dr['high'] = candle['high']
-            dr['size'] = dr['high'] - dr['low']
-            continue
+        for idx, candle in candles_after_dr.iterrows():
+            # Aggiorna il DR se necessario
+            if candle['high'] > dr['high'] and candle['close'] < dr['high'] and breakout_candle is None:
+                dr['high'] = candle['high']
+                dr['size'] = dr['high'] - dr['low']
+                continue
             
-        if candle['low'] < dr['low'] and candle['close'] > dr['low'] and breakout_candle is None:
-            dr['low'] = candle['low']
-            dr['size'] = dr['high'] - dr['low']
-            continue
+            if candle['low'] < dr['low'] and candle['close'] > dr['low'] and breakout_candle is None:
+                dr['low'] = candle['low']
+                dr['size'] = dr['high'] - dr['low']
+                continue
 
-        # Controlla rottura sopra
-        if candle['close'] > dr['high']:
-            breakout_candle = candle
-            bias = 'LONG'
-            break
-        # Controlla rottura sotto
-        elif candle['close'] < dr['low']:
-            breakout_candle = candle
-            bias = 'SHORT'
-            break
+            # Controlla rottura sopra
+            if candle['close'] > dr['high']:
+                breakout_candle = candle
+                bias = 'LONG'
+                break
+            # Controlla rottura sotto
+            elif candle['close'] < dr['low']:
+                breakout_candle = candle
+                bias = 'SHORT'
+                break
 
-    if breakout_candle is None:
-        print(f"Nessuna candela trovata che ha rotto il dr {day_data.iloc[0]['trading_day']}")
-        return None
+        if breakout_candle is None:
+            print(f"Nessuna candela trovata che ha rotto il dr {day_data.iloc[0]['trading_day']}")
+            return None
     
-    # Trova la candela di conferma
-    breakout_index = day_data.index.get_loc(breakout_candle.name)
-    remaining_candles = day_data.iloc[breakout_index + 1:]
+        # Trova la candela di conferma
+        breakout_index = day_data.index.get_loc(breakout_candle.name)
+        remaining_candles = day_data.iloc[breakout_index + 1:]
     
-    for idx, candle in remaining_candles.iterrows():
-        if bias == 'LONG':
-            if candle['close'] > breakout_candle['high']:
-                confirmation_candle = candle
-                break
-        else:  # SHORT
-            if candle['close'] < breakout_candle['low']:
-                confirmation_candle = candle
-                break
+        for idx, candle in remaining_candles.iterrows():
+            if bias == 'LONG':
+                if candle['close'] > breakout_candle['high']:
+                    confirmation_candle = candle
+                    break
+            else:  # SHORT
+                if candle['close'] < breakout_candle['low']:
+                    confirmation_candle = candle
+                    break
     
-    if confirmation_candle is None:
-        print(f"Nessuna candela di conferma trovata per {current_date.strftime('%Y-%m-%d')}")
-        return None
+        if confirmation_candle is None:
+            print(f"Nessuna candela di conferma trovata per {current_date.strftime('%Y-%m-%d')}")
+            return None
     
-    # Calcola entry, stop loss e gestisci il take profit in base al R:R
-    if bias == 'LONG':
-        entry_price = confirmation_candle['high']
-        stop_loss = entry_price - (atr_value * 0.1)
-        take_profit = dr['high'] + dr['size']
+        # Calcola entry, stop loss e gestisci il take profit in base al R:R
+        if bias == 'LONG':
+            entry_price = confirmation_candle['high']
+            stop_loss = entry_price - (atr_value * 0.1)
+            take_profit = dr['high'] + dr['size']
 
-    else:  # SHORT
-        entry_price = confirmation_candle['low']
-        stop_loss = entry_price + (atr_value * 0.1)
-        take_profit = dr['low'] - dr['size']
+        else:  # SHORT
+            entry_price = confirmation_candle['low']
+            stop_loss = entry_price + (atr_value * 0.1)
+            take_profit = dr['low'] - dr['size']
     
-    position_size = calculate_position_size(entry_price, stop_loss, current_equity)
+        position_size = calculate_position_size(entry_price, stop_loss, current_equity)
     
-    if position_size == 0:
-        return None
+        if position_size == 0:
+            return None
     
-    # Trova le candele dopo la candela di breakout
-    breakout_index = day_data.index.get_loc(confirmation_candle.name)
-    candles_after_confirmation = day_data.iloc[breakout_index + 1:]
+    with stage('fills'):
+        # Trova le candele dopo la candela di breakout
+        breakout_index = day_data.index.get_loc(confirmation_candle.name)
+        candles_after_confirmation = day_data.iloc[breakout_index + 1:]
     
-    # Esegui il trade
-    trade_result = execute_trade(candles_after_confirmation, bias, entry_price, stop_loss, take_profit, position_size)
+        # Esegui il trade
+        trade_result = execute_trade(candles_after_confirmation, bias, entry_price, stop_loss, take_profit, position_size)
     if trade_result is not None:
+        count('trades')
         trade_result['date'] = day_data.iloc[0]['timestamp']
         trade_result['ATR'] = atr_value
         #trade_result['relative_volume'] = rel_vol
@@ -275,14 +306,22 @@ current_equity = STARTING_CAPITAL
 results = []
 
 # Loop principale
-for day, day_data in df.groupby('trading_day'):
-    result = analyze_trading_day(day_data, current_equity)
-    if result is not None:
-        results.append(result)
-        #current_equity += result['pnl']
+with stage('day_loop'):
+    for day, day_data in df.groupby('trading_day'):
+        result = analyze_trading_day(day_data, current_equity)
+        if result is not None:
+            results.append(result)
+            #current_equity += result['pnl']
+
+with stage('output'):
+    # Creiamo un DataFrame con i risultati
+    trading_results = pd.DataFrame(results)
 
-# Creiamo un DataFrame con i risultati
-trading_results = pd.DataFrame(results)
+    trading_results.to_csv('outputs/trading_results_5min_IVB.csv', index=False)
+    save_ledger('outputs/trading_results_5min_IVB.npz', trading_results, variant='backtest_5min_IVB',
+                params={'stop_atr_mult': 0.1, 'tp': 'dr_size', 'risk_pct': 0.01, 'starting_capital': STARTING_CAPITAL},
+                data_path='./data/qqq_5Min.csv')
+    register_ledger('outputs/trading_results_5min_IVB.npz', wall_time=elapsed(), starting_capital=STARTING_CAPITAL)
+print(f"\nRisultati salvati in 'trading_results_TP.csv'")
 
-trading_results.to_csv('outputs/trading_results_5min_IVB.csv', index=False)
-print(f"\nRisultati salvati in 'trading_results_TP.csv'")
\ No newline at end of file
+finish_run()
\ No newline at end of file
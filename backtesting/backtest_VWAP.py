@@ -1,17 +1,24 @@
 import pandas as pd
 from datetime import time
+from instrumentation import count, elapsed, finish_run, stage, start_run
+from ledger import save_ledger
+from registry import register_ledger
+from orb_engine import trade_excursion
 
-# Carichiamo il dataset pulito
-df = pd.read_csv('./data/qqq_1Min_cleared.csv')
+start_run('backtest_VWAP')
 
-df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+with stage('load'):
+    # Carichiamo il dataset pulito
+    df = pd.read_csv('./data/qqq_1Min_cleared.csv')
 
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
 
-# Convertiamo la colonna trading_day in datetime
-df['trading_day'] = pd.to_datetime(df['trading_day'])
 
-df['timestamp'] = df['timestamp'].dt.tz_convert('America/New_York')
-df['time'] = df['timestamp'].dt.time
+    # Convertiamo la colonna trading_day in datetime
+    df['trading_day'] = pd.to_datetime(df['trading_day'])
+
+    df['timestamp'] = df['timestamp'].dt.tz_convert('America/New_York')
+    df['time'] = df['timestamp'].dt.time
 
 # Filtriamo solo i dati del 2024
 #df = df[df['trading_day'].dt.year > 2024]
@@ -180,11 +187,18 @@ def execute_trade(day_data, bias, last_dr_candle, entry_price, stop_loss, positi
         exit_price = candles_after_signal.iloc[-1]['close']
         exit_candle = candles_after_signal.iloc[-1]
 
+    # MAE/MFE e candele in posizione sulla parte di giornata con il trade aperto
+    in_trade = (candles_after_signal.index >= entry_candle.name) & (candles_after_signal.index <= exit_candle.name)
+    excursion = trade_excursion(candles_after_signal['high'], candles_after_signal['low'], in_trade, bias, entry_price, exit_price, exit_reason)
+
     reward = abs(exit_price - entry_price)
     rr_ratio = reward / risk if risk > 0 else 0
 
     total_commission = ibkr_commission(position_size)
 
+    # Risultato lordo per unità in punti, usato da cost_model.py per ricalcolare i costi
+    gross_points = exit_price - entry_price if bias == 'LONG' else entry_price - exit_price
+
     # Calcolo PnL
     if bias == 'LONG':
         pnl = (exit_price - entry_price) * position_size - total_commission
@@ -201,6 +215,11 @@ def execute_trade(day_data, bias, last_dr_candle, entry_price, stop_loss, positi
         'pnl': pnl,
         'R:R': rr_ratio,
         'commission': total_commission,
+        'gross_points': gross_points,
+        'point_value': 1,
+        'mae': excursion['mae'],
+        'mfe': excursion['mfe'],
+        'bars_in_trade': excursion['bars_in_trade'],
         'entry_time': entry_candle['timestamp'] if entry_candle is not None else None,
         'exit_time': exit_candle['timestamp'] if exit_candle is not None else None,
         'vwap': entry_candle['vwap']
@@ -211,48 +230,53 @@ def analyze_trading_day(day_data, current_equity):
     Analizza una giornata di trading
     """
     current_date = day_data.iloc[0]['trading_day']
+    count('days')
     
-    # Troviamo i 14 giorni di trading precedenti
-    previous_dates = df[df['trading_day'] < current_date]['trading_day'].unique()
-    if len(previous_dates) < 14:
-        return None
+    with stage('atr'):
+        # Troviamo i 14 giorni di trading precedenti
+        previous_dates = df[df['trading_day'] < current_date]['trading_day'].unique()
+        if len(previous_dates) < 14:
+            return None
         
-    # Prendiamo esattamente gli ultimi 14 giorni
-    previous_dates = sorted(previous_dates)[-14:]
-    previous_data = df[df['trading_day'].isin(previous_dates)]
+        # Prendiamo esattamente gli ultimi 14 giorni
+        previous_dates = sorted(previous_dates)[-14:]
+        previous_data = df[df['trading_day'].isin(previous_dates)]
     
-    # Calcola l'ATR
-    atr_value = calculate_ATR(previous_data)
+        # Calcola l'ATR
+        atr_value = calculate_ATR(previous_data)
     
-    # Calcola il DR (9:30-10:00) ET
-    dr = calculate_dr_for_day(day_data)
-    if not dr:
-        return None
+    with stage('signal'):
+        # Calcola il DR (9:30-10:00) ET
+        dr = calculate_dr_for_day(day_data)
+        if not dr:
+            return None
 
-    first_dr_candle = day_data[day_data['time'] == time(9, 30)].iloc[0]
-    last_dr_candle = day_data[day_data['time'] == time(10, 0)].iloc[0]
+        first_dr_candle = day_data[day_data['time'] == time(9, 30)].iloc[0]
+        last_dr_candle = day_data[day_data['time'] == time(10, 0)].iloc[0]
 
-    if first_dr_candle['open'] < last_dr_candle['close']:
-        bias = 'LONG'
-    else:
-        bias = 'SHORT'
+        if first_dr_candle['open'] < last_dr_candle['close']:
+            bias = 'LONG'
+        else:
+            bias = 'SHORT'
 
-    # Determina il tipo di trade basato sulla direzione della candela
-    if bias == 'LONG':
-        entry_price = dr['high']
-        stop_loss = entry_price - (atr_value * 0.1)
-    else:  # short
-        entry_price = dr['low']
-        stop_loss = entry_price + (atr_value * 0.1)
+        # Determina il tipo di trade basato sulla direzione della candela
+        if bias == 'LONG':
+            entry_price = dr['high']
+            stop_loss = entry_price - (atr_value * 0.1)
+        else:  # short
+            entry_price = dr['low']
+            stop_loss = entry_price + (atr_value * 0.1)
     
-    position_size = calculate_position_size(entry_price, stop_loss, current_equity)
+        position_size = calculate_position_size(entry_price, stop_loss, current_equity)
     
-    if position_size == 0:
-        return None
+        if position_size == 0:
+            return None
     
     # Esegui il trade
-    trade_result = execute_trade(day_data, bias, last_dr_candle, entry_price, stop_loss, position_size)
+    with stage('fills'):
+        trade_result = execute_trade(day_data, bias, last_dr_candle, entry_price, stop_loss, position_size)
     if trade_result is not None:
+        count('trades')
         trade_result['date'] = day_data.iloc[0]['timestamp']
         trade_result['ATR'] = atr_value
         #trade_result['relative_volume'] = rel_vol
@@ -266,14 +290,22 @@ current_equity = STARTING_CAPITAL
 results = []
 
 # Loop principale
-for day, day_data in df.groupby('trading_day'):
-    result = analyze_trading_day(day_data, current_equity)
-    if result is not None:
-        results.append(result)
-        #current_equity += result['pnl']
+with stage('day_loop'):
+    for day, day_data in df.groupby('trading_day'):
+        result = analyze_trading_day(day_data, current_equity)
+        if result is not None:
+            results.append(result)
+            #current_equity += result['pnl']
+
+with stage('output'):
+    # Creiamo un DataFrame con i risultati
+    trading_results = pd.DataFrame(results)
 
-# Creiamo un DataFrame con i risultati
-trading_results = pd.DataFrame(results)
+    trading_results.to_csv('outputs/trading_results_1Min_VWAP.csv', index=False)
+    save_ledger('outputs/trading_results_1Min_VWAP.npz', trading_results, variant='backtest_1Min_VWAP',
+                params={'stop_atr_mult': 0.1, 'tp_r_mult': 6, 'risk_pct': 0.01, 'trailing': 'vwap', 'starting_capital': STARTING_CAPITAL},
+                data_path='./data/qqq_1Min_cleared.csv')
+    register_ledger('outputs/trading_results_1Min_VWAP.npz', wall_time=elapsed(), starting_capital=STARTING_CAPITAL)
+print(f"\nRisultati salvati in 'trading_results_TP.csv'")
 
-trading_results.to_csv('outputs/trading_results_1Min_VWAP.csv', index=False)
-print(f"\nRisultati salvati in 'trading_results_TP.csv'")
\ No newline at end of file
+finish_run()
\ No newline at end of file
@@ -3,15 +3,22 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import math
+from instrumentation import count, elapsed, finish_run, stage, start_run
+from ledger import save_ledger
+from registry import register_ledger
+from orb_engine import trade_excursion
 
-# Carichiamo il dataset pulito
-df = pd.read_csv('./data/MNQ_30Min.csv')
+start_run('backtest_VWAP_MNQ')
 
-# Convertiamo la colonna date in datetime
-df['timestamp'] = pd.to_datetime(df['timestamp'])
+with stage('load'):
+    # Carichiamo il dataset pulito
+    df = pd.read_csv('./data/MNQ_30Min.csv')
 
-# Estrai solo la data (senza ora) per raggruppare per giorno
-df['day'] = df['timestamp'].dt.date
+    # Convertiamo la colonna date in datetime
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+
+    # Estrai solo la data (senza ora) per raggruppare per giorno
+    df['day'] = df['timestamp'].dt.date
 
 # Filtriamo solo i dati del 2024
 #df = df[df['day'].dt.year > 2024]
@@ -170,11 +177,18 @@ def execute_trade(day_data, signal_type, first_candle, entry_price, stop_loss, p
         exit_price = candles_after_signal.iloc[-2]['close']
         exit_candle = candles_after_signal.iloc[-2]
 
+    # MAE/MFE e candele in posizione sulla parte di giornata con il trade aperto
+    in_trade = (candles_after_signal.index >= entry_candle.name) & (candles_after_signal.index <= exit_candle.name)
+    excursion = trade_excursion(candles_after_signal['high'], candles_after_signal['low'], in_trade, signal_type, entry_price, exit_price, exit_reason)
+
     reward = abs(exit_price - entry_price)
     rr_ratio = reward / risk if risk > 0 else 0
 
     total_commission = ibkr_commission(position_size)
 
+    # Risultato lordo per unità in punti, usato da cost_model.py per ricalcolare i costi
+    gross_points = exit_price - entry_price if signal_type == 'LONG' else entry_price - exit_price
+
     # Calcolo PnL
     if signal_type == 'LONG':
         pnl = (exit_price - entry_price) * position_size * 2 - total_commission
@@ -191,6 +205,11 @@ def execute_trade(day_data, signal_type, first_candle, entry_price, stop_loss, p
         'pnl': pnl,
         'R:R': rr_ratio,
         'commission': total_commission,
+        'gross_points': gross_points,
+        'point_value': 2,
+        'mae': excursion['mae'],
+        'mfe': excursion['mfe'],
+        'bars_in_trade': excursion['bars_in_trade'],
         'entry_time': entry_candle['timestamp'] if entry_candle is not None else None,
         'exit_time': exit_candle['timestamp'] if exit_candle is not None else None,
         'vwap': entry_candle['vwap']
@@ -201,56 +220,61 @@ def analyze_trading_day(day_data, current_equity):
     Analizza una giornata di trading
     """
     current_date = day_data.iloc[0]['day']
+    count('days')
     
-    # Troviamo i 14 giorni di trading precedenti
-    previous_dates = df[df['day'] < current_date]['day'].unique()
-    if len(previous_dates) < 14:
-        return None
+    with stage('atr'):
+        # Troviamo i 14 giorni di trading precedenti
+        previous_dates = df[df['day'] < current_date]['day'].unique()
+        if len(previous_dates) < 14:
+            return None
         
-    # Prendiamo esattamente gli ultimi 14 giorni
-    previous_dates = sorted(previous_dates)[-14:]
-    previous_data = df[df['day'].isin(previous_dates)]
+        # Prendiamo esattamente gli ultimi 14 giorni
+        previous_dates = sorted(previous_dates)[-14:]
+        previous_data = df[df['day'].isin(previous_dates)]
     
-    # Calcola l'ATR
-    atr_value = calculate_ATR(previous_data)
+        # Calcola l'ATR
+        atr_value = calculate_ATR(previous_data)
 
-    first_candle = day_data.iloc[0]
-    # No trade se candela Doji
-    if first_candle['open'] == first_candle['close']:
-        return None
+    with stage('signal'):
+        first_candle = day_data.iloc[0]
+        # No trade se candela Doji
+        if first_candle['open'] == first_candle['close']:
+            return None
     
-    # Determina la direzione della candela
-    candle_direction = 'bullish' if first_candle['close'] > first_candle['open'] else 'bearish'
+        # Determina la direzione della candela
+        candle_direction = 'bullish' if first_candle['close'] > first_candle['open'] else 'bearish'
     
-    # Calcola il DR (9:30-9:35) ET
-    dr = calculate_dr_for_day(first_candle)
-    if not dr:
-        return None
+        # Calcola il DR (9:30-9:35) ET
+        dr = calculate_dr_for_day(first_candle)
+        if not dr:
+            return None
     
-    # Trova le candele dopo il DR
-    candles_after_dr = day_data.iloc[2:]
+        # Trova le candele dopo il DR
+        candles_after_dr = day_data.iloc[2:]
     
-    if len(candles_after_dr) == 0:
-        return None
+        if len(candles_after_dr) == 0:
+            return None
     
-    # Determina il tipo di trade basato sulla direzione della candela
-    if candle_direction == 'bullish':
-        signal_type = 'LONG'
-        entry_price = dr['high']
-        stop_loss = round_to_quarter_down(entry_price - (atr_value * 0.1))
-    else:  # bearish
-        signal_type = 'SHORT'
-        entry_price = dr['low']
-        stop_loss = round_to_quarter_up(entry_price + (atr_value * 0.1))
+        # Determina il tipo di trade basato sulla direzione della candela
+        if candle_direction == 'bullish':
+            signal_type = 'LONG'
+            entry_price = dr['high']
+            stop_loss = round_to_quarter_down(entry_price - (atr_value * 0.1))
+        else:  # bearish
+            signal_type = 'SHORT'
+            entry_price = dr['low']
+            stop_loss = round_to_quarter_up(entry_price + (atr_value * 0.1))
     
-    position_size = calculate_position_size(entry_price, stop_loss, current_equity)
+        position_size = calculate_position_size(entry_price, stop_loss, current_equity)
     
-    if position_size == 0:
-        return None
+        if position_size == 0:
+            return None
     
     # Esegui il trade
-    trade_result = execute_trade(day_data, signal_type, first_candle, entry_price, stop_loss, position_size)
+    with stage('fills'):
+        trade_result = execute_trade(day_data, signal_type, first_candle, entry_price, stop_loss, position_size)
     if trade_result is not None:
+        count('trades')
         trade_result['timestamp'] = day_data.iloc[0]['timestamp']
         trade_result['ATR'] = atr_value
         #trade_result['relative_volume'] = rel_vol
@@ -264,14 +288,23 @@ current_equity = STARTING_CAPITAL
 results = []
 
 # Loop principale
-for day, day_data in df.groupby('day'):
-    result = analyze_trading_day(day_data, current_equity)
-    if result is not None:
-        results.append(result)
-        #current_equity += result['pnl']
+with stage('day_loop'):
+    for day, day_data in df.groupby('day'):
+        result = analyze_trading_day(day_data, current_equity)
+        if result is not None:
+            results.append(result)
+            #current_equity += result['pnl']
+
+with stage('output'):
+    # Creiamo un DataFrame con i risultati
+    trading_results = pd.DataFrame(results)
 
-# Creiamo un DataFrame con i risultati
-trading_results = pd.DataFrame(results)
+    trading_results.to_csv('outputs/trading_results_MNQ_VWAP.csv', index=False)
+    save_ledger('outputs/trading_results_MNQ_VWAP.npz', trading_results, variant='backtest_MNQ_VWAP',
+                naive_tz='America/Chicago',
+                params={'stop_atr_mult': 0.1, 'tp_r_mult': 10, 'risk_pct': 0.01, 'trailing': 'vwap', 'starting_capital': STARTING_CAPITAL},
+                data_path='./data/MNQ_30Min.csv')
+    register_ledger('outputs/trading_results_MNQ_VWAP.npz', wall_time=elapsed(), starting_capital=STARTING_CAPITAL)
+print(f"\nRisultati salvati in 'trading_results_TP.csv'")
 
-trading_results.to_csv('outputs/trading_results_MNQ_VWAP.csv', index=False)
-print(f"\nRisultati salvati in 'trading_results_TP.csv'")
\ No newline at end of file
+finish_run()
\ No newline at end of file
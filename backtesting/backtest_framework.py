@@ -120,10 +120,14 @@ class ORB5Min(Strategy):
                         print(f"\nEsecuzione LONG a {current_ny_time.time()}")
                         print(f"Entry={self.entry_price}, SL={self.stop_loss}, TP={take_profit}")
                         
-                        self.buy(size=position_size, 
-                            sl=self.stop_loss,
-                            tp=take_profit,
-                            )
+                        try:
+                            self.buy(size=position_size, 
+                                sl=self.stop_loss,
+                                tp=take_profit,
+                                )
+                        except ValueError as e:
+                            # Candela chiusa già sotto lo stop: l'ordine a mercato verrebbe chiuso subito
+                            print(f"Ordine LONG scartato: {e}")
 
                         self.trade_executed = True
                         
@@ -135,9 +139,13 @@ class ORB5Min(Strategy):
                         print(f"\nEsecuzione SHORT a {current_ny_time.time()}")
                         print(f"Entry={self.entry_price}, SL={self.stop_loss}, TP={take_profit}")
                         
-                        self.sell(size=position_size,
-                                sl=self.stop_loss,
-                                tp=take_profit)
+                        try:
+                            self.sell(size=position_size,
+                                    sl=self.stop_loss,
+                                    tp=take_profit)
+                        except ValueError as e:
+                            # Candela chiusa già sopra lo stop: l'ordine a mercato verrebbe chiuso subito
+                            print(f"Ordine SHORT scartato: {e}")
 
                         self.trade_executed = True
         
@@ -0,0 +1,158 @@
+import argparse
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from daily_series import session_days
+from ledger import LEDGER_SCHEMA, from_trading_results, read_ledger
+from metrics import STARTING_CAPITAL, TRADING_DAYS, compute_metrics
+from plotting import daily_closes
+
+def _read_any(path):
+    """
+    Ledger .npz se esiste, altrimenti il CSV normalizzato nello schema
+    """
+    npz_path = os.path.splitext(path)[0] + '.npz'
+    if os.path.exists(npz_path):
+        return read_ledger(npz_path)[0]
+    return from_trading_results(pd.read_csv(path))
+
+def load_variants(paths, max_workers=8):
+    """
+    Carica N ledger (CSV o .npz) in parallelo e li concatena con la colonna 'run'.
+    Senza ledger restituisce colonne vuote già tipizzate
+    """
+    paths = list(paths)
+    if not paths:
+        columns = {name: np.zeros(0, dtype=dtype) for name, dtype in LEDGER_SCHEMA.items()}
+        columns['run'] = np.zeros(0, dtype=np.int64)
+        return columns
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        loaded = list(pool.map(_read_any, paths))
+    columns = {name: np.concatenate([cols[name] for cols in loaded]) for name in LEDGER_SCHEMA}
+    columns['run'] = np.repeat(np.arange(len(loaded)), [len(cols['pnl']) for cols in loaded])
+    return columns
+
+def align_sessions(columns, n_runs, calendar=None):
+    """
+    Riporta tutti i ledger su un unico indice di sessioni (unione dei giorni con trade
+    ed eventuale calendario del sottostante), con join vettoriali.
+    Returns: (indice delle sessioni, matrice PnL giornaliero N x giorni, matrice direzione netta N x giorni)
+    """
+    days = session_days(columns['date'])
+    if calendar is not None:
+        index = np.union1d(np.asarray(calendar).astype('datetime64[D]'), days)
+    else:
+        index = np.unique(days)
+
+    day_idx = np.searchsorted(index, days)
+    flat = columns['run'] * len(index) + day_idx
+    size = n_runs * len(index)
+    pnl = np.bincount(flat, weights=columns['pnl'], minlength=size).reshape(n_runs, len(index))
+    direction = np.bincount(flat, weights=columns['direction'].astype(float), minlength=size)
+    trades = np.bincount(flat, minlength=size)
+    return index, pnl, np.sign(direction).reshape(n_runs, len(index)), trades.reshape(n_runs, len(index))
+
+def daily_returns(pnl, starting_capital=STARTING_CAPITAL):
+    """
+    Rendimento giornaliero di ogni variante sull'equity a inizio giornata (0 nei giorni senza trade)
+    """
+    equity_before = starting_capital + np.cumsum(pnl, axis=1) - pnl
+    return pnl / equity_before
+
+def overlap_stats(traded, direction):
+    """
+    Sovrapposizione dei giorni di trading per ogni coppia di varianti:
+    giorni in comune, indice di Jaccard e quota di giorni comuni con la stessa direzione
+    """
+    t = traded.astype(float)
+    common = t @ t.T
+    n_days = np.diag(common)
+    union = n_days[:, None] + n_days[None, :] - common
+    jaccard = np.divide(common, union, out=np.zeros_like(common), where=union > 0)
+
+    # Con una direzione (+1/-1) per giorno: stessa direzione = (prodotto + 1) / 2 sui giorni comuni
+    agree = (direction @ direction.T + common) / 2
+    same_direction = np.divide(agree, common, out=np.full_like(common, np.nan), where=common > 0)
+    return common.astype(int), jaccard, same_direction
+
+def compare(paths, names=None, starting_capital=STARTING_CAPITAL, calendar=None):
+    """
+    Confronto di N varianti allineate sullo stesso calendario di sessioni.
+    Returns: dict con 'metrics' (una riga per variante), 'correlation', 'overlap', 'jaccard',
+             'same_direction' (DataFrame N x N) e 'returns' (rendimenti giornalieri, giorni x N)
+    """
+    paths = list(paths)
+    names = names or [os.path.splitext(os.path.basename(p))[0].replace('trading_results_', '') for p in paths]
+    columns = load_variants(paths)
+    n_runs = len(paths)
+
+    index, pnl, direction, trades = align_sessions(columns, n_runs, calendar)
+    returns = daily_returns(pnl, starting_capital)
+    traded = trades > 0
+
+    # Metriche sui trade di ogni variante (run contigue nel ledger concatenato)
+    bounds = np.r_[0, np.cumsum(np.bincount(columns['run'], minlength=n_runs))]
+    rows = []
+    for i in range(n_runs):
+        part = {name: columns[name][bounds[i]:bounds[i + 1]] for name in ('pnl', 'exit_reason', 'direction', 'rr', 'commission')}
+        rows.append(compute_metrics(part, starting_capital))
+    metrics = pd.DataFrame(rows, index=names)
+
+    # Metriche sul calendario comune (giorni senza trade = rendimento 0)
+    std = returns.std(axis=1, ddof=1)
+    metrics['daily_sharpe'] = np.divide(returns.mean(axis=1), std, out=np.full(n_runs, np.nan), where=std > 0) * np.sqrt(TRADING_DAYS)
+    metrics['traded_days'] = traded.sum(axis=1)
+    metrics['exposure_pct'] = traded.mean(axis=1) * 100
+    equity = starting_capital + np.cumsum(pnl, axis=1)
+    running_max = np.maximum.accumulate(np.maximum(equity, starting_capital), axis=1)
+    metrics['daily_max_drawdown_pct'] = ((equity - running_max) / running_max * 100).min(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = np.corrcoef(returns) if n_runs > 1 else np.ones((1, 1))
+    common, jaccard, same_direction = overlap_stats(traded, direction)
+
+    def square(matrix):
+        return pd.DataFrame(matrix, index=names, columns=names)
+
+    return {
+        'metrics': metrics,
+        'correlation': square(correlation),
+        'overlap': square(common),
+        'jaccard': square(jaccard),
+        'same_direction': square(same_direction),
+        'returns': pd.DataFrame(returns.T, index=pd.DatetimeIndex(index), columns=names),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Confronto di N varianti sullo stesso calendario di sessioni')
+    parser.add_argument('ledgers', nargs='*', help='CSV o .npz dei risultati (default: outputs/trading_results_*)')
+    parser.add_argument('--calendar', default=None, help='CSV dei dati da cui prendere tutte le sessioni (es. ./data/qqq_30Min.csv)')
+    parser.add_argument('--day-col', default='trading_day')
+    parser.add_argument('--capital', type=float, default=STARTING_CAPITAL)
+    parser.add_argument('--prefix', default='outputs/comparison')
+    args = parser.parse_args()
+
+    paths = args.ledgers or sorted({os.path.splitext(p)[0] + '.csv' for pattern in ('trading_results_*.csv', 'trading_results_*.npz')
+                                    for p in glob.glob(os.path.join('outputs', pattern))})
+    if not paths:
+        parser.error("nessun ledger trovato in outputs/ (trading_results_*.csv o .npz)")
+    calendar = daily_closes(args.calendar, args.day_col)[0] if args.calendar else None
+    result = compare(paths, starting_capital=args.capital, calendar=calendar)
+
+    columns = ['total_return_pct', 'n_trades', 'win_rate', 'profit_factor', 'max_drawdown_pct',
+               'sharpe_ratio', 'daily_sharpe', 'traded_days', 'exposure_pct']
+    pd.set_option('display.width', 200)
+    print(result['metrics'][columns].to_string(float_format=lambda x: f'{x:,.2f}'))
+    if len(paths) <= 12:
+        print("\nCorrelazione dei rendimenti giornalieri:")
+        print(result['correlation'].to_string(float_format=lambda x: f'{x:.2f}'))
+        print("\nGiorni di trading in comune:")
+        print(result['overlap'].to_string())
+
+    for key in ('metrics', 'correlation', 'overlap', 'jaccard', 'same_direction'):
+        result[key].to_csv(f'{args.prefix}_{key}.csv')
+    print(f"\nRisultati di {len(paths)} varianti salvati in '{args.prefix}_*.csv'")
@@ -1,82 +1,58 @@
-import pandas as pd
-import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
-
-def getPlot(df):
-    df['cumulative_pnl'] = df['pnl'].cumsum()
-    df['equity'] = STARTING_CAPITAL + df['cumulative_pnl']
-
-    df['date'] = pd.to_datetime(df['date'])
-
-    return df['date'], df['equity']
-
-df = pd.read_csv('./data/qqq_15Min.csv')
-
-# Convertiamo la colonna trading_day in datetime
-df['trading_day'] = pd.to_datetime(df['trading_day'])
-
-trading_results_5Min = pd.read_csv('outputs/trading_results_5Min.csv')
-trading_results_15Min = pd.read_csv('outputs/trading_results_15Min.csv')
-trading_results_30Min = pd.read_csv('outputs/trading_results_30Min.csv')
-trading_results_30Min_VWAP = pd.read_csv('outputs/trading_results_30Min_VWAP.csv')
-trading_results_60Min = pd.read_csv('outputs/trading_results_60Min.csv')
+from ledger import load_trading_results
+from plotting import SAVE_DPI, buy_hold_curve, plot_decimated
 
 STARTING_CAPITAL = 50000
+COMPARISON_DATA = './data/qqq_15Min.csv'
+OUTPUT_PATH = 'outputs/equity_comparison.png'
+
+# (ledger, colore, etichetta) per ogni strategia del confronto
+STRATEGIES = [
+    ('outputs/trading_results_5Min.csv', 'blue', 'Strategia ORB 5 Minuti'),
+    ('outputs/trading_results_15Min.csv', 'red', 'Strategia ORB 15 Minuti'),
+    ('outputs/trading_results_30Min.csv', 'orange', 'Strategia ORB 30 Minuti'),
+    ('outputs/trading_results_30Min_VWAP.csv', 'purple', 'Strategia ORB 30 Minuti + VWAP'),
+    ('outputs/trading_results_60Min.csv', 'black', 'Strategia ORB 60 Minuti'),
+]
 
-# Calcola il numero di azioni acquistate all'inizio
-initial_price = df.iloc[0]['close']
-final_price = df.iloc[-1]['close']
-shares = STARTING_CAPITAL / initial_price
-
-# Calcola l'equity curve del buy & hold
-buy_hold_df = pd.DataFrame({
-    'date': df['trading_day'],
-    'equity': df['close'] * shares
-})
-
-# Creiamo il grafico
-plt.figure(figsize=(20, 10))
-sns.set_style("whitegrid")
-
-date, equity = getPlot(trading_results_5Min)
-
-plt.plot(date, equity, 
-    color='blue', linewidth=1.5, label='Strategia ORB 5 Minuti')
-
-date, equity = getPlot(trading_results_15Min)
-
-plt.plot(date, equity, 
-    color='red', linewidth=1.5, label='Strategia ORB 15 Minuti')
-
-date, equity = getPlot(trading_results_30Min)
+def getPlot(df):
+    equity = STARTING_CAPITAL + df['pnl'].cumsum()
+    return df['date'], equity
 
-plt.plot(date, equity, 
-    color='orange', linewidth=1.5, label='Strategia ORB 30 Minuti')
+def plot_comparison():
+    """
+    Equity di tutte le varianti di STRATEGIES e Buy & Hold in un unico grafico
+    """
+    # Buy & hold dai close giornalieri in cache (non da ogni candela del file a 15 minuti)
+    bh_days, bh_equity, _, _ = buy_hold_curve(COMPARISON_DATA, STARTING_CAPITAL)
 
-date, equity = getPlot(trading_results_30Min_VWAP)
-plt.plot(date, equity, 
-    color='purple', linewidth=1.5, label='Strategia ORB 30 Minuti + VWAP')
+    # Creiamo il grafico
+    fig, ax = plt.subplots(figsize=(20, 10))
+    sns.set_style("whitegrid")
 
-date, equity = getPlot(trading_results_60Min)
+    for path, color, label in STRATEGIES:
+        date, equity = getPlot(load_trading_results(path))
+        plot_decimated(ax, date, equity, color=color, linewidth=1.5, label=label)
 
-plt.plot(date, equity, 
-    color='black', linewidth=1.5, label='Strategia ORB 60 Minuti')
+    plot_decimated(ax, bh_days, bh_equity, color='green', linewidth=1.5, label='Buy & Hold')
 
-plt.plot(df['trading_day'],  buy_hold_df['equity'],
-            color='green', linewidth=1.5, label='Buy & Hold')
+    ax.axhline(y=STARTING_CAPITAL, color='r', linestyle='--', label='Capitale Iniziale')
 
-plt.axhline(y=STARTING_CAPITAL, color='r', linestyle='--', label='Capitale Iniziale')
+    ax.set_title('Confronto Strategia ORB Multi Frame vs Buy & Hold', fontsize=14, pad=20)
+    ax.set_xlabel('Data', fontsize=12)
+    ax.set_ylabel('Capitale ($)', fontsize=12)
+    ax.legend(fontsize=10)
 
-plt.title('Confronto Strategia ORB Multi Frame vs Buy & Hold', fontsize=14, pad=20)
-plt.xlabel('Data', fontsize=12)
-plt.ylabel('Capitale ($)', fontsize=12)
-plt.legend(fontsize=10)
+    ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
+    fig.autofmt_xdate()
+    ax.grid(True, linestyle='--', alpha=0.7)
+    fig.tight_layout()
 
-plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'${x:,.0f}'))
-plt.gcf().autofmt_xdate()
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.tight_layout()
+    fig.savefig(OUTPUT_PATH, dpi=SAVE_DPI, bbox_inches='tight')
+    plt.close(fig)
 
-plt.savefig('outputs/equity_comparison.png', dpi=300, bbox_inches='tight')
-plt.close()
\ No newline at end of file
+if __name__ == '__main__':
+    plot_comparison()
@@ -0,0 +1,210 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+# Scenario di costo: tutti i valori sono per unità (azione o contratto) e per lato,
+# tranne le commissioni a scaglioni che dipendono dal volume mensile.
+DEFAULT_SCENARIO = {
+    'name': 'ibkr_fixed',
+    'commission_per_unit': 0.0035,   # $ per azione/contratto (come ibkr_commission)
+    'commission_tiers': None,        # [(volume mensile da cui vale, $ per unità), ...]
+    'min_commission': 0.0,           # $ minimo per ordine
+    'max_commission_pct': None,      # tetto in % del controvalore dell'ordine (IBKR: 1%)
+    'sides': 1,                      # 1 = commissione sul solo trade (come backtest.py), 2 = entrata + uscita
+    'fee_per_contract': 0.0,         # fee exchange/regolatorie per contratto per lato (es. MNQ)
+    'spread': 0.0,                   # spread bid/ask in punti: metà pagata in entrata e metà in uscita
+    'stop_slippage': 0.0,            # slippage in punti su ogni esecuzione stop
+    'stop_slippage_atr': 0.0,        # slippage su ogni esecuzione stop in frazione di ATR
+}
+
+# Piano IBKR Tiered per azioni USA (volume mensile in azioni)
+IBKR_TIERED = [(0, 0.0035), (300_000, 0.002), (3_000_000, 0.0015), (20_000_000, 0.001), (100_000_000, 0.0005)]
+
+# Uscite eseguite con ordine stop (l'entrata ORB è sempre uno stop)
+STOP_EXITS = ('SL', 'TRAILING')
+
+def scenario(**overrides):
+    """
+    Crea uno scenario partendo da DEFAULT_SCENARIO
+    """
+    unknown = set(overrides) - set(DEFAULT_SCENARIO)
+    if unknown:
+        raise ValueError(f"Parametri di costo sconosciuti: {sorted(unknown)}")
+    return {**DEFAULT_SCENARIO, **overrides}
+
+def ledger_arrays(trading_results):
+    """
+    Estrae dal ledger gli array necessari al modello di costo.
+    I ledger senza gross_points (generati prima di questa colonna) vengono ricostruiti da entry/exit.
+    """
+    direction = np.where(trading_results['direction'].to_numpy() == 'LONG', 1.0, -1.0)
+    entry = trading_results['entry_price'].to_numpy(dtype=float)
+    exit_ = trading_results['exit_price'].to_numpy(dtype=float)
+
+    if 'gross_points' in trading_results:
+        gross_points = trading_results['gross_points'].to_numpy(dtype=float)
+    else:
+        gross_points = (exit_ - entry) * direction
+
+    if 'point_value' in trading_results:
+        point_value = trading_results['point_value'].to_numpy(dtype=float)
+    else:
+        point_value = np.ones(len(trading_results))
+
+    atr = trading_results['ATR'].to_numpy(dtype=float) if 'ATR' in trading_results else np.zeros(len(trading_results))
+
+    date_col = 'date' if 'date' in trading_results else 'timestamp'
+    month = pd.to_datetime(trading_results[date_col].astype(str).str[:10]).dt.to_period('M')
+    month_codes = pd.factorize(month)[0]
+
+    return {
+        'units': trading_results['position_size'].to_numpy(dtype=float),
+        'entry_price': entry,
+        'exit_price': exit_,
+        'gross_points': gross_points,
+        'point_value': point_value,
+        'atr': atr,
+        'stop_exit': np.isin(trading_results['exit_reason'].to_numpy(), STOP_EXITS),
+        'month': month_codes,
+    }
+
+def monthly_volume_before(units, month, sides):
+    """
+    Volume cumulato del mese precedente a ciascun trade (per gli scaglioni IBKR)
+    """
+    if len(units) == 0:
+        return np.zeros(0)  # Variante senza trade
+    traded = units * sides
+    cumulative = np.cumsum(traded)
+    month_start = np.r_[0, np.flatnonzero(np.diff(month)) + 1]
+    month_offset = np.repeat(cumulative[month_start] - traded[month_start], np.diff(np.r_[month_start, len(month)]))
+    return cumulative - traded - month_offset
+
+def commission_rate(arrays, scen):
+    """
+    Commissione per unità di ciascun trade: fissa oppure a scaglioni sul volume mensile
+    """
+    if not scen['commission_tiers']:
+        return np.full(len(arrays['units']), scen['commission_per_unit'])
+
+    thresholds = np.array([t[0] for t in scen['commission_tiers']], dtype=float)
+    rates = np.array([t[1] for t in scen['commission_tiers']], dtype=float)
+    volume = monthly_volume_before(arrays['units'], arrays['month'], scen['sides'])
+    return rates[np.searchsorted(thresholds, volume, side='right') - 1]
+
+def cost_components(arrays, scenarios):
+    """
+    Calcola le componenti di costo per N scenari e tutti i trade con broadcasting.
+    Returns: dict di matrici (N scenari x trade)
+    """
+    def column(key):
+        return np.array([s[key] for s in scenarios], dtype=float)[:, None]
+
+    units = arrays['units'][None, :]
+    point_value = arrays['point_value'][None, :]
+
+    # Commissioni per ordine con minimo e tetto percentuale (gli scaglioni dipendono dal volume)
+    rates = np.vstack([commission_rate(arrays, s) for s in scenarios])
+    commission = np.maximum(rates * units, column('min_commission'))
+    max_pct = np.array([np.inf if s['max_commission_pct'] is None else s['max_commission_pct'] for s in scenarios])
+    commission = np.minimum(commission, arrays['entry_price'][None, :] * units * point_value * max_pct[:, None])
+    commission = commission * column('sides')
+
+    fees = column('fee_per_contract') * units * 2
+
+    # Spread: metà in entrata e metà in uscita
+    spread_cost = column('spread') * units * point_value
+
+    # Slippage sugli stop: sempre in entrata, in uscita solo se è uno stop
+    slippage_points = column('stop_slippage') + column('stop_slippage_atr') * arrays['atr'][None, :]
+    slippage_cost = slippage_points * (1 + arrays['stop_exit'])[None, :] * units * point_value
+
+    gross_pnl = np.broadcast_to(arrays['gross_points'][None, :] * units * point_value, commission.shape)
+    net_pnl = gross_pnl - commission - fees - spread_cost - slippage_cost
+
+    return {
+        'gross_pnl': gross_pnl,
+        'commission': commission,
+        'fees': np.broadcast_to(fees, commission.shape),
+        'spread_cost': np.broadcast_to(spread_cost, commission.shape),
+        'slippage_cost': slippage_cost,
+        'net_pnl': net_pnl,
+    }
+
+def apply_costs(trading_results, scen=None):
+    """
+    Ricalcola costi e PnL netto di tutto il ledger con un singolo scenario.
+    Returns: DataFrame con gross_pnl, commission, fees, spread_cost, slippage_cost e net_pnl
+    """
+    components = cost_components(ledger_arrays(trading_results), [scenario(**(scen or {}))])
+    return pd.DataFrame({k: v[0] for k, v in components.items()}, index=trading_results.index)
+
+def sweep(trading_results, scenarios):
+    """
+    Applica N scenari di costo al ledger in un'unica operazione vettoriale (matrice N x trade).
+    Returns: (DataFrame riassuntivo per scenario, matrice dei PnL netti)
+    """
+    scenarios = [scenario(**s) for s in scenarios]
+    components = cost_components(ledger_arrays(trading_results), scenarios)
+    net_pnl = components['net_pnl']
+    total_costs = (components['gross_pnl'] - net_pnl).sum(axis=1)
+
+    wins = net_pnl > 0
+    gross_win = np.where(wins, net_pnl, 0).sum(axis=1)
+    gross_loss = -np.where(~wins, net_pnl, 0).sum(axis=1)
+    n_trades = max(net_pnl.shape[1], 1)
+
+    summary = pd.DataFrame({
+        'scenario': [s['name'] for s in scenarios],
+        'net_pnl': net_pnl.sum(axis=1),
+        'total_costs': total_costs,
+        'avg_trade': net_pnl.sum(axis=1) / n_trades,
+        'win_rate': wins.sum(axis=1) / n_trades * 100,
+        'profit_factor': np.divide(gross_win, gross_loss, out=np.full(len(scenarios), np.nan), where=gross_loss > 0),
+    })
+    return summary, net_pnl
+
+def default_grid(point_value=1):
+    """
+    Griglia di scenari: commissioni fisse/tiered, spread e slippage crescenti
+    """
+    tick = 0.25 if point_value > 1 else 0.01
+    scenarios = []
+    for spread_ticks in (0, 1, 2, 4, 8):
+        for slip_ticks in (0, 1, 2, 5, 10):
+            base = {'spread': spread_ticks * tick, 'stop_slippage': slip_ticks * tick}
+            if point_value > 1:
+                # Futures micro: commissione e fee per contratto
+                scenarios.append(scenario(name=f'mnq_s{spread_ticks}_sl{slip_ticks}', commission_per_unit=0.25,
+                                          fee_per_contract=0.37, sides=2, **base))
+                scenarios.append(scenario(name=f'mnq_atr_s{spread_ticks}_sl{slip_ticks}', commission_per_unit=0.25,
+                                          fee_per_contract=0.37, sides=2, stop_slippage_atr=0.005, **base))
+            else:
+                scenarios.append(scenario(name=f'fixed_s{spread_ticks}_sl{slip_ticks}', **base))
+                scenarios.append(scenario(name=f'tiered_s{spread_ticks}_sl{slip_ticks}', commission_tiers=IBKR_TIERED,
+                                          min_commission=0.35, max_commission_pct=0.01, sides=2, **base))
+    return scenarios
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sweep di scenari di costo sul ledger dei trade')
+    parser.add_argument('ledger', nargs='?', default='outputs/trading_results_30Min.csv')
+    parser.add_argument('--output', default=None, help='CSV dove salvare il riepilogo per scenario')
+    args = parser.parse_args()
+
+    trading_results = pd.read_csv(args.ledger)
+    point_value = trading_results['point_value'].iloc[0] if 'point_value' in trading_results else 1
+    scenarios = default_grid(point_value)
+
+    start = time.perf_counter()
+    summary, _ = sweep(trading_results, scenarios)
+    elapsed = time.perf_counter() - start
+
+    pd.set_option('display.width', 200)
+    print(summary.sort_values('net_pnl', ascending=False).to_string(index=False, float_format=lambda x: f'{x:,.2f}'))
+    print(f"\n{len(scenarios)} scenari su {len(trading_results)} trade in {elapsed * 1000:.1f} ms")
+
+    if args.output:
+        summary.to_csv(args.output, index=False)
+        print(f"Riepilogo salvato in '{args.output}'")
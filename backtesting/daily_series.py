@@ -0,0 +1,105 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from ledger import from_trading_results, load_trading_results
+from metrics import STARTING_CAPITAL, TRADING_DAYS
+from plotting import daily_closes
+
+def session_days(dates, tz='America/New_York'):
+    """
+    Giorno di sessione (datetime64[D]) di ogni trade a partire dalla data UTC del ledger
+    """
+    local = pd.DatetimeIndex(dates).tz_localize('UTC').tz_convert(tz).tz_localize(None)
+    return local.normalize().to_numpy().astype('datetime64[D]')
+
+def build_daily(columns, days, closes, first_close=None, starting_capital=STARTING_CAPITAL):
+    """
+    Porta il ledger sul calendario giornaliero delle sessioni (giorni senza trade = rendimento 0)
+    e affianca il benchmark dai close giornalieri.
+    Un trade in un giorno assente dal calendario viene attribuito alla sessione successiva.
+    Returns: DataFrame indicizzato per giorno con pnl, equity, return, benchmark_return, excess_return
+    """
+    calendar = np.asarray(days).astype('datetime64[D]')
+    closes = np.asarray(closes, dtype=float)
+    day_idx = np.searchsorted(calendar, session_days(columns['date']))
+    day_idx = np.minimum(day_idx, len(calendar) - 1)
+
+    pnl = np.bincount(day_idx, weights=columns['pnl'], minlength=len(calendar))
+    equity = starting_capital + np.cumsum(pnl)
+    returns = pnl / (equity - pnl)
+
+    # Il benchmark parte dal primo close disponibile (come il Buy & Hold delle analisi)
+    previous_close = np.r_[closes[0] if first_close is None else first_close, closes[:-1]]
+    benchmark = closes / previous_close - 1
+
+    return pd.DataFrame({
+        'pnl': pnl,
+        'trades': np.bincount(day_idx, minlength=len(calendar)),
+        'equity': equity,
+        'return': returns,
+        'benchmark_close': closes,
+        'benchmark_return': benchmark,
+        'excess_return': returns - benchmark,
+    }, index=pd.DatetimeIndex(calendar, name='day'))
+
+def daily_metrics(daily):
+    """
+    Metriche annualizzate su rendimenti giornalieri veri (sqrt(252) corretto anche con giorni senza trade)
+    """
+    r = daily['return'].to_numpy()
+    b = daily['benchmark_return'].to_numpy()
+    excess = daily['excess_return'].to_numpy()
+    n = len(r)
+    if n < 2:
+        return {}
+
+    def annualized_sharpe(x):
+        std = x.std(ddof=1)
+        return float(x.mean() / std * np.sqrt(TRADING_DAYS)) if std > 0 else np.nan
+
+    downside = np.sqrt(np.mean(np.minimum(r, 0) ** 2))
+    equity = daily['equity'].to_numpy()
+    start = equity[0] - daily['pnl'].iloc[0]
+    running_max = np.maximum.accumulate(np.r_[start, equity])[1:]
+    years = n / TRADING_DAYS
+    total_growth = equity[-1] / start
+    b_var = b.var(ddof=1)
+
+    return {
+        'daily_sharpe': annualized_sharpe(r),
+        'daily_sortino': float(r.mean() / downside * np.sqrt(TRADING_DAYS)) if downside > 0 else np.nan,
+        'annual_volatility_pct': float(r.std(ddof=1) * np.sqrt(TRADING_DAYS) * 100),
+        'cagr_pct': float((total_growth ** (1 / years) - 1) * 100) if total_growth > 0 else np.nan,
+        'daily_max_drawdown_pct': float(((equity - running_max) / running_max * 100).min()),
+        'exposure_pct': float((daily['trades'].to_numpy() > 0).mean() * 100),
+        'benchmark_sharpe': annualized_sharpe(b),
+        'beta': float(np.cov(r, b, ddof=1)[0, 1] / b_var) if b_var > 0 else np.nan,
+        'correlation': float(np.corrcoef(r, b)[0, 1]) if r.std() > 0 and b.std() > 0 else np.nan,
+        'information_ratio': annualized_sharpe(excess),
+    }
+
+def daily_from_files(results_path, data_path, day_col='trading_day', naive_tz='America/New_York',
+                     starting_capital=STARTING_CAPITAL):
+    """
+    Serie giornaliera di un ledger contro i close giornalieri in cache del sottostante
+    """
+    days, closes, first_close = daily_closes(data_path, day_col)
+    columns = from_trading_results(load_trading_results(results_path, naive_tz=naive_tz))
+    return build_daily(columns, days, closes, first_close, starting_capital)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rendimenti giornalieri della strategia, del benchmark e in eccesso')
+    parser.add_argument('ledger', nargs='?', default='outputs/trading_results_30Min.csv')
+    parser.add_argument('--data', default='./data/qqq_30Min.csv')
+    parser.add_argument('--day-col', default='trading_day')
+    parser.add_argument('--output', default=None, help='CSV dove salvare la serie giornaliera')
+    args = parser.parse_args()
+
+    daily = daily_from_files(args.ledger, args.data, args.day_col)
+    for key, value in daily_metrics(daily).items():
+        print(f"{key}: {value:.2f}")
+    if args.output:
+        daily.to_csv(args.output)
+        print(f"Serie giornaliera salvata in '{args.output}'")
@@ -0,0 +1,114 @@
+import argparse
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+from ledger import EXIT_REASONS, from_trading_results, load_trading_results
+from plotting import SAVE_DPI
+
+# Griglie di default: stop in frazioni dello stop originale (1.0 = 0.1 * ATR), target in R originali
+STOP_FRACTIONS = (0.25, 0.5, 0.75, 1.0)
+TARGETS_R = (1, 2, 3, 4, 5, 6, 8, 10)
+
+def excursion_r(columns):
+    """
+    MAE, MFE e risultato finale in multipli del rischio originale R = |entry - stop|.
+    Richiede un ledger con le colonne mae/mfe (schema 2).
+    """
+    risk = np.abs(columns['entry_price'] - columns['stop_loss'])
+    valid = (risk > 0) & np.isfinite(columns['mae']) & np.isfinite(columns['mfe'])
+    risk = np.where(valid, risk, np.nan)
+    return {
+        'mae_r': columns['mae'] / risk,
+        'mfe_r': columns['mfe'] / risk,
+        'result_r': columns['gross_points'] / risk,
+        'valid': valid,
+    }
+
+def stop_target_grid(columns, stop_fractions=STOP_FRACTIONS, targets_r=TARGETS_R):
+    """
+    Rivaluta ogni trade per tutte le combinazioni stop x target con il solo MAE/MFE (trade x stop x target).
+    Ipotesi conservativa: se nella giornata si toccano sia lo stop sia il target, vince lo stop.
+    Stop più larghi dell'originale o target oltre quello eseguito non sono valutabili:
+    la traiettoria dopo l'uscita reale non è nota.
+    Returns: dict di DataFrame (stop x target) con expectancy nel nuovo R, win rate e somma in R originali
+    """
+    r = excursion_r(columns)
+    mae = r['mae_r'][r['valid']][:, None, None]
+    mfe = r['mfe_r'][r['valid']][:, None, None]
+    final = r['result_r'][r['valid']][:, None, None]
+    stops = np.asarray(stop_fractions, dtype=float)[None, :, None]
+    targets = np.asarray(targets_r, dtype=float)[None, None, :]
+
+    stopped = mae >= stops
+    hit_target = ~stopped & (mfe >= targets)
+    outcome = np.where(stopped, -stops, np.where(hit_target, targets, final))
+
+    # Con size a rischio fisso, uno stop più stretto aumenta la size: risultato nel nuovo R
+    outcome_new_r = outcome / stops
+
+    def frame(values):
+        return pd.DataFrame(values, index=pd.Index(stop_fractions, name='stop (x originale)'),
+                            columns=pd.Index(targets_r, name='target (R)'))
+
+    n = max(mae.shape[0], 1)
+    return {
+        'expectancy_r': frame(outcome_new_r.sum(axis=0) / n),
+        'win_rate': frame((outcome > 0).sum(axis=0) / n * 100),
+        'total_r': frame(outcome.sum(axis=0)),
+        'stop_rate': frame(np.broadcast_to(stopped, outcome.shape).sum(axis=0) / n * 100),
+    }
+
+def efficiency_summary(columns):
+    """
+    Efficienza di uscita (risultato / MFE) e quota di MFE lasciata sul tavolo per motivo di uscita
+    """
+    r = excursion_r(columns)
+    df = pd.DataFrame({
+        'exit_reason': pd.Categorical.from_codes(columns['exit_reason'], categories=EXIT_REASONS),
+        'mae_r': r['mae_r'],
+        'mfe_r': r['mfe_r'],
+        'result_r': r['result_r'],
+        'bars_in_trade': columns['bars_in_trade'],
+    })[r['valid']]
+    df['exit_efficiency'] = np.where(df['mfe_r'] > 0, df['result_r'] / df['mfe_r'], np.nan)
+    return df.groupby('exit_reason', observed=True).agg(
+        trades=('mae_r', 'size'), mae_r=('mae_r', 'mean'), mfe_r=('mfe_r', 'mean'),
+        result_r=('result_r', 'mean'), exit_efficiency=('exit_efficiency', 'mean'),
+        bars_in_trade=('bars_in_trade', 'mean'))
+
+def plot_heatmaps(grid, title, output_path):
+    fig, axes = plt.subplots(1, 2, figsize=(20, 8))
+    sns.heatmap(grid['expectancy_r'], annot=True, fmt='.2f', cmap='RdYlGn', center=0, ax=axes[0])
+    axes[0].set_title('Expectancy per trade (nuovo R)', fontsize=12)
+    sns.heatmap(grid['win_rate'], annot=True, fmt='.1f', cmap='Blues', ax=axes[1])
+    axes[1].set_title('Win Rate (%)', fontsize=12)
+    fig.suptitle(title, fontsize=14)
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=SAVE_DPI, bbox_inches='tight')
+    plt.close(fig)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Heatmap di efficienza stop/target da MAE/MFE del ledger')
+    parser.add_argument('ledger', nargs='?', default='outputs/trading_results_30Min.csv')
+    args = parser.parse_args()
+
+    columns = from_trading_results(load_trading_results(args.ledger))
+    if not np.isfinite(columns['mae']).any():
+        raise SystemExit(f"Il ledger {args.ledger} non ha MAE/MFE: rigenera il backtest")
+
+    name = os.path.splitext(os.path.basename(args.ledger))[0].replace('trading_results_', '')
+    grid = stop_target_grid(columns)
+    plot_heatmaps(grid, f'Efficienza stop/target ORB {name}', f'outputs/excursion_{name}.png')
+    grid['expectancy_r'].to_csv(f'outputs/excursion_{name}_expectancy.csv')
+
+    pd.set_option('display.width', 200)
+    print(efficiency_summary(columns).to_string(float_format=lambda x: f'{x:.2f}'))
+    print("\nExpectancy per trade (nuovo R):")
+    print(grid['expectancy_r'].to_string(float_format=lambda x: f'{x:.2f}'))
+    print(f"\nHeatmap salvata in 'outputs/excursion_{name}.png'")
@@ -0,0 +1,176 @@
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+
+# Strumentazione disattivata di default. Con la variabile d'ambiente ORB_PROFILE:
+#   ORB_PROFILE=1             -> tempi per stadio e contatori
+#   ORB_PROFILE=cprofile      -> in più, dump cProfile dell'intera esecuzione
+#   ORB_PROFILE=pyinstrument  -> in più, report pyinstrument (se installato)
+PROFILE_MODE = os.getenv('ORB_PROFILE', '').strip().lower()
+ENABLED = PROFILE_MODE not in ('', '0', 'false', 'no')
+
+_timings = {}
+_counters = {}
+_parents = {}  # stadio -> stadio che lo contiene (None se di primo livello)
+_open = []  # stadi aperti, dal più esterno
+_run = {'name': None, 'start': None, 'profiler': None, 'clock': None}
+
+# Context manager riutilizzato quando la strumentazione è spenta (overhead quasi nullo)
+_NULL_STAGE = contextlib.nullcontext()
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        _parents.setdefault(self.name, _open[-1] if _open else None)
+        _open.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        _open.pop()
+        total, calls = _timings.get(self.name, (0.0, 0))
+        _timings[self.name] = (total + elapsed, calls + 1)
+        return False
+
+def enable(mode='1'):
+    """
+    Attiva la strumentazione da codice (es. dal benchmark)
+    """
+    global ENABLED, PROFILE_MODE
+    PROFILE_MODE = mode
+    ENABLED = True
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+def reset():
+    _timings.clear()
+    _counters.clear()
+    _parents.clear()
+    _open.clear()
+
+def stage(name):
+    """
+    Misura il tempo di un blocco: `with stage('atr'): ...`
+    """
+    if not ENABLED:
+        return _NULL_STAGE
+    return _Stage(name)
+
+def count(name, n=1):
+    """
+    Incrementa un contatore (giorni analizzati, trade, giorni scartati, ...)
+    """
+    if ENABLED:
+        _counters[name] = _counters.get(name, 0) + n
+
+def summary():
+    """
+    Returns: {'stages': {nome: {'total', 'calls', 'mean', 'parent'}}, 'counters': {...}, 'wall_time'}
+    """
+    stages = {
+        name: {'total': total, 'calls': calls, 'mean': total / calls if calls else 0.0, 'parent': _parents.get(name)}
+        for name, (total, calls) in _timings.items()
+    }
+    wall_time = time.perf_counter() - _run['start'] if _run['start'] is not None else None
+    return {'run': _run['name'], 'wall_time': wall_time, 'stages': stages, 'counters': dict(_counters)}
+
+def start_run(name):
+    """
+    Da chiamare all'inizio dello script: azzera i tempi e avvia il profiler se richiesto
+    """
+    # Il tempo totale della run è sempre disponibile (registro delle run), anche senza profilo
+    _run['clock'] = time.perf_counter()
+    if not ENABLED:
+        return
+    reset()
+    _run['name'] = name
+    _run['start'] = time.perf_counter()
+    _run['profiler'] = None
+
+    if PROFILE_MODE == 'cprofile':
+        _run['profiler'] = cProfile.Profile()
+        _run['profiler'].enable()
+    elif PROFILE_MODE == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument non installato, profilo disattivato")
+        else:
+            _run['profiler'] = Profiler()
+            _run['profiler'].start()
+
+def elapsed():
+    """
+    Secondi trascorsi da start_run (None se non chiamato)
+    """
+    if _run['clock'] is None:
+        return None
+    return time.perf_counter() - _run['clock']
+
+def finish_run(output_dir='outputs'):
+    """
+    Da chiamare alla fine dello script: stampa il riepilogo per stadio e salva i dump
+    """
+    if not ENABLED or _run['name'] is None:
+        return None
+
+    profiler = _run['profiler']
+    base_path = os.path.join(output_dir, f"profile_{_run['name']}")
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profiler.dump_stats(base_path + '.prof')
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(30)
+        with open(base_path + '_cprofile.txt', 'w') as f:
+            f.write(stream.getvalue())
+    elif profiler is not None:
+        profiler.stop()
+        with open(base_path + '_pyinstrument.html', 'w') as f:
+            f.write(profiler.output_html())
+
+    result = summary()
+    print_summary(result)
+    with open(base_path + '_stages.json', 'w') as f:
+        json.dump(result, f, indent=2)
+    _run['name'] = None
+    return result
+
+def print_summary(result=None):
+    if result is None:
+        result = summary()
+
+    print(f"\n--- Tempi per stadio ({result['run']}) ---")
+    stages = result['stages']
+
+    def parent_of(s):
+        # JSON salvati prima del campo 'parent': tutti di primo livello
+        return s.get('parent') if s.get('parent') in stages else None
+
+    wall_time = result['wall_time'] or sum(s['total'] for s in stages.values() if parent_of(s) is None)
+
+    # Gli stadi annidati (es. atr/signal/fills dentro day_loop) sono in % dello stadio che li contiene:
+    # le percentuali di primo livello sommano al più al 100% del tempo totale
+    def print_stages(parent, total, depth):
+        children = [(name, s) for name, s in stages.items() if parent_of(s) == parent]
+        for name, s in sorted(children, key=lambda item: -item[1]['total']):
+            share = s['total'] / total * 100 if total else 0
+            label = '  ' * depth + name
+            print(f"{label:<12} {s['total']:9.3f}s  {share:5.1f}%  chiamate={s['calls']:<7} media={s['mean'] * 1000:.3f}ms")
+            print_stages(name, s['total'], depth + 1)
+
+    print_stages(None, wall_time, 0)
+    if result['wall_time'] is not None:
+        print(f"{'totale':<12} {result['wall_time']:9.3f}s")
+    for name, value in result['counters'].items():
+        print(f"{name}: {value}")
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Formato binario del ledger: un file .npz con una colonna tipizzata per array
+# e i metadati della run (parametri, fingerprint dei dati, versione) in JSON.
+LEDGER_SCHEMA_VERSION = 2
+
+LEDGER_SCHEMA = {
+    'date': 'datetime64[ns]',         # inizio della sessione (UTC)
+    'entry_time': 'datetime64[ns]',   # UTC
+    'exit_time': 'datetime64[ns]',    # UTC, NaT se non registrato
+    'direction': 'int8',              # +1 LONG, -1 SHORT
+    'exit_reason': 'int8',            # indice in EXIT_REASONS
+    'entry_price': 'float64',
+    'exit_price': 'float64',
+    'stop_loss': 'float64',
+    'position_size': 'float64',
+    'pnl': 'float64',
+    'commission': 'float64',
+    'rr': 'float64',
+    'atr': 'float64',
+    'gross_points': 'float64',
+    'point_value': 'float64',
+    'vwap': 'float64',
+    'mae': 'float64',                 # massima escursione avversa in punti (>= 0)
+    'mfe': 'float64',                 # massima escursione favorevole in punti (>= 0)
+    'bars_in_trade': 'int32',         # candele con la posizione aperta (entrata e uscita comprese)
+}
+
+# EXTERNAL: posizione chiusa fuori dal bracket e non a fine giornata (chiusura manuale, liquidazione del broker)
+EXIT_REASONS = ('SL', 'TP', 'EOD', 'TRAILING', 'EXTERNAL')
+
+# Nomi delle colonne nei CSV dei backtest -> nomi nello schema
+CSV_COLUMNS = {'timestamp': 'date', 'R:R': 'rr', 'ATR': 'atr'}
+FRAME_COLUMNS = {'rr': 'R:R', 'atr': 'ATR'}
+
+META_KEY = '__meta__'
+_engine_version = None
+
+def engine_version():
+    """
+    Versione del motore di backtest: commit git corrente (se disponibile)
+    """
+    global _engine_version
+    if _engine_version is None:
+        try:
+            _engine_version = subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.DEVNULL, text=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            _engine_version = 'unknown'
+    return _engine_version
+
+def data_fingerprint(path, block_size=4 * 1024 * 1024):
+    """
+    SHA1 del contenuto del file di dati usato dal backtest
+    """
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def _has_tz(value):
+    if isinstance(value, str):
+        return re.search(r'([+-]\d\d:?\d\d|Z)$', value.strip()) is not None
+    return getattr(value, 'tzinfo', None) is not None
+
+def _to_utc(series, naive_tz):
+    """
+    Converte timestamp (stringhe con offset misti, Timestamp o naive) in datetime64 UTC senza tz
+    """
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        parsed = series
+    else:
+        valid = series.dropna()
+        if len(valid) > 0 and _has_tz(valid.iloc[0]):
+            parsed = pd.to_datetime(series, utc=True)
+        else:
+            parsed = pd.to_datetime(series).dt.tz_localize(naive_tz, ambiguous='NaT', nonexistent='NaT')
+    return parsed.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy(dtype='datetime64[ns]')
+
+def _empty_column(dtype, n):
+    if dtype.startswith('datetime'):
+        return np.full(n, np.datetime64('NaT'), dtype=dtype)
+    return np.full(n, np.nan if dtype == 'float64' else 0, dtype=dtype)
+
+def from_trading_results(trading_results, naive_tz='America/New_York'):
+    """
+    Normalizza il DataFrame dei risultati (qualsiasi variante) nelle colonne tipizzate dello schema.
+    I timestamp senza fuso orario sono interpretati in naive_tz (es. 'America/Chicago' per MNQ da IB).
+    """
+    df = trading_results.rename(columns=CSV_COLUMNS)
+    n = len(df)
+    columns = {}
+    for name, dtype in LEDGER_SCHEMA.items():
+        if name not in df:
+            columns[name] = _empty_column(dtype, n)
+        elif dtype.startswith('datetime'):
+            columns[name] = _to_utc(df[name], naive_tz) if n else np.array([], dtype=dtype)
+        elif name == 'direction':
+            columns[name] = np.where(df[name].to_numpy() == 'LONG', 1, -1).astype(dtype)
+        elif name == 'exit_reason':
+            codes = pd.Categorical(df[name], categories=EXIT_REASONS).codes
+            columns[name] = codes.astype(dtype)
+        else:
+            columns[name] = df[name].to_numpy(dtype=dtype)
+    return columns
+
+def to_frame(columns, tz='America/New_York'):
+    """
+    DataFrame con i nomi colonna dei CSV (date, R:R, ATR, ...) e timestamp già convertiti in tz
+    """
+    df = pd.DataFrame({name: columns[name] for name in columns if name in LEDGER_SCHEMA})
+    for name, dtype in LEDGER_SCHEMA.items():
+        if dtype.startswith('datetime') and name in df:
+            df[name] = df[name].dt.tz_localize('UTC').dt.tz_convert(tz)
+    df['direction'] = np.where(df['direction'] > 0, 'LONG', 'SHORT')
+    df['exit_reason'] = pd.Categorical.from_codes(df['exit_reason'], categories=EXIT_REASONS).astype(str)
+    return df.rename(columns=FRAME_COLUMNS)
+
+def build_meta(variant=None, params=None, data_path=None, **extra):
+    meta = {
+        'schema_version': LEDGER_SCHEMA_VERSION,
+        'engine_version': engine_version(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'variant': variant,
+        'params': params or {},
+        'data_path': data_path,
+        'data_fingerprint': data_fingerprint(data_path) if data_path and os.path.exists(data_path) else None,
+    }
+    meta.update(extra)
+    return meta
+
+def _write(path, columns, meta):
+    # Scrittura atomica: file temporaneo e poi rename
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **columns, **{META_KEY: np.array(json.dumps(meta, default=str))})
+    os.replace(tmp_path, path)
+
+def save_ledger(path, trading_results, naive_tz='America/New_York', **meta):
+    """
+    Salva il ledger tipizzato (.npz) con i metadati della run
+    """
+    columns = from_trading_results(trading_results, naive_tz)
+    _write(path, columns, build_meta(**meta))
+    return path
+
+def read_ledger(path):
+    """
+    Returns: (dict di array tipizzati, metadati)
+    I ledger con uno schema precedente ricevono le colonne mancanti vuote (NaN, 0 o NaT).
+    """
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data[META_KEY]))
+        columns = {name: data[name] for name in data.files if name != META_KEY}
+    n = len(columns['pnl'])
+    for name, dtype in LEDGER_SCHEMA.items():
+        if name not in columns:
+            columns[name] = _empty_column(dtype, n)
+    return columns, meta
+
+def append_ledger(path, trading_results, naive_tz='America/New_York', **meta):
+    """
+    Aggiunge trade a un ledger esistente (o lo crea). I metadati originali vengono mantenuti.
+    """
+    if not os.path.exists(path):
+        return save_ledger(path, trading_results, naive_tz, **meta)
+
+    columns, old_meta = read_ledger(path)
+    if old_meta.get('schema_version', 0) > LEDGER_SCHEMA_VERSION:
+        raise ValueError(f"Schema del ledger {path} non compatibile: {old_meta.get('schema_version')}")
+
+    new_columns = from_trading_results(trading_results, naive_tz)
+    merged = {name: np.concatenate([columns[name], new_columns[name]]) for name in LEDGER_SCHEMA}
+    old_meta['schema_version'] = LEDGER_SCHEMA_VERSION
+    old_meta['appends'] = old_meta.get('appends', 0) + 1
+    old_meta['updated'] = datetime.now().isoformat(timespec='seconds')
+    _write(path, merged, old_meta)
+    return path
+
+def load_ledger(path, tz='America/New_York'):
+    """
+    Returns: (DataFrame con le colonne dei CSV, metadati)
+    """
+    columns, meta = read_ledger(path)
+    return to_frame(columns, tz), meta
+
+def load_trading_results(csv_path, tz='America/New_York', naive_tz='America/New_York'):
+    """
+    Carica i risultati di un backtest: usa il ledger .npz accanto al CSV se esiste,
+    altrimenti legge il CSV e normalizza colonne e timestamp nello stesso formato.
+    """
+    ledger_path = os.path.splitext(csv_path)[0] + '.npz'
+    if os.path.exists(ledger_path):
+        return load_ledger(ledger_path, tz)[0]
+    return to_frame(from_trading_results(pd.read_csv(csv_path), naive_tz), tz)
+
+def load_ledgers(paths, max_workers=8):
+    """
+    Carica molti ledger in parallelo e li concatena colonna per colonna.
+    Returns: (dict di array con la colonna 'run' = indice del ledger, lista dei metadati)
+    """
+    paths = list(paths)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        loaded = list(pool.map(read_ledger, paths))
+
+    metas = [meta for _, meta in loaded]
+    if not loaded:
+        return {name: np.array([], dtype=dtype) for name, dtype in LEDGER_SCHEMA.items()}, metas
+
+    columns = {name: np.concatenate([cols[name] for cols, _ in loaded]) for name in LEDGER_SCHEMA}
+    columns['run'] = np.repeat(np.arange(len(loaded)), [len(cols['pnl']) for cols, _ in loaded])
+    return columns, metas
@@ -0,0 +1,267 @@
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ledger import EXIT_REASONS, from_trading_results, read_ledger
+
+STARTING_CAPITAL = 50000
+TRADING_DAYS = 252
+
+def streak_stats(is_win):
+    """
+    Serie consecutive di trade vincenti/perdenti con run-length encoding
+    """
+    if len(is_win) == 0:
+        return {'max_winning_streak': 0, 'avg_winning_streak': 0.0, 'max_losing_streak': 0, 'avg_losing_streak': 0.0}
+
+    change = np.flatnonzero(np.diff(is_win.astype(np.int8))) + 1
+    starts = np.r_[0, change]
+    lengths = np.diff(np.r_[starts, len(is_win)])
+    winning = lengths[is_win[starts]]
+    losing = lengths[~is_win[starts]]
+
+    return {
+        'max_winning_streak': int(winning.max()) if len(winning) else 0,
+        'avg_winning_streak': float(winning.mean()) if len(winning) else 0.0,
+        'max_losing_streak': int(losing.max()) if len(losing) else 0,
+        'avg_losing_streak': float(losing.mean()) if len(losing) else 0.0,
+    }
+
+def compute_metrics(columns, starting_capital=STARTING_CAPITAL, buy_hold=None):
+    """
+    Calcola tutte le statistiche di analyze_backtest.py in un solo passaggio sugli array del ledger.
+    columns: dict di array nello schema di ledger.py (pnl, exit_reason, direction, rr, commission)
+    buy_hold: (primo close, ultimo close) del sottostante per il confronto Buy & Hold
+    Returns: dict di valori numerici (la formattazione è in format_stats)
+    """
+    pnl = np.asarray(columns['pnl'], dtype=float)
+    n = len(pnl)
+    m = {'starting_capital': float(starting_capital), 'n_trades': n}
+    if n == 0:
+        return m
+
+    cumulative_pnl = np.cumsum(pnl)
+    equity = starting_capital + cumulative_pnl
+    is_win = pnl > 0
+
+    n_wins = int(is_win.sum())
+    win_pnl = pnl[is_win]
+    loss_pnl = pnl[~is_win]
+    gross_win = float(win_pnl.sum())
+    gross_loss = float(loss_pnl.sum())
+
+    m.update({
+        'final_equity': float(equity[-1]),
+        'total_profit': float(cumulative_pnl[-1]),
+        'total_return_pct': float((equity[-1] / starting_capital - 1) * 100),
+        'n_wins': n_wins,
+        'n_losses': n - n_wins,
+        'win_rate': n_wins / n * 100,
+        'avg_win': float(win_pnl.mean()) if n_wins else np.nan,
+        'max_win': float(win_pnl.max()) if n_wins else np.nan,
+        'avg_loss': float(loss_pnl.mean()) if n_wins < n else np.nan,
+        'max_loss': float(loss_pnl.min()) if n_wins < n else np.nan,
+        'profit_factor': gross_win / abs(gross_loss) if gross_loss < 0 else np.nan,
+        'avg_rr': float(np.mean(columns['rr'])),
+        'total_commission': float(np.sum(columns['commission'])),
+    })
+
+    # Uscite e direzioni con bincount sui codici del ledger
+    # -1 (motivo non riconosciuto dal ledger) resta fuori dal bincount e viene contato a parte
+    codes = np.asarray(columns['exit_reason'], dtype=np.int64)
+    known = codes >= 0
+    exit_counts = np.bincount(codes[known], minlength=len(EXIT_REASONS))
+    for code, reason in enumerate(EXIT_REASONS):
+        m[f'exits_{reason}'] = int(exit_counts[code])
+        m[f'exits_{reason}_pct'] = exit_counts[code] / n * 100
+    m['exits_unknown'] = int(n - known.sum())
+    m['exits_unknown_pct'] = m['exits_unknown'] / n * 100
+    n_long = int((np.asarray(columns['direction']) > 0).sum())
+    m.update({'n_long': n_long, 'n_short': n - n_long, 'long_pct': n_long / n * 100, 'short_pct': (n - n_long) / n * 100})
+
+    # Drawdown massimo sull'equity per trade
+    running_max = np.maximum.accumulate(equity)
+    m['max_drawdown_pct'] = float(((equity - running_max) / running_max * 100).min())
+
+    # Sharpe Ratio (approssimato): rendimento di ogni trade sul capitale prima del trade
+    if n > 1:
+        capital_before = starting_capital + np.r_[0.0, cumulative_pnl[:-1]]
+        returns = pnl / capital_before
+        std = returns.std(ddof=1)
+        m['sharpe_ratio'] = float(returns.mean() / std * np.sqrt(TRADING_DAYS)) if std > 0 else np.nan
+    else:
+        m['sharpe_ratio'] = np.nan
+
+    if buy_hold is not None:
+        first_close, last_close = buy_hold
+        buy_hold_equity = starting_capital / first_close * last_close
+        m['buy_hold_final_equity'] = float(buy_hold_equity)
+        m['buy_hold_return_pct'] = float((buy_hold_equity - starting_capital) / starting_capital * 100)
+        m['excess_return_pct'] = m['total_return_pct'] - m['buy_hold_return_pct']
+
+    m.update(streak_stats(is_win))
+    return m
+
+def metrics_from_frame(trading_results, starting_capital=STARTING_CAPITAL, buy_hold=None):
+    """
+    compute_metrics a partire dal DataFrame dei risultati (CSV o load_trading_results)
+    """
+    return compute_metrics(from_trading_results(trading_results), starting_capital, buy_hold)
+
+def _ledger_metrics(args):
+    path, starting_capital = args
+    columns, meta = read_ledger(path)
+    m = compute_metrics(columns, starting_capital)
+    m['ledger'] = path
+    m['variant'] = meta.get('variant')
+    return m
+
+def compute_many(paths, starting_capital=STARTING_CAPITAL, max_workers=None):
+    """
+    Metriche di molti ledger .npz in parallelo (un processo per CPU).
+    Returns: DataFrame con una riga per ledger
+    """
+    paths = list(paths)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        rows = list(pool.map(_ledger_metrics, [(p, starting_capital) for p in paths], chunksize=16))
+    return pd.DataFrame(rows)
+
+def _money(value):
+    return f"${value:,.2f}" if not pd.isna(value) else "0.00"
+
+def format_stats(m, exit_reasons=('SL', 'TP', 'EOD')):
+    """
+    Statistiche formattate come nella tabella stats_strategy_*.csv
+    """
+    n = m['n_trades']
+    stats = {
+        'Capitale Iniziale': f"${m['starting_capital']:,.2f}",
+        'Capitale Finale': f"${m['final_equity']:,.2f}",
+        'Profitto Totale': f"${m['total_profit']:,.2f}",
+        'Rendimento Totale (%)': f"{m['total_return_pct']:,.2f}",
+        'Numero di Trade': n,
+        'Trade Vincenti': m['n_wins'],
+        'Trade Perdenti': m['n_losses'],
+        'Win Rate (%)': f"{m['win_rate']:.2f}",
+        'Media Trade Vincenti': _money(m['avg_win']),
+        'Massimo Trade Vincente': _money(m['max_win']),
+        'Media Trade Perdenti': _money(m['avg_loss']),
+        'Massima Perdita': _money(m['max_loss']),
+        'Profit Factor': f"{m['profit_factor']:.2f}" if not pd.isna(m['profit_factor']) else "N/A",
+    }
+    for reason in exit_reasons:
+        stats[f'Uscite {reason}'] = f"{m[f'exits_{reason}']} ({m[f'exits_{reason}_pct']:.1f}%)"
+    if m.get('exits_unknown'):
+        stats['Uscite sconosciute'] = f"{m['exits_unknown']} ({m['exits_unknown_pct']:.1f}%)"
+    stats.update({
+        'Trade LONG': f"{m['n_long']} ({m['long_pct']:.1f}%)",
+        'Trade SHORT': f"{m['n_short']} ({m['short_pct']:.1f}%)",
+        'R:R Medio': f"{m['avg_rr']:.2f}",
+        'Commissioni Totali': f"${m['total_commission']:,.2f}",
+        'Max Drawdown (%)': f"{m['max_drawdown_pct']:.2f}",
+        'Sharpe Ratio': f"{m['sharpe_ratio']:.2f}" if n > 1 else "N/A",
+    })
+    if 'buy_hold_return_pct' in m:
+        stats.update({
+            'Buy & Hold Return (%)': f"{m['buy_hold_return_pct']:.2f}",
+            'Capitale finale Buy & Hold': f"${m['buy_hold_final_equity']:.2f}",
+            'Excess Return vs Buy & Hold (%)': f"{m['excess_return_pct']:.2f}",
+        })
+    if 'daily_sharpe' in m:
+        stats.update({
+            'Sharpe Ratio Giornaliero': f"{m['daily_sharpe']:.2f}",
+            'Sortino Ratio Giornaliero': f"{m['daily_sortino']:.2f}",
+            'Volatilità Annualizzata (%)': f"{m['annual_volatility_pct']:.2f}",
+            'CAGR (%)': f"{m['cagr_pct']:.2f}",
+            'Max Drawdown Giornaliero (%)': f"{m['daily_max_drawdown_pct']:.2f}",
+            'Giorni con Trade (%)': f"{m['exposure_pct']:.1f}",
+            'Beta vs Buy & Hold': f"{m['beta']:.2f}",
+            'Information Ratio': f"{m['information_ratio']:.2f}",
+        })
+    stats.update({
+        'Max Trade Vincenti Consecutivi': f"{m['max_winning_streak']}",
+        'Media Trade Vincenti Consecutivi': f"{m['avg_winning_streak']:.2f}",
+        'Max Trade Perdenti Consecutivi': f"{m['max_losing_streak']}",
+        'Media Trade Perdenti Consecutivi': f"{m['avg_losing_streak']:.2f}",
+    })
+    return stats
+
+def print_report(m, title='ORB'):
+    """
+    Stampa le statistiche come analyze_backtest.py
+    """
+    n = m['n_trades']
+    print(f"\nStatistiche della Strategia {title}:")
+    print(f"Capitale Iniziale: ${m['starting_capital']:,.2f}")
+    print(f"Capitale Finale: ${m['final_equity']:,.2f}")
+    print(f"Profitto Totale: ${m['total_profit']:,.2f}")
+    print(f"Rendimento Totale: {m['total_return_pct']:,.2f}%")
+    print(f"Numero di Trade: {n}")
+    print(f"Trade Vincenti: {m['n_wins']}")
+    print(f"Trade Perdenti: {m['n_losses']}")
+    print(f"Win Rate: {m['win_rate']:,.2f}%")
+
+    if m['n_wins'] > 0:
+        print(f"Media Trade Vincenti: ${m['avg_win']:,.2f}")
+        print(f"Massimo Trade Vincente: ${m['max_win']:,.2f}")
+    if m['n_losses'] > 0:
+        print(f"Media Trade Perdenti: ${m['avg_loss']:,.2f}")
+        print(f"Massima Perdita: ${m['max_loss']:,.2f}")
+    if not pd.isna(m['profit_factor']):
+        print(f"Profit Factor: {m['profit_factor']:.2f}")
+
+    print(f"\nStatistiche sulle uscite:")
+    for reason in sorted(EXIT_REASONS, key=lambda r: -m[f'exits_{r}']):
+        if m[f'exits_{reason}'] > 0:
+            print(f"{reason}: {m[f'exits_{reason}']} ({m[f'exits_{reason}_pct']:.1f}%)")
+    if m.get('exits_unknown'):
+        print(f"Sconosciute: {m['exits_unknown']} ({m['exits_unknown_pct']:.1f}%)")
+
+    print(f"\nTrade LONG: {m['n_long']} ({m['long_pct']:.1f}%)")
+    print(f"Trade SHORT: {m['n_short']} ({m['short_pct']:.1f}%)")
+    print(f"\nR:R: {m['avg_rr']:.2f}")
+    print(f"Commissioni Totali: ${m['total_commission']:,.2f}")
+    print(f"Drawdown Massimo: {m['max_drawdown_pct']:.2f}%")
+    if n > 1:
+        print(f"Sharpe Ratio (annualizzato): {m['sharpe_ratio']:.2f}")
+
+    if 'buy_hold_return_pct' in m:
+        print(f"\n--- Buy & Hold ---")
+        print(f"Rendimento Buy & Hold: {m['buy_hold_return_pct']:.2f}%")
+        print(f"Capitale finale Buy & Hold: ${m['buy_hold_final_equity']:.2f}")
+        print(f"\nExcess Return vs Buy & Hold: {m['excess_return_pct']:.2f}%")
+
+    if 'daily_sharpe' in m:
+        print(f"\n--- Metriche giornaliere (calendario di sessioni) ---")
+        print(f"Sharpe Ratio giornaliero (annualizzato): {m['daily_sharpe']:.2f}")
+        print(f"Sortino Ratio giornaliero: {m['daily_sortino']:.2f}")
+        print(f"Volatilità annualizzata: {m['annual_volatility_pct']:.2f}%")
+        print(f"CAGR: {m['cagr_pct']:.2f}%")
+        print(f"Drawdown Massimo giornaliero: {m['daily_max_drawdown_pct']:.2f}%")
+        print(f"Giorni con trade: {m['exposure_pct']:.1f}%")
+        print(f"Sharpe Buy & Hold: {m['benchmark_sharpe']:.2f}")
+        print(f"Beta vs Buy & Hold: {m['beta']:.2f}")
+        print(f"Information Ratio: {m['information_ratio']:.2f}")
+
+    print("\n--- Statistiche Streak ---")
+    print(f"Massimo numero di trade vincenti consecutivi: {m['max_winning_streak']}")
+    print(f"Media trade vincenti consecutivi: {m['avg_winning_streak']:.2f}")
+    print(f"Massimo numero di trade perdenti consecutivi: {m['max_losing_streak']}")
+    print(f"Media trade perdenti consecutivi: {m['avg_losing_streak']:.2f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Metriche numeriche per molti ledger .npz in parallelo')
+    parser.add_argument('ledgers', nargs='*', default=None, help='file .npz (default: outputs/*.npz)')
+    parser.add_argument('--capital', type=float, default=STARTING_CAPITAL)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='outputs/metrics_summary.csv')
+    args = parser.parse_args()
+
+    paths = args.ledgers or sorted(glob.glob(os.path.join('outputs', '*.npz')))
+    summary = compute_many(paths, args.capital, args.workers)
+    summary.to_csv(args.output, index=False)
+    print(f"Metriche di {len(summary)} ledger salvate in '{args.output}'")
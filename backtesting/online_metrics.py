@@ -0,0 +1,170 @@
+import math
+
+from ledger import EXIT_REASONS
+
+TRADING_DAYS = 252
+
+class MetricsAccumulator:
+    """
+    Statistiche di analyze_backtest.py aggiornate un trade alla volta in O(1):
+    equity, massimo corrente, drawdown, media/varianza dei rendimenti (Welford) per lo Sharpe,
+    streak e conteggi per uscita/direzione. snapshot() ha le stesse chiavi di metrics.compute_metrics.
+    """
+
+    def __init__(self, starting_capital=50000):
+        self.starting_capital = float(starting_capital)
+        self.equity = self.starting_capital
+        self.running_max = None
+        self.max_drawdown_pct = 0.0
+
+        self.n_trades = 0
+        self.n_wins = 0
+        self.n_long = 0
+        self.gross_win = 0.0
+        self.gross_loss = 0.0
+        self.max_win = -math.inf
+        self.max_loss = math.inf
+        self.sum_rr = 0.0
+        self.total_commission = 0.0
+        self.exit_counts = [0] * len(EXIT_REASONS)
+        self.exit_unknown = 0  # Codice -1 del ledger o motivo non in EXIT_REASONS
+
+        # Welford sui rendimenti per trade (pnl / capitale prima del trade)
+        self.return_mean = 0.0
+        self.return_m2 = 0.0
+
+        # Streak: quella in corso più le chiuse (numero, somma lunghezze, massimo)
+        self.streak_win = None
+        self.streak_length = 0
+        self.win_streaks = [0, 0, 0]
+        self.loss_streaks = [0, 0, 0]
+
+    def _close_streak(self):
+        if self.streak_win is None:
+            return
+        streaks = self.win_streaks if self.streak_win else self.loss_streaks
+        streaks[0] += 1
+        streaks[1] += self.streak_length
+        streaks[2] = max(streaks[2], self.streak_length)
+
+    def update(self, pnl, exit_reason='EOD', direction='LONG', rr=0.0, commission=0.0):
+        """
+        Aggiunge un trade. exit_reason e direction accettano sia le stringhe dei CSV
+        ('SL', 'LONG') sia i codici del ledger (indice in EXIT_REASONS, +1/-1).
+        """
+        pnl = float(pnl)
+        capital_before = self.equity
+        self.equity += pnl
+        self.n_trades += 1
+
+        # Drawdown rispetto al massimo dell'equity dopo ogni trade (come expanding().max())
+        if self.running_max is None or self.equity > self.running_max:
+            self.running_max = self.equity
+        drawdown = (self.equity - self.running_max) / self.running_max * 100
+        if drawdown < self.max_drawdown_pct:
+            self.max_drawdown_pct = drawdown
+
+        is_win = pnl > 0
+        if is_win:
+            self.n_wins += 1
+            self.gross_win += pnl
+            self.max_win = max(self.max_win, pnl)
+        else:
+            self.gross_loss += pnl
+            self.max_loss = min(self.max_loss, pnl)
+
+        if isinstance(exit_reason, str):
+            code = EXIT_REASONS.index(exit_reason) if exit_reason in EXIT_REASONS else -1
+        else:
+            code = int(exit_reason)
+        if code >= 0:
+            self.exit_counts[code] += 1
+        else:
+            self.exit_unknown += 1
+        if direction == 'LONG' or (not isinstance(direction, str) and direction > 0):
+            self.n_long += 1
+        self.sum_rr += float(rr)
+        self.total_commission += float(commission)
+
+        r = pnl / capital_before
+        delta = r - self.return_mean
+        self.return_mean += delta / self.n_trades
+        self.return_m2 += delta * (r - self.return_mean)
+
+        if is_win == self.streak_win:
+            self.streak_length += 1
+        else:
+            self._close_streak()
+            self.streak_win = is_win
+            self.streak_length = 1
+
+    def add_trade(self, trade):
+        """
+        Aggiunge un trade nel formato dei dict dei backtest (pnl, exit_reason, direction, R:R, commission)
+        """
+        self.update(trade['pnl'], trade['exit_reason'], trade['direction'],
+                    trade.get('R:R', trade.get('rr', 0.0)), trade.get('commission', 0.0))
+
+    def sharpe_ratio(self):
+        if self.n_trades < 2 or self.return_m2 <= 0:
+            return math.nan
+        std = math.sqrt(self.return_m2 / (self.n_trades - 1))
+        return self.return_mean / std * math.sqrt(TRADING_DAYS)
+
+    def snapshot(self, buy_hold=None):
+        """
+        Returns: dict con le stesse chiavi di metrics.compute_metrics (utilizzabile con format_stats)
+        """
+        n = self.n_trades
+        m = {'starting_capital': self.starting_capital, 'n_trades': n}
+        if n == 0:
+            return m
+
+        n_losses = n - self.n_wins
+        total_profit = self.equity - self.starting_capital
+        m.update({
+            'final_equity': self.equity,
+            'total_profit': total_profit,
+            'total_return_pct': (self.equity / self.starting_capital - 1) * 100,
+            'n_wins': self.n_wins,
+            'n_losses': n_losses,
+            'win_rate': self.n_wins / n * 100,
+            'avg_win': self.gross_win / self.n_wins if self.n_wins else math.nan,
+            'max_win': self.max_win if self.n_wins else math.nan,
+            'avg_loss': self.gross_loss / n_losses if n_losses else math.nan,
+            'max_loss': self.max_loss if n_losses else math.nan,
+            'profit_factor': self.gross_win / abs(self.gross_loss) if self.gross_loss < 0 else math.nan,
+            'avg_rr': self.sum_rr / n,
+            'total_commission': self.total_commission,
+        })
+        for code, reason in enumerate(EXIT_REASONS):
+            m[f'exits_{reason}'] = self.exit_counts[code]
+            m[f'exits_{reason}_pct'] = self.exit_counts[code] / n * 100
+        m['exits_unknown'] = self.exit_unknown
+        m['exits_unknown_pct'] = self.exit_unknown / n * 100
+        m.update({'n_long': self.n_long, 'n_short': n - self.n_long,
+                  'long_pct': self.n_long / n * 100, 'short_pct': (n - self.n_long) / n * 100})
+        m['max_drawdown_pct'] = self.max_drawdown_pct
+        m['sharpe_ratio'] = self.sharpe_ratio()
+
+        if buy_hold is not None:
+            first_close, last_close = buy_hold
+            buy_hold_equity = self.starting_capital / first_close * last_close
+            m['buy_hold_final_equity'] = buy_hold_equity
+            m['buy_hold_return_pct'] = (buy_hold_equity - self.starting_capital) / self.starting_capital * 100
+            m['excess_return_pct'] = m['total_return_pct'] - m['buy_hold_return_pct']
+
+        # Streak chiuse più quella in corso, senza modificare lo stato
+        win_streaks = list(self.win_streaks)
+        loss_streaks = list(self.loss_streaks)
+        current = win_streaks if self.streak_win else loss_streaks
+        current[0] += 1
+        current[1] += self.streak_length
+        current[2] = max(current[2], self.streak_length)
+        m.update({
+            'max_winning_streak': win_streaks[2],
+            'avg_winning_streak': win_streaks[1] / win_streaks[0] if win_streaks[0] else 0.0,
+            'max_losing_streak': loss_streaks[2],
+            'avg_losing_streak': loss_streaks[1] / loss_streaks[0] if loss_streaks[0] else 0.0,
+        })
+        return m
@@ -0,0 +1,212 @@
+import numpy as np
+
+from instrumentation import count, stage
+
+# Parametri della strategia ORB (stessi valori di backtest.py)
+ATR_PERIOD = 14
+STOP_ATR_MULT = 0.1
+TP_R_MULT = 10
+RISK_PCT = 0.01
+
+def calculate_position_size(entry_price, stop_loss, account_size, risk_pct=RISK_PCT):
+    """
+    Size basata sul rischio (1% del capitale), come in backtest.py
+    """
+    R = abs(entry_price - stop_loss)
+    if R <= 0:
+        return 0
+    return int(account_size * risk_pct / R)
+
+def ibkr_commission(shares):
+    # Commissione fissa per azione
+    return shares * 0.0035
+
+def daily_bar(highs, lows, closes):
+    """
+    Riduce le candele intraday di una sessione alla barra giornaliera (high, low, close)
+    """
+    return float(highs.max()), float(lows.min()), float(closes[-1])
+
+def atr_from_daily(highs, lows, closes):
+    """
+    Calcola l'ATR usando la formula: ATR = (1/n) * Σ(TR_i) su barre giornaliere.
+    Il primo giorno non ha close precedente, quindi TR = High - Low (come il groupby di backtest.py)
+    """
+    highs = np.asarray(highs, dtype=float)
+    lows = np.asarray(lows, dtype=float)
+    closes = np.asarray(closes, dtype=float)
+
+    tr = highs - lows
+    if len(closes) > 1:
+        previous_close = closes[:-1]
+        hpc = np.abs(highs[1:] - previous_close)
+        lpc = np.abs(lows[1:] - previous_close)
+        tr[1:] = np.maximum(tr[1:], np.maximum(hpc, lpc))
+
+    return float(tr.mean())
+
+def trade_excursion(highs, lows, in_trade, signal_type, entry_price, exit_price, exit_reason):
+    """
+    Massima escursione avversa (MAE) e favorevole (MFE) in punti, con riduzioni min/max
+    mascherate sulle candele in cui la posizione è aperta (in_trade: entrata e uscita comprese).
+    Come per SL/TP, la candela di entrata non viene considerata (l'ordine dei prezzi al suo
+    interno non è noto) e sulla candela di uscita il prezzo non va oltre lo stop (SL/TRAILING)
+    o il target (TP) eseguito.
+    Returns: {'mae', 'mfe', 'bars_in_trade'}
+    """
+    highs = np.asarray(highs, dtype=float)
+    lows = np.asarray(lows, dtype=float)
+    in_trade = np.asarray(in_trade, dtype=bool)
+    bars_in_trade = int(in_trade.sum())
+    entry_idx = int(in_trade.argmax())
+    exit_idx = len(in_trade) - 1 - int(in_trade[::-1].argmax())
+    if exit_idx == entry_idx:
+        return {'mae': 0.0, 'mfe': 0.0, 'bars_in_trade': bars_in_trade}
+
+    after_entry = in_trade.copy()
+    after_entry[entry_idx] = False
+    worst = np.where(after_entry, lows if signal_type == 'LONG' else highs, np.nan)
+    best = np.where(after_entry, highs if signal_type == 'LONG' else lows, np.nan)
+    if exit_reason in ('SL', 'TRAILING'):
+        worst[exit_idx] = exit_price
+    elif exit_reason == 'TP':
+        best[exit_idx] = exit_price
+
+    if signal_type == 'LONG':
+        mae = entry_price - np.nanmin(worst)
+        mfe = np.nanmax(best) - entry_price
+    else:
+        mae = np.nanmax(worst) - entry_price
+        mfe = entry_price - np.nanmin(best)
+
+    return {'mae': max(float(mae), 0.0), 'mfe': max(float(mfe), 0.0), 'bars_in_trade': bars_in_trade}
+
+def execute_trade(highs, lows, closes, signal_type, entry_price, stop_loss, take_profit):
+    """
+    Simula entry stop, stop loss e take profit sugli array delle candele dopo il segnale.
+    Stessa logica del ciclo iterrows di backtest.py: la candela di entrata non viene
+    controllata per SL/TP e, sulla stessa candela, lo SL ha priorità sul TP.
+    Returns: {'entry_idx', 'exit_idx', 'exit_price', 'exit_reason', 'mae', 'mfe', 'bars_in_trade'} oppure None
+    """
+    if len(highs) == 0:
+        return None
+
+    # Prima candela che tocca il prezzo di entrata
+    if signal_type == 'LONG':
+        entry_hits = highs >= entry_price
+    else:
+        entry_hits = lows <= entry_price
+    if not entry_hits.any():
+        return None
+    entry_idx = int(entry_hits.argmax())
+
+    # Candele successive a quella di entrata
+    after_high = highs[entry_idx + 1:]
+    after_low = lows[entry_idx + 1:]
+    if signal_type == 'LONG':
+        sl_hits = after_low <= stop_loss
+        tp_hits = after_high >= take_profit
+    else:
+        sl_hits = after_high >= stop_loss
+        tp_hits = after_low <= take_profit
+
+    exit_hits = sl_hits | tp_hits
+    if exit_hits.any():
+        offset = int(exit_hits.argmax())
+        exit_idx = entry_idx + 1 + offset
+        if sl_hits[offset]:
+            fill = {'entry_idx': entry_idx, 'exit_idx': exit_idx, 'exit_price': stop_loss, 'exit_reason': 'SL'}
+        else:
+            fill = {'entry_idx': entry_idx, 'exit_idx': exit_idx, 'exit_price': take_profit, 'exit_reason': 'TP'}
+    else:
+        # Nessuno SL/TP: chiusura a fine giornata
+        exit_idx = len(closes) - 1
+        fill = {'entry_idx': entry_idx, 'exit_idx': exit_idx, 'exit_price': float(closes[exit_idx]), 'exit_reason': 'EOD'}
+
+    idx = np.arange(len(highs))
+    in_trade = (idx >= entry_idx) & (idx <= exit_idx)
+    fill.update(trade_excursion(highs, lows, in_trade, signal_type, entry_price, fill['exit_price'], fill['exit_reason']))
+    return fill
+
+def analyze_session(day_data, atr_value, current_equity):
+    """
+    Equivalente di analyze_trading_day di backtest.py, ma con ATR già calcolato
+    e senza accesso all'intero dataset: lavora solo sulla sessione ricevuta.
+    """
+    count('days')
+    if atr_value is None or len(day_data) < 3:
+        return None
+
+    with stage('signal'):
+        opens = day_data['open'].to_numpy(dtype=float)
+        highs = day_data['high'].to_numpy(dtype=float)
+        lows = day_data['low'].to_numpy(dtype=float)
+        closes = day_data['close'].to_numpy(dtype=float)
+        timestamps = day_data['timestamp'].to_numpy()
+
+        # No trade se la prima candela è Doji
+        if opens[0] == closes[0]:
+            return None
+
+        # Il DR è la prima candela della giornata
+        if closes[0] > opens[0]:
+            signal_type = 'LONG'
+            entry_price = highs[0]
+            stop_loss = entry_price - (atr_value * STOP_ATR_MULT)
+        else:
+            signal_type = 'SHORT'
+            entry_price = lows[0]
+            stop_loss = entry_price + (atr_value * STOP_ATR_MULT)
+
+        position_size = calculate_position_size(entry_price, stop_loss, current_equity)
+        if position_size == 0:
+            return None
+
+        risk = abs(entry_price - stop_loss)
+        if signal_type == 'LONG':
+            take_profit = entry_price + (risk * TP_R_MULT)
+        else:
+            take_profit = entry_price - (risk * TP_R_MULT)
+
+    # Esegui il trade sulle candele dopo la prima
+    with stage('fills'):
+        fill = execute_trade(highs[1:], lows[1:], closes[1:], signal_type, entry_price, stop_loss, take_profit)
+    if fill is None:
+        return None
+    count('trades')
+
+    exit_price = fill['exit_price']
+    reward = abs(exit_price - entry_price)
+    rr_ratio = reward / risk if risk > 0 else 0
+
+    total_commission = ibkr_commission(position_size)
+
+    # Risultato lordo per unità in punti, usato da cost_model.py per ricalcolare i costi
+    gross_points = exit_price - entry_price if signal_type == 'LONG' else entry_price - exit_price
+
+    # Calcolo PnL
+    if signal_type == 'LONG':
+        pnl = (exit_price - entry_price) * position_size - total_commission
+    else:
+        pnl = (entry_price - exit_price) * position_size - total_commission
+
+    return {
+        'entry_price': entry_price,
+        'exit_price': exit_price,
+        'stop_loss': stop_loss,
+        'direction': signal_type,
+        'exit_reason': fill['exit_reason'],
+        'position_size': position_size,
+        'pnl': pnl,
+        'R:R': rr_ratio,
+        'commission': total_commission,
+        'gross_points': gross_points,
+        'point_value': 1,
+        'mae': fill['mae'],
+        'mfe': fill['mfe'],
+        'bars_in_trade': fill['bars_in_trade'],
+        'entry_time': timestamps[1 + fill['entry_idx']],
+        'exit_time': timestamps[1 + fill['exit_idx']],
+        'date': timestamps[0],
+        'ATR': atr_value,
+    }
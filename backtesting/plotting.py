@@ -0,0 +1,120 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Risoluzione dei grafici salvati: 20x10 pollici a 150 dpi sono 3000 px di larghezza
+SAVE_DPI = 150
+CACHE_DIR = 'outputs/cache'
+
+def _as_float(x):
+    if isinstance(x, pd.Series) and not pd.api.types.is_numeric_dtype(x):
+        # Timestamp con fuso orario (es. le date dei ledger)
+        x = pd.to_datetime(x, utc=True).dt.tz_localize(None)
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(float)
+    return x.astype(float)
+
+def minmax_indices(y, n_buckets):
+    """
+    Per ogni bucket tiene il punto minimo e massimo (più primo e ultimo punto della serie).
+    Completamente vettoriale: preserva picchi e drawdown.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+
+    starts = np.linspace(0, n, n_buckets + 1).astype(np.int64)[:-1]
+    bucket = np.repeat(np.arange(n_buckets), np.diff(np.r_[starts, n]))
+    order = np.lexsort((y, bucket))
+    bucket_end = np.r_[starts[1:], n] - 1
+
+    # Dentro ogni bucket ordinato per valore: il primo è il minimo, l'ultimo il massimo
+    lows = order[starts]
+    highs = order[bucket_end]
+    return np.unique(np.r_[0, lows, highs, n - 1])
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: sceglie n_out punti che preservano la forma visiva della serie
+    """
+    x = _as_float(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Punto medio del bucket successivo (o l'ultimo punto)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs((x[prev] - avg_x) * (y[start:end] - y[prev]) - (x[prev] - x[start:end]) * (avg_y - y[prev]))
+        prev = start + int(area.argmax())
+        selected[i + 1] = prev
+    return selected
+
+def decimate(x, y, n_out, method='lttb'):
+    """
+    Riduce la serie a circa n_out punti (uno per pixel) con LTTB o min/max per bucket
+    """
+    if len(y) <= n_out:
+        return x, y
+    if method == 'minmax':
+        idx = minmax_indices(y, max(n_out // 2, 1))
+    else:
+        idx = lttb_indices(x, y, n_out)
+    x = x.iloc[idx] if isinstance(x, pd.Series) else np.asarray(x)[idx]
+    y = y.iloc[idx] if isinstance(y, pd.Series) else np.asarray(y)[idx]
+    return x, y
+
+def pixel_width(fig, dpi=SAVE_DPI):
+    return int(fig.get_figwidth() * dpi)
+
+def plot_decimated(ax, x, y, dpi=SAVE_DPI, method='lttb', **kwargs):
+    """
+    ax.plot con la serie ridotta alla larghezza in pixel della figura salvata
+    """
+    x, y = decimate(x, y, pixel_width(ax.figure, dpi), method)
+    return ax.plot(x, y, **kwargs)
+
+def daily_closes(data_path, day_col='trading_day', cache_dir=CACHE_DIR):
+    """
+    Serie dei close giornalieri (ultimo close di ogni sessione) e primo close del file.
+    Il risultato è salvato in cache e ricalcolato solo se il CSV cambia (dimensione o data di modifica).
+    Returns: (array dei giorni datetime64, array dei close, primo close)
+    """
+    stat = os.stat(data_path)
+    key = f"{os.path.splitext(os.path.basename(data_path))[0]}_{day_col}_{stat.st_size}_{int(stat.st_mtime)}"
+    cache_path = os.path.join(cache_dir, f'daily_close_{key}.npz')
+
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            return cached['days'], cached['closes'], float(cached['first_close'])
+
+    df = pd.read_csv(data_path, usecols=[day_col, 'close'])
+    last = df.groupby(day_col, sort=False)['close'].last()
+    days = pd.to_datetime(last.index).to_numpy(dtype='datetime64[ns]')
+    closes = last.to_numpy(dtype=float)
+    first_close = float(df['close'].iloc[0])
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(cache_path, days=days, closes=closes, first_close=first_close)
+    return days, closes, first_close
+
+def buy_hold_curve(data_path, starting_capital, day_col='trading_day'):
+    """
+    Equity del Buy & Hold su base giornaliera (azioni comprate al primo close del file)
+    Returns: (giorni, equity, primo close, ultimo close)
+    """
+    days, closes, first_close = daily_closes(data_path, day_col)
+    return days, closes * (starting_capital / first_close), first_close, float(closes[-1])
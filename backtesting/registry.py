@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from ledger import read_ledger
+from metrics import STARTING_CAPITAL, compute_metrics
+
+REGISTRY_PATH = 'outputs/registry.sqlite'
+ARCHIVE_DIR = 'outputs/runs'
+
+# Metriche salvate come colonne (interrogabili e indicizzate); il resto va in metrics_json
+METRIC_COLUMNS = ['n_trades', 'total_return_pct', 'sharpe_ratio', 'max_drawdown_pct', 'profit_factor',
+                  'win_rate', 'avg_rr', 'total_commission']
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created TEXT NOT NULL,
+    variant TEXT,
+    engine_version TEXT,
+    data_path TEXT,
+    data_fingerprint TEXT,
+    ledger_path TEXT,
+    wall_time REAL,
+    {', '.join(f'{c} REAL' for c in METRIC_COLUMNS)},
+    params_json TEXT,
+    metrics_json TEXT
+);
+CREATE TABLE IF NOT EXISTS params (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    value_num REAL,
+    value_text TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_sharpe ON runs(sharpe_ratio);
+CREATE INDEX IF NOT EXISTS idx_runs_drawdown ON runs(max_drawdown_pct);
+CREATE INDEX IF NOT EXISTS idx_runs_return ON runs(total_return_pct);
+CREATE INDEX IF NOT EXISTS idx_runs_variant ON runs(variant, created);
+CREATE INDEX IF NOT EXISTS idx_runs_fingerprint ON runs(data_fingerprint);
+CREATE INDEX IF NOT EXISTS idx_params_num ON params(name, value_num, run_id);
+CREATE INDEX IF NOT EXISTS idx_params_text ON params(name, value_text, run_id);
+CREATE INDEX IF NOT EXISTS idx_params_run ON params(run_id);
+"""
+
+def connect(path=REGISTRY_PATH):
+    """
+    Connessione al registro in modalità WAL (letture concorrenti mentre si scrive)
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+def _clean(value):
+    # NaN non è valido in JSON/SQL: diventa NULL
+    if isinstance(value, float) and value != value:
+        return None
+    if hasattr(value, 'item'):
+        return _clean(value.item())
+    return value
+
+def _is_number(value):
+    # I bool restano testo ('True'/'False'): non vanno confrontati con value_num
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def run_row(metrics, meta, ledger_path=None, wall_time=None):
+    """
+    Riga del registro da metriche e metadati del ledger. Non tocca il database:
+    i worker di un pool la restituiscono e il processo principale scrive in batch.
+    """
+    metrics = {k: _clean(v) for k, v in metrics.items()}
+    return {
+        'created': meta.get('created') or datetime.now().isoformat(timespec='seconds'),
+        'variant': meta.get('variant'),
+        'engine_version': meta.get('engine_version'),
+        'data_path': meta.get('data_path'),
+        'data_fingerprint': meta.get('data_fingerprint'),
+        'ledger_path': ledger_path,
+        'wall_time': wall_time,
+        **{c: metrics.get(c) for c in METRIC_COLUMNS},
+        'params': meta.get('params') or {},
+        'metrics_json': json.dumps(metrics),
+    }
+
+def record_runs(rows, path=REGISTRY_PATH, conn=None):
+    """
+    Scrive molte run in un'unica transazione. Gli id li assegna SQLite (lastrowid): più processi
+    possono scrivere sullo stesso database senza contendersi MAX(id). Returns: id delle run inserite
+    """
+    own = conn is None
+    conn = conn or connect(path)
+    columns = ['created', 'variant', 'engine_version', 'data_path', 'data_fingerprint', 'ledger_path',
+               'wall_time'] + METRIC_COLUMNS + ['params_json', 'metrics_json']
+    placeholders = ', '.join('?' * len(columns))
+    try:
+        with conn:
+            insert = f"INSERT INTO runs ({', '.join(columns)}) VALUES ({placeholders})"
+            ids = [conn.execute(insert, [row.get(c) for c in columns[:-2]]
+                                + [json.dumps(row['params'], default=str), row['metrics_json']]).lastrowid
+                   for row in rows]
+            conn.executemany(
+                'INSERT INTO params (run_id, name, value_num, value_text) VALUES (?, ?, ?, ?)',
+                [(run_id, name,
+                  float(value) if _is_number(value) else None,
+                  None if _is_number(value) else str(value))
+                 for run_id, row in zip(ids, rows) for name, value in row['params'].items()])
+    finally:
+        if own:
+            conn.close()
+    return ids
+
+class RunBuffer:
+    """
+    Accumula le righe e le scrive a blocchi di batch_size (es. risultati di uno sweep in un pool)
+    """
+
+    def __init__(self, path=REGISTRY_PATH, batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self.rows = []
+        self.conn = connect(path)
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            record_runs(self.rows, conn=self.conn)
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def _ledger_row(args):
+    # Eseguito nei worker: legge il ledger e calcola le metriche, la scrittura resta al processo principale
+    ledger_path, starting_capital = args
+    columns, meta = read_ledger(ledger_path)
+    return run_row(compute_metrics(columns, starting_capital), meta, ledger_path, meta.get('wall_time'))
+
+def register_ledgers(paths, starting_capital=STARTING_CAPITAL, path=REGISTRY_PATH, max_workers=None, batch_size=500):
+    """
+    Registra molti ledger .npz: metriche calcolate in un pool di processi, scritture a blocchi.
+    Returns: numero di run registrate
+    """
+    paths = list(paths)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool, RunBuffer(path, batch_size) as buffer:
+        for row in pool.map(_ledger_row, [(p, starting_capital) for p in paths], chunksize=16):
+            buffer.add(row)
+    return len(paths)
+
+def register_ledger(ledger_path, wall_time=None, starting_capital=STARTING_CAPITAL, path=REGISTRY_PATH, archive=True):
+    """
+    Registra la run di un ledger .npz. Con archive=True il ledger viene copiato in outputs/runs/,
+    così la storia resta consultabile anche quando il backtest sovrascrive lo stesso percorso.
+    """
+    columns, meta = read_ledger(ledger_path)
+    stored_path = ledger_path
+    if archive:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        stored_path = os.path.join(ARCHIVE_DIR, f"{stamp}_{meta.get('variant') or 'run'}.npz")
+        shutil.copyfile(ledger_path, stored_path)
+    row = run_row(compute_metrics(columns, starting_capital), meta, stored_path, wall_time)
+    return record_runs([row], path)[0]
+
+def top_runs(n=20, order_by='sharpe_ratio', max_drawdown=None, variant=None, params=None, path=REGISTRY_PATH):
+    """
+    Migliori run per una metrica, con filtri su drawdown massimo (in %, positivo), variante e parametri.
+    params: {nome: valore} per filtrare su parametri esatti
+    """
+    if order_by not in METRIC_COLUMNS + ['wall_time']:
+        raise ValueError(f"Metrica non valida: {order_by}")
+
+    where, args = [f'r.{order_by} IS NOT NULL'], []
+    if max_drawdown is not None:
+        where.append('r.max_drawdown_pct >= ?')
+        args.append(-abs(max_drawdown))
+    if variant is not None:
+        where.append('r.variant = ?')
+        args.append(variant)
+    for i, (name, value) in enumerate((params or {}).items()):
+        column = 'value_num' if _is_number(value) else 'value_text'
+        where.append(f'EXISTS (SELECT 1 FROM params p{i} WHERE p{i}.run_id = r.id AND p{i}.name = ? AND p{i}.{column} = ?)')
+        args += [name, float(value) if _is_number(value) else str(value)]
+
+    query = (f"SELECT r.id, r.created, r.variant, r.{order_by}, r.max_drawdown_pct, r.total_return_pct, "
+             f"r.n_trades, r.params_json FROM runs r WHERE {' AND '.join(where)} "
+             f"ORDER BY r.{order_by} DESC LIMIT ?")
+    conn = connect(path)
+    try:
+        return conn.execute(query, args + [n]).fetchall()
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Registro SQLite delle run di backtest')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    add = sub.add_parser('add', help='registra uno o più ledger .npz')
+    add.add_argument('ledgers', nargs='+')
+    add.add_argument('--no-archive', action='store_true', help='registra i percorsi originali senza copiarli')
+    add.add_argument('--workers', type=int, default=None)
+
+    top = sub.add_parser('top', help='migliori run per metrica')
+    top.add_argument('-n', type=int, default=20)
+    top.add_argument('--by', default='sharpe_ratio', choices=METRIC_COLUMNS)
+    top.add_argument('--max-dd', type=float, default=None, help='drawdown massimo in %% (es. 15)')
+    top.add_argument('--variant', default=None)
+    args = parser.parse_args()
+
+    if args.command == 'add':
+        if args.no_archive:
+            n = register_ledgers(args.ledgers, max_workers=args.workers)
+            print(f"{n} run registrate in '{REGISTRY_PATH}'")
+        else:
+            for ledger_path in args.ledgers:
+                run_id = register_ledger(ledger_path)
+                print(f"{ledger_path}: registrato come run {run_id}")
+    else:
+        for run_id, created, variant, value, drawdown, total_return, n_trades, params in top_runs(
+                args.n, args.by, args.max_dd, args.variant):
+            print(f"#{run_id:<7} {created}  {variant or '-':<20} {args.by}={value:.2f}  DD={drawdown:.2f}%  "
+                  f"ret={total_return:.2f}%  trade={int(n_trades)}  {params}")
@@ -0,0 +1,193 @@
+import argparse
+import contextlib
+import glob
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+
+from analyze_backtest import REPORTS, run_report
+from comparison import COMPARISON_DATA, OUTPUT_PATH, STRATEGIES, plot_comparison
+from ledger import META_KEY
+
+OUTPUT_DIR = 'outputs'
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, 'cache', 'report_manifest.json')
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Sorgenti che determinano il contenuto dei report: se cambiano, si rigenera tutto
+CODE_FILES = ['analyze_backtest.py', 'metrics.py', 'daily_series.py', 'plotting.py', 'ledger.py', 'comparison.py']
+
+def file_hash(path, block_size=4 * 1024 * 1024):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def _data_hash(path):
+    # Per i file di dati (anche centinaia di MB) bastano dimensione e data di modifica
+    stat = os.stat(path)
+    return f'{stat.st_size}-{int(stat.st_mtime)}'
+
+def _ledger_meta(npz_path):
+    with np.load(npz_path, allow_pickle=False) as data:
+        return json.loads(str(data[META_KEY]))
+
+def _day_col(data_path):
+    columns = pd.read_csv(data_path, nrows=0).columns
+    return 'trading_day' if 'trading_day' in columns else 'day'
+
+def discover_reports(output_dir=OUTPUT_DIR):
+    """
+    Trova tutti i ledger (trading_results_*.csv / .npz) in output_dir e costruisce la voce di report.
+    I ledger già configurati in REPORTS usano quella configurazione, gli altri una generica
+    con il file di dati preso dai metadati del ledger .npz (se presente).
+    """
+    known = {os.path.normpath(r['results']): r for r in REPORTS.values()}
+    stems = sorted({os.path.splitext(p)[0] for pattern in ('trading_results_*.csv', 'trading_results_*.npz')
+                    for p in glob.glob(os.path.join(output_dir, pattern))})
+
+    reports = {}
+    for stem in stems:
+        csv_path = stem + '.csv'
+        npz_path = stem + '.npz'
+        name = os.path.basename(stem)[len('trading_results_'):]
+
+        if os.path.normpath(csv_path) in known:
+            report = dict(known[os.path.normpath(csv_path)])
+        else:
+            data_path = _ledger_meta(npz_path).get('data_path') if os.path.exists(npz_path) else None
+            if data_path and not os.path.exists(data_path):
+                data_path = None
+            report = {
+                'data': data_path,
+                'day_col': _day_col(data_path) if data_path else 'trading_day',
+                'results': csv_path,
+                'naive_tz': 'America/New_York',
+                'label': f'Strategia ORB {name}',
+                'title': f'Strategia ORB {name} vs Buy & Hold',
+                'equity_png': os.path.join(output_dir, f'equity_{name}.png'),
+                'stats_csv': os.path.join(output_dir, f'stats_strategy_{name}.csv'),
+                'exit_reasons': ('SL', 'TP', 'TRAILING', 'EOD'),
+                'empty_message': f'Nessun trade nel ledger {name}',
+            }
+        reports[name] = report
+    return reports
+
+def inputs_hash(report, code_hash):
+    """
+    Hash di tutto ciò da cui dipende il report: ledger, dati, configurazione e codice
+    """
+    sha = hashlib.sha1(code_hash.encode())
+    sha.update(json.dumps(report, sort_keys=True, default=str).encode())
+    for path in (report['results'], os.path.splitext(report['results'])[0] + '.npz'):
+        if os.path.exists(path):
+            sha.update(file_hash(path).encode())
+    if report.get('data') and os.path.exists(report['data']):
+        sha.update(_data_hash(report['data']).encode())
+    return sha.hexdigest()
+
+def _render(job):
+    """
+    Eseguito nei processi del pool: genera un report con l'output su stringa.
+    Un ledger non valido non blocca gli altri: l'errore viene restituito.
+    """
+    name, report = job
+    start = time.perf_counter()
+    stdout = io.StringIO()
+    error = None
+    try:
+        with contextlib.redirect_stdout(stdout):
+            if name == 'comparison':
+                plot_comparison()
+            else:
+                run_report(report)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    return name, time.perf_counter() - start, stdout.getvalue(), error
+
+def load_manifest(path=MANIFEST_PATH):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def build_reports(output_dir=OUTPUT_DIR, force=False, max_workers=None, verbose=False):
+    """
+    Rigenera in parallelo solo i report i cui input sono cambiati dall'ultima esecuzione.
+    Returns: (nomi rigenerati, nomi saltati, nomi in errore)
+    """
+    code_hash = hashlib.sha1(''.join(file_hash(os.path.join(HERE, f)) for f in CODE_FILES).encode()).hexdigest()
+    reports = discover_reports(output_dir)
+
+    jobs = {}
+    manifest = load_manifest()
+    for name, report in reports.items():
+        jobs[name] = (report, inputs_hash(report, code_hash), [report['equity_png'], report['stats_csv']])
+
+    # Confronto multi timeframe di comparison.py: dipende da tutti i suoi ledger
+    comparison_paths = [path for path, _, _ in STRATEGIES]
+    if all(os.path.exists(p) for p in comparison_paths) and os.path.exists(COMPARISON_DATA):
+        sha = hashlib.sha1(code_hash.encode())
+        for path in comparison_paths:
+            sha.update(file_hash(path).encode())
+            npz_path = os.path.splitext(path)[0] + '.npz'
+            if os.path.exists(npz_path):
+                sha.update(file_hash(npz_path).encode())
+        sha.update(_data_hash(COMPARISON_DATA).encode())
+        jobs['comparison'] = (None, sha.hexdigest(), [OUTPUT_PATH])
+
+    todo, skipped = [], []
+    for name, (report, digest, outputs) in jobs.items():
+        up_to_date = manifest.get(name) == digest and all(os.path.exists(p) for p in outputs)
+        if up_to_date and not force:
+            skipped.append(name)
+        else:
+            todo.append(name)
+
+    done, failed = [], []
+    if todo:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for name, elapsed, output, error in pool.map(_render, [(name, jobs[name][0]) for name in todo]):
+                if error is not None:
+                    # Nessun hash salvato: verrà ritentato alla prossima esecuzione
+                    manifest.pop(name, None)
+                    print(f"{name}: errore ({error})")
+                    failed.append(name)
+                    continue
+                manifest[name] = jobs[name][1]
+                done.append(name)
+                print(f"{name}: rigenerato in {elapsed:.2f}s")
+                if verbose:
+                    print(output)
+        save_manifest(manifest)
+
+    for name in skipped:
+        print(f"{name}: invariato, saltato")
+    return done, skipped, failed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rigenera statistiche e grafici dei ledger cambiati in outputs/')
+    parser.add_argument('--force', action='store_true', help='rigenera anche i report invariati')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true', help='stampa le statistiche di ogni report')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    done, skipped, failed = build_reports(force=args.force, max_workers=args.workers, verbose=args.verbose)
+    print(f"\n{len(done)} report rigenerati, {len(skipped)} invariati, {len(failed)} in errore "
+          f"in {time.perf_counter() - start:.2f}s")
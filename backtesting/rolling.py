@@ -0,0 +1,138 @@
+import argparse
+import os
+from collections import deque
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from ledger import from_trading_results, load_trading_results
+from metrics import STARTING_CAPITAL, TRADING_DAYS
+from plotting import SAVE_DPI, plot_decimated
+
+def _window_sum(values, window):
+    """
+    Somma mobile con le somme cumulative: O(n), NaN finché la finestra non è piena
+    """
+    c = np.cumsum(np.asarray(values, dtype=float))
+    out = np.full(len(c), np.nan)
+    if len(c) >= window:
+        out[window - 1:] = c[window - 1:] - np.r_[0.0, c[:-window]]
+    return out
+
+def rolling_max(values, window):
+    """
+    Massimo mobile con deque monotona: ogni elemento entra ed esce una sola volta, O(n)
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.empty(len(values))
+    candidates = deque()
+    for i, v in enumerate(values):
+        while candidates and values[candidates[-1]] <= v:
+            candidates.pop()
+        candidates.append(i)
+        if candidates[0] <= i - window:
+            candidates.popleft()
+        out[i] = values[candidates[0]]
+    return out
+
+def r_multiples(columns):
+    """
+    Risultato di ogni trade in multipli del rischio iniziale (R = |entry - stop| * size * valore punto)
+    """
+    point_value = np.nan_to_num(columns['point_value'], nan=1.0)
+    risk = np.abs(columns['entry_price'] - columns['stop_loss']) * columns['position_size'] * point_value
+    return np.divide(columns['pnl'], risk, out=np.zeros(len(risk)), where=risk > 0)
+
+def drawdown_duration(equity):
+    """
+    Numero di trade trascorsi dall'ultimo massimo dell'equity
+    """
+    idx = np.arange(len(equity))
+    running_max = np.maximum.accumulate(equity)
+    last_high = np.maximum.accumulate(np.where(equity >= running_max, idx, 0))
+    return idx - last_high
+
+def rolling_metrics(columns, window=50, starting_capital=STARTING_CAPITAL):
+    """
+    Metriche mobili sugli ultimi `window` trade, tutte in O(n).
+    columns: dict di array nello schema di ledger.py
+    Returns: DataFrame (float64: equity e drawdown restano al centesimo) indicizzato per data del trade
+    """
+    pnl = np.asarray(columns['pnl'], dtype=float)
+    equity = starting_capital + np.cumsum(pnl)
+    returns = pnl / (equity - pnl)
+
+    # Sharpe con somme cumulative di r e r^2 (varianza campionaria)
+    sum_r = _window_sum(returns, window)
+    sum_r2 = _window_sum(returns ** 2, window)
+    mean = sum_r / window
+    var = (sum_r2 - window * mean ** 2) / (window - 1) if window > 1 else np.full(len(pnl), np.nan)
+    std = np.sqrt(np.clip(var, 0, None))
+    sharpe = np.divide(mean, std, out=np.full(len(pnl), np.nan), where=std > 0) * np.sqrt(TRADING_DAYS)
+
+    gross_win = _window_sum(np.where(pnl > 0, pnl, 0.0), window)
+    gross_loss = -_window_sum(np.where(pnl > 0, 0.0, pnl), window)
+    profit_factor = np.divide(gross_win, gross_loss, out=np.full(len(pnl), np.nan), where=gross_loss > 0)
+
+    window_high = rolling_max(equity, window)
+
+    result = pd.DataFrame({
+        'equity': equity,
+        'rolling_sharpe': sharpe,
+        'rolling_win_rate': _window_sum(pnl > 0, window) / window * 100,
+        'rolling_profit_factor': profit_factor,
+        'rolling_expectancy_r': _window_sum(r_multiples(columns), window) / window,
+        'rolling_drawdown_pct': (equity - window_high) / window_high * 100,
+        'drawdown_duration': drawdown_duration(equity),
+    }, index=pd.DatetimeIndex(columns['date'], name='date'))
+    return result
+
+def export_rolling(rolling, path):
+    """
+    Salva le serie in formato compatto (.npz float32) per i grafici: la precisione ridotta vale solo qui
+    """
+    np.savez(path, date=rolling.index.to_numpy(dtype='datetime64[s]'),
+             **{name: rolling[name].to_numpy(dtype=np.float32) for name in rolling.columns})
+    return path
+
+def plot_rolling(rolling, window, title, output_path):
+    panels = [
+        ('rolling_sharpe', f'Sharpe ({window} trade)'),
+        ('rolling_win_rate', 'Win Rate (%)'),
+        ('rolling_profit_factor', 'Profit Factor'),
+        ('rolling_expectancy_r', 'Expectancy (R)'),
+        ('drawdown_duration', 'Durata Drawdown (trade)'),
+    ]
+    fig, axes = plt.subplots(len(panels), 1, figsize=(20, 3 * len(panels)), sharex=True)
+    for ax, (column, label) in zip(axes, panels):
+        series = rolling[column].dropna()
+        plot_decimated(ax, series.index, series.to_numpy(), color='blue', linewidth=1)
+        ax.set_ylabel(label, fontsize=10)
+        ax.grid(True, linestyle='--', alpha=0.7)
+    axes[0].set_title(title, fontsize=14, pad=20)
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=SAVE_DPI, bbox_inches='tight')
+    plt.close(fig)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Metriche mobili (Sharpe, win rate, profit factor, expectancy in R, drawdown)')
+    parser.add_argument('ledger', nargs='?', default='outputs/trading_results_30Min.csv')
+    parser.add_argument('--window', type=int, default=50, help='numero di trade della finestra mobile')
+    parser.add_argument('--capital', type=float, default=STARTING_CAPITAL)
+    args = parser.parse_args()
+
+    columns = from_trading_results(load_trading_results(args.ledger))
+    rolling = rolling_metrics(columns, args.window, args.capital)
+
+    name = os.path.splitext(os.path.basename(args.ledger))[0].replace('trading_results_', '')
+    export_rolling(rolling, f'outputs/rolling_{name}_{args.window}.npz')
+    plot_rolling(rolling, args.window, f'Metriche mobili ORB {name}', f'outputs/rolling_{name}_{args.window}.png')
+
+    last = rolling.iloc[-1]
+    print(f"Ultimi {args.window} trade: Sharpe {last['rolling_sharpe']:.2f}, Win Rate {last['rolling_win_rate']:.1f}%, "
+          f"Profit Factor {last['rolling_profit_factor']:.2f}, Expectancy {last['rolling_expectancy_r']:.2f}R")
+    print(f"Serie salvate in 'outputs/rolling_{name}_{args.window}.npz'")
@@ -0,0 +1,133 @@
+import argparse
+import csv
+import os
+from collections import deque
+
+import pandas as pd
+
+from instrumentation import finish_run, stage, start_run
+from metrics import format_stats
+from online_metrics import MetricsAccumulator
+from orb_engine import ATR_PERIOD, analyze_session, atr_from_daily, daily_bar
+
+# Colonne necessarie alla strategia ORB
+BAR_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+def iter_sessions(filepath, day_col='trading_day', chunksize=200_000, usecols=None):
+    """
+    Generatore che legge il CSV a blocchi e restituisce una sessione alla volta: (day, day_data).
+    Il file deve essere ordinato per timestamp (come quello prodotto da clear_dataset.py).
+    In memoria restano solo il blocco corrente e la sessione non ancora completa.
+    """
+    if usecols is None:
+        usecols = BAR_COLUMNS + [day_col]
+
+    carry = None
+    for chunk in pd.read_csv(filepath, chunksize=chunksize, usecols=usecols):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+
+        # L'ultima sessione del blocco potrebbe continuare nel blocco successivo
+        days = chunk[day_col]
+        last_day = days.iloc[-1]
+        is_last = days == last_day
+        carry = chunk[is_last]
+
+        for day, day_data in chunk[~is_last].groupby(day_col, sort=False):
+            yield day, day_data
+
+    if carry is not None and len(carry) > 0:
+        yield carry[day_col].iloc[0], carry
+
+class DailyATRWindow:
+    """
+    Finestra mobile delle ultime `period` barre giornaliere per il calcolo dell'ATR
+    """
+    def __init__(self, period=ATR_PERIOD):
+        self.period = period
+        self.bars = deque(maxlen=period)
+
+    def is_ready(self):
+        return len(self.bars) == self.period
+
+    def push(self, high, low, close):
+        self.bars.append((high, low, close))
+
+    def atr(self):
+        if not self.is_ready():
+            return None
+        highs, lows, closes = zip(*self.bars)
+        return atr_from_daily(highs, lows, closes)
+
+def run_streaming_backtest(filepath, starting_capital=50000, day_col='trading_day',
+                           chunksize=200_000, compound=False):
+    """
+    Backtest ORB in streaming: genera i trade una sessione alla volta con memoria costante.
+    L'ATR usa solo i 14 giorni precedenti alla sessione corrente.
+    """
+    window = DailyATRWindow()
+    current_equity = starting_capital
+
+    sessions = iter_sessions(filepath, day_col=day_col, chunksize=chunksize)
+    while True:
+        with stage('load'):
+            session = next(sessions, None)
+        if session is None:
+            break
+        day, day_data = session
+
+        with stage('atr'):
+            atr_value = window.atr()
+        trade = analyze_session(day_data, atr_value, current_equity)
+        if trade is not None:
+            if compound:
+                current_equity += trade['pnl']
+            yield trade
+
+        # Aggiorna la finestra solo dopo aver usato l'ATR dei giorni precedenti
+        window.push(*daily_bar(
+            day_data['high'].to_numpy(dtype=float),
+            day_data['low'].to_numpy(dtype=float),
+            day_data['close'].to_numpy(dtype=float),
+        ))
+
+def write_streaming_results(filepath, output_path, **kwargs):
+    """
+    Scrive i trade su CSV man mano che vengono generati, senza tenerli in memoria.
+    Le statistiche vengono aggiornate trade per trade.
+    Returns: MetricsAccumulator con le metriche della run
+    """
+    accumulator = MetricsAccumulator(kwargs.get('starting_capital', 50000))
+    writer = None
+    with open(output_path, 'w', newline='') as f:
+        for trade in run_streaming_backtest(filepath, **kwargs):
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(trade.keys()))
+                writer.writeheader()
+            with stage('output'):
+                writer.writerow(trade)
+            accumulator.add_trade(trade)
+    return accumulator
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backtest ORB in streaming (una sessione alla volta)')
+    parser.add_argument('files', nargs='*', default=['./data/qqq_5Min.csv'],
+                        help='CSV puliti con colonne timestamp, open, high, low, close, volume, trading_day')
+    parser.add_argument('--day-col', default='trading_day')
+    parser.add_argument('--chunksize', type=int, default=200_000)
+    parser.add_argument('--capital', type=float, default=50000)
+    args = parser.parse_args()
+
+    start_run('streaming')
+    for filepath in args.files:
+        name = os.path.splitext(os.path.basename(filepath))[0]
+        output_path = f'outputs/trading_results_{name}_streaming.csv'
+        accumulator = write_streaming_results(filepath, output_path, starting_capital=args.capital,
+                                              day_col=args.day_col, chunksize=args.chunksize)
+        print(f"{filepath}: {accumulator.n_trades} trade salvati in '{output_path}'")
+        if accumulator.n_trades > 0:
+            stats = format_stats(accumulator.snapshot())
+            for key in ('Profitto Totale', 'Win Rate (%)', 'Profit Factor', 'Max Drawdown (%)', 'Sharpe Ratio'):
+                print(f"  {key}: {stats[key]}")
+
+    finish_run()
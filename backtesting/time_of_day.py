@@ -0,0 +1,156 @@
+import argparse
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+from ledger import _to_utc, from_trading_results, load_trading_results
+from plotting import SAVE_DPI
+
+MARKET_TZ = 'America/New_York'
+MARKET_OPEN_MINUTE = 9 * 60 + 30
+SESSION_MINUTES = 390
+WEEKDAYS = ['Lun', 'Mar', 'Mer', 'Gio', 'Ven']
+MONTHS = ['Gen', 'Feb', 'Mar', 'Apr', 'Mag', 'Giu', 'Lug', 'Ago', 'Set', 'Ott', 'Nov', 'Dic']
+
+def local_fields(utc_times, tz=MARKET_TZ):
+    """
+    Minuto dalla apertura, giorno della settimana e mese (0-based) da timestamp UTC, in un'unica conversione
+    """
+    local = pd.DatetimeIndex(utc_times).tz_localize('UTC').tz_convert(tz)
+    minute = (local.hour * 60 + local.minute).to_numpy() - MARKET_OPEN_MINUTE
+    return minute, local.dayofweek.to_numpy(), local.month.to_numpy() - 1
+
+def _ratio(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.full(len(numerator), np.nan), where=denominator > 0)
+
+def entry_minute_stats(columns, bucket=5):
+    """
+    Istogramma degli orari di breakout e win rate / PnL medio per fascia di `bucket` minuti dall'apertura
+    """
+    valid = ~np.isnat(columns['entry_time'])
+    minute, _, _ = local_fields(columns['entry_time'][valid])
+    n_buckets = SESSION_MINUTES // bucket + 1
+    idx = np.clip(minute // bucket, 0, n_buckets - 1)
+    pnl = columns['pnl'][valid]
+
+    trades = np.bincount(idx, minlength=n_buckets)
+    wins = np.bincount(idx, weights=pnl > 0, minlength=n_buckets)
+    total_pnl = np.bincount(idx, weights=pnl, minlength=n_buckets)
+
+    start = MARKET_OPEN_MINUTE + np.arange(n_buckets) * bucket
+    labels = [f'{m // 60:02d}:{m % 60:02d}' for m in start]
+    return pd.DataFrame({
+        'trades': trades,
+        'win_rate': _ratio(wins, trades) * 100,
+        'avg_pnl': _ratio(total_pnl, trades),
+        'total_pnl': total_pnl,
+    }, index=pd.Index(labels, name='entry'))
+
+def seasonality_grids(columns):
+    """
+    Griglie giorno della settimana x mese (trade, win rate, PnL medio) con bincount sull'indice piatto
+    """
+    _, weekday, month = local_fields(columns['date'])
+    keep = weekday < 5
+    flat = weekday[keep] * 12 + month[keep]
+    pnl = columns['pnl'][keep]
+
+    trades = np.bincount(flat, minlength=60)
+    wins = np.bincount(flat, weights=pnl > 0, minlength=60)
+    total = np.bincount(flat, weights=pnl, minlength=60)
+
+    def grid(values):
+        return pd.DataFrame(values.reshape(5, 12), index=WEEKDAYS, columns=MONTHS)
+
+    return {
+        'trades': grid(trades),
+        'win_rate': grid(_ratio(wins, trades) * 100),
+        'avg_pnl': grid(_ratio(total, trades)),
+    }
+
+def bar_profile(data_path, bucket=5, chunksize=500_000, naive_tz=MARKET_TZ):
+    """
+    Profilo intraday di tutte le barre del file: volume medio e range medio (%) per fascia oraria.
+    Legge il CSV a blocchi e accumula con bincount, senza tenere in memoria l'intero file.
+    naive_tz: fuso dei timestamp senza offset (es. 'America/Chicago' per i CSV di IB)
+    """
+    n_buckets = SESSION_MINUTES // bucket + 1
+    bars = np.zeros(n_buckets)
+    volume = np.zeros(n_buckets)
+    range_pct = np.zeros(n_buckets)
+
+    for chunk in pd.read_csv(data_path, usecols=['timestamp', 'high', 'low', 'close', 'volume'], chunksize=chunksize):
+        minute, _, _ = local_fields(_to_utc(chunk['timestamp'], naive_tz))
+        # Gli orari inesistenti o ambigui del cambio d'ora (NaT) restano fuori dal profilo
+        inside = (minute >= 0) & (minute < SESSION_MINUTES)
+        idx = minute[inside].astype(np.int64) // bucket
+        bars += np.bincount(idx, minlength=n_buckets)
+        volume += np.bincount(idx, weights=chunk['volume'].to_numpy(dtype=float)[inside], minlength=n_buckets)
+        spread = (chunk['high'] - chunk['low']) / chunk['close'] * 100
+        range_pct += np.bincount(idx, weights=spread.to_numpy(dtype=float)[inside], minlength=n_buckets)
+
+    start = MARKET_OPEN_MINUTE + np.arange(n_buckets) * bucket
+    labels = [f'{m // 60:02d}:{m % 60:02d}' for m in start]
+    return pd.DataFrame({
+        'bars': bars.astype(int),
+        'avg_volume': _ratio(volume, bars),
+        'avg_range_pct': _ratio(range_pct, bars),
+    }, index=pd.Index(labels, name='bar')).iloc[:-1]
+
+def plot_time_of_day(entry_stats, grids, title, output_path, profile=None):
+    n_rows = 3 if profile is not None else 2
+    fig, axes = plt.subplots(n_rows, 2, figsize=(20, 6 * n_rows))
+
+    traded = entry_stats[entry_stats['trades'] > 0]
+    axes[0, 0].bar(traded.index, traded['trades'], color='blue')
+    axes[0, 0].set_title('Orario di breakout (trade per fascia)', fontsize=12)
+    axes[0, 1].bar(traded.index, traded['win_rate'], color='green')
+    axes[0, 1].set_title("Win Rate (%) per orario d'entrata", fontsize=12)
+    for ax in axes[0]:
+        ax.tick_params(axis='x', rotation=90)
+
+    sns.heatmap(grids['win_rate'], annot=True, fmt='.0f', cmap='RdYlGn', center=50, ax=axes[1, 0])
+    axes[1, 0].set_title('Win Rate (%) giorno x mese', fontsize=12)
+    sns.heatmap(grids['avg_pnl'], annot=True, fmt='.0f', cmap='RdYlGn', center=0, ax=axes[1, 1])
+    axes[1, 1].set_title('PnL medio ($) giorno x mese', fontsize=12)
+
+    if profile is not None:
+        axes[2, 0].bar(profile.index, profile['avg_volume'], color='gray')
+        axes[2, 0].set_title('Volume medio per fascia (tutte le barre)', fontsize=12)
+        axes[2, 1].bar(profile.index, profile['avg_range_pct'], color='orange')
+        axes[2, 1].set_title('Range medio (%) per fascia (tutte le barre)', fontsize=12)
+        for ax in axes[2]:
+            ax.tick_params(axis='x', rotation=90)
+
+    fig.suptitle(title, fontsize=14)
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=SAVE_DPI, bbox_inches='tight')
+    plt.close(fig)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Analisi per orario di entrata e stagionalità (giorno/mese)')
+    parser.add_argument('ledger', nargs='?', default='outputs/trading_results_30Min.csv')
+    parser.add_argument('--data', default=None, help='CSV delle barre per il profilo intraday (es. ./data/qqq_5Min.csv)')
+    parser.add_argument('--bucket', type=int, default=5, help='ampiezza delle fasce in minuti')
+    parser.add_argument('--naive-tz', default=MARKET_TZ, help="fuso dei timestamp senza offset (es. 'America/Chicago' per IB)")
+    args = parser.parse_args()
+
+    columns = from_trading_results(load_trading_results(args.ledger))
+    entry_stats = entry_minute_stats(columns, args.bucket)
+    grids = seasonality_grids(columns)
+    profile = bar_profile(args.data, args.bucket, naive_tz=args.naive_tz) if args.data else None
+
+    name = os.path.splitext(os.path.basename(args.ledger))[0].replace('trading_results_', '')
+    plot_time_of_day(entry_stats, grids, f'Orari e stagionalità ORB {name}', f'outputs/time_of_day_{name}.png', profile)
+    entry_stats.to_csv(f'outputs/time_of_day_{name}_entry.csv')
+
+    pd.set_option('display.width', 200)
+    print(entry_stats[entry_stats['trades'] > 0].to_string(float_format=lambda x: f'{x:,.2f}'))
+    print("\nWin Rate (%) giorno x mese:")
+    print(grids['win_rate'].to_string(float_format=lambda x: f'{x:.0f}'))
+    print(f"\nGrafici salvati in 'outputs/time_of_day_{name}.png'")
@@ -0,0 +1,304 @@
+import argparse
+import contextlib
+import cProfile
+import importlib.util
+import io
+import json
+import os
+import platform
+import pstats
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from synthetic_data import format_timestamps, generate_bars
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKTESTING_DIR = os.path.join(REPO_ROOT, 'backtesting')
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+# Funzioni degli script che appartengono a ciascuno stadio, usate con cProfile
+# per le varianti senza i timer di instrumentation.py
+DEFAULT_STAGE_FUNCTIONS = {
+    'load': ['read_csv', 'to_datetime'],
+    'atr': ['calculate_ATR'],
+    'fills': ['execute_trade'],
+    'output': ['to_csv'],
+}
+
+# Varianti della strategia: script, CSV di input atteso e analisi corrispondente
+VARIANTS = {
+    'backtest': {
+        'script': 'backtesting/backtest.py',
+        'data': {'qqq_30Min.csv': ('QQQ', 30, 'local')},
+        'signal': 'analyze_trading_day',
+        'ledger': 'trading_results_30Min.csv',
+        'analyze': ('backtesting/analyze_backtest.py', 'trading_results_5Min_IVB.csv'),
+    },
+    'vwap': {
+        'script': 'backtesting/backtest_VWAP.py',
+        'data': {'qqq_1Min_cleared.csv': ('QQQ', 1, 'utc'), 'qqq_30Min.csv': ('QQQ', 30, 'local')},
+        'signal': 'analyze_trading_day',
+        'ledger': 'trading_results_1Min_VWAP.csv',
+        'analyze': ('backtesting/analyze_backtest_VWAP.py', 'trading_results_15min_VWAP.csv'),
+    },
+    'vwap_mnq': {
+        'script': 'backtesting/backtest_VWAP_MNQ.py',
+        'data': {'MNQ_30Min.csv': ('MNQ', 30, 'naive')},
+        'signal': 'analyze_trading_day',
+        'ledger': 'trading_results_MNQ_VWAP.csv',
+        'analyze': ('backtesting/analyze_backtest_VWAP_MNQ.py', 'trading_results_MNQ_VWAP.csv'),
+    },
+    'ivb': {
+        'script': 'backtesting/backtest_IVB.py',
+        'data': {'qqq_5Min.csv': ('QQQ', 5, 'naive'), 'qqq_30Min.csv': ('QQQ', 30, 'local')},
+        'signal': 'analyze_trading_day',
+        'ledger': 'trading_results_5min_IVB.csv',
+        'analyze': ('backtesting/analyze_backtest.py', 'trading_results_5Min_IVB.csv'),
+    },
+    'framework': {
+        'script': 'backtesting/backtest_framework.py',
+        'data': {'qqq_data.csv': ('QQQ', 5, 'utc')},
+        'requires': 'backtesting',
+        'instrumented': False,
+        'signal': 'next',
+        'stages': {
+            'load': ['prepare_data'],
+            'atr': ['calculate_ATR'],
+            'fills': ['_process_orders'],
+            'analytics': ['compute_stats'],
+            'output': ['plot'],
+        },
+    },
+    'streaming': {
+        'script': 'backtesting/streaming.py',
+        'data': {'qqq_5Min.csv': ('QQQ', 5, 'local')},
+        'argv': ['data/qqq_5Min.csv'],
+        'signal': 'analyze_session',
+        'stages': {
+            'load': ['iter_sessions'],
+            'atr': ['atr_from_daily'],
+            'fills': ['execute_trade'],
+            'output': ['writerow'],
+        },
+    },
+}
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def prepare_workdir(workdir, variant, years, seed, cache_dir, timeframe=None):
+    """
+    Crea data/ e outputs/ nella cartella di lavoro con i CSV sintetici attesi dallo script.
+    I CSV vengono generati una sola volta in cache_dir e condivisi tra le varianti.
+    Returns: numero di barre del CSV principale
+    """
+    os.makedirs(os.path.join(workdir, 'data'), exist_ok=True)
+    os.makedirs(os.path.join(workdir, 'outputs'), exist_ok=True)
+
+    n_rows = 0
+    for i, (filename, (symbol, tf, ts_format)) in enumerate(variant['data'].items()):
+        if i == 0 and timeframe is not None:
+            tf = timeframe
+        cached = os.path.join(cache_dir, f'{symbol}_{tf}Min_{ts_format}.csv')
+        if not os.path.exists(cached):
+            df = format_timestamps(generate_bars(symbol, years, tf, seed=seed), ts_format)
+            if symbol == 'MNQ':
+                # Formato IB: serve anche la colonna day usata da analyze_backtest_VWAP_MNQ.py
+                df['day'] = df['trading_day']
+            df.to_csv(cached, index=False)
+
+        shutil.copyfile(cached, os.path.join(workdir, 'data', filename))
+        if i == 0:
+            with open(cached) as f:
+                n_rows = sum(1 for _ in f) - 1
+    return n_rows
+
+def run_script(script, argv=None):
+    """
+    Esegue uno script della repo nella cartella corrente, sopprimendo l'output a terminale
+    """
+    old_argv = sys.argv
+    sys.argv = [script] + (argv or [])
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            runpy.run_path(os.path.join(REPO_ROOT, script), run_name='__main__')
+    finally:
+        sys.argv = old_argv
+
+def cumulative_times(profile):
+    """
+    Tempo cumulativo per nome di funzione dal profilo cProfile
+    """
+    times = {}
+    for (filename, lineno, funcname), (cc, nc, tt, ct, callers) in pstats.Stats(profile).stats.items():
+        times[funcname] = times.get(funcname, 0.0) + ct
+    return times
+
+def stage_breakdown(times, variant):
+    stage_functions = variant.get('stages', DEFAULT_STAGE_FUNCTIONS)
+    stages = {}
+    for stage, functions in stage_functions.items():
+        stages[stage] = sum(times.get(f, 0.0) for f in functions)
+
+    # Il segnale (OR/breakout) è il tempo della funzione giornaliera al netto di ATR e fill
+    signal_total = times.get(variant['signal'], 0.0)
+    stages['signal'] = max(signal_total - stages.get('atr', 0.0) - stages.get('fills', 0.0), 0.0)
+    return stages
+
+def profile_stages(variant):
+    """
+    Tempi per stadio di una singola esecuzione: dai timer di instrumentation.py
+    quando lo script è strumentato, altrimenti da cProfile
+    """
+    if variant.get('instrumented', True):
+        import instrumentation
+        instrumentation.enable()
+        try:
+            run_script(variant['script'], variant.get('argv'))
+            result = instrumentation.summary()
+        finally:
+            instrumentation.disable()
+        stages = {name: s['total'] for name, s in result['stages'].items()}
+        stages.update({f'count_{name}': value for name, value in result['counters'].items()})
+        return stages
+
+    profile = cProfile.Profile()
+    profile.enable()
+    run_script(variant['script'], variant.get('argv'))
+    profile.disable()
+    return stage_breakdown(cumulative_times(profile), variant)
+
+def benchmark_variant(name, variant, years, seed, cache_dir, repeat=1, timeframe=None):
+    """
+    Misura una variante: tempo totale (strumentazione spenta) e tempi per stadio.
+    Una variante che fallisce interrompe il benchmark: nessun risultato parziale viene salvato
+    """
+    required = variant.get('requires')
+    if required and importlib.util.find_spec(required) is None:
+        return {'skipped': f"modulo '{required}' non installato"}
+
+    workdir = tempfile.mkdtemp(prefix=f'bench_{name}_')
+    cwd = os.getcwd()
+    try:
+        n_rows = prepare_workdir(workdir, variant, years, seed, cache_dir, timeframe)
+        os.chdir(workdir)
+
+        wall_times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run_script(variant['script'], variant.get('argv'))
+            wall_times.append(time.perf_counter() - start)
+
+        stages = profile_stages(variant)
+
+        # Analisi del ledger con lo script analyze_backtest* corrispondente
+        if 'analyze' in variant:
+            analyze_script, ledger_name = variant['analyze']
+            ledger_path = os.path.join('outputs', variant['ledger'])
+            if os.path.exists(ledger_path):
+                if ledger_name != variant['ledger']:
+                    # Copia anche il ledger tipizzato .npz, letto da load_trading_results
+                    for ext in ('.csv', '.npz'):
+                        source = os.path.splitext(ledger_path)[0] + ext
+                        if os.path.exists(source):
+                            shutil.copyfile(source, os.path.join('outputs', os.path.splitext(ledger_name)[0] + ext))
+                start = time.perf_counter()
+                run_script(analyze_script)
+                stages['analytics'] = time.perf_counter() - start
+
+        return {
+            'rows': n_rows,
+            'wall_time': min(wall_times),
+            'wall_times': wall_times,
+            'stages': stages,
+        }
+    except Exception as e:
+        raise RuntimeError(f"Variante '{name}' fallita: {type(e).__name__}: {e}") from e
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def compare_results(current, baseline_path):
+    """
+    Confronta i tempi totali con un risultato precedente (rapporto > 1 = più lento)
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    print(f"\nConfronto con {baseline.get('commit')} ({os.path.basename(baseline_path)}):")
+    for name, result in current['variants'].items():
+        old = baseline['variants'].get(name, {})
+        if 'wall_time' in result and 'wall_time' in old:
+            ratio = result['wall_time'] / old['wall_time']
+            flag = '  <-- REGRESSIONE' if ratio > 1.1 else ''
+            print(f"{name:<10} {old['wall_time']:8.3f}s -> {result['wall_time']:8.3f}s  x{ratio:.2f}{flag}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark delle varianti di backtest ORB su dati sintetici')
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--timeframe', type=int, default=None,
+                        help='forza il timeframe (minuti) del CSV principale di ogni variante')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--compare', default=None, help='JSON di un benchmark precedente')
+    args = parser.parse_args()
+
+    # Backend headless per le analisi e import dei moduli in backtesting/
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    sys.path.insert(0, BACKTESTING_DIR)
+    if importlib.util.find_spec('backtesting') is not None:
+        from backtesting import Backtest
+        _plot = Backtest.plot
+        Backtest.plot = lambda self, **kwargs: _plot(self, **{**kwargs, 'open_browser': False})
+
+    results = {
+        'commit': git_commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'config': {'years': args.years, 'timeframe': args.timeframe, 'seed': args.seed, 'repeat': args.repeat},
+        'variants': {},
+    }
+
+    cache_dir = tempfile.mkdtemp(prefix='bench_data_')
+    try:
+        for name in args.variants:
+            print(f"Benchmark {name}...", flush=True)
+            result = benchmark_variant(name, VARIANTS[name], args.years, args.seed, cache_dir,
+                                       args.repeat, args.timeframe)
+            results['variants'][name] = result
+
+            if 'wall_time' in result:
+                stages = ', '.join(f"{k}={v:.3f}s" for k, v in result['stages'].items()
+                                   if not k.startswith('count_'))
+                print(f"  {result['rows']} barre, totale {result['wall_time']:.3f}s ({stages})")
+            else:
+                print(f"  {result}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    output_path = os.path.join(RESULTS_DIR, f"bench_{stamp}_{results['commit'] or 'nogit'}.json")
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nRisultati salvati in '{output_path}'")
+
+    if args.compare:
+        compare_results(results, args.compare)
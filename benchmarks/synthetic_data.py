@@ -0,0 +1,151 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import USFederalHolidayCalendar
+
+MARKET_TIMEZONE = 'America/New_York'
+MARKET_OPEN_MINUTE = 9 * 60 + 30
+MARKET_CLOSE_MINUTE = 16 * 60
+HALF_DAY_CLOSE_MINUTE = 13 * 60
+
+# Prezzo iniziale e volume medio per barra da 1 minuto dei simboli più usati
+SYMBOL_DEFAULTS = {
+    'QQQ': {'price': 110.0, 'volume': 60_000},
+    'SPY': {'price': 200.0, 'volume': 90_000},
+    'IWM': {'price': 120.0, 'volume': 30_000},
+    'MNQ': {'price': 7000.0, 'volume': 1_500},
+}
+
+def session_calendar(start, years):
+    """
+    Calendario delle sessioni: giorni feriali senza festività federali.
+    Returns: DataFrame con colonne trading_day e close_minute (13:00 per le mezze giornate)
+    """
+    start = pd.Timestamp(start)
+    end = start + pd.DateOffset(years=years) - pd.Timedelta(days=1)
+
+    holidays = USFederalHolidayCalendar().holidays(start=start, end=end)
+    days = pd.bdate_range(start, end)
+    days = days[~days.isin(holidays)]
+
+    # Mezze giornate: 3 luglio, giorno dopo il Ringraziamento, vigilia di Natale
+    thanksgiving = holidays[(holidays.month == 11) & (holidays.day >= 22)]
+    half_days = set(thanksgiving + pd.Timedelta(days=1))
+    for year in range(start.year, end.year + 1):
+        half_days.add(pd.Timestamp(year, 7, 3))
+        half_days.add(pd.Timestamp(year, 12, 24))
+
+    close_minute = np.where(days.isin(list(half_days)), HALF_DAY_CLOSE_MINUTE, MARKET_CLOSE_MINUTE)
+    return pd.DataFrame({'trading_day': days, 'close_minute': close_minute})
+
+def u_shape(x, depth):
+    """
+    Curva a U sull'orario della sessione (x in [0, 1]): massimo all'apertura e alla chiusura
+    """
+    return 1 + depth * ((2 * x - 1) ** 2) - depth / 3
+
+def generate_bars(symbol='QQQ', years=1, timeframe=5, seed=42, start='2016-01-04',
+                  daily_vol=0.012, gap_vol=0.004, gap_jump_prob=0.03):
+    """
+    Genera barre intraday sintetiche realistiche per un simbolo.
+    Curva dei volumi e volatilità a U, gap overnight (con salti occasionali) e mezze giornate.
+    Le barre vanno dalle 9:30 alla chiusura inclusa, come nei CSV puliti da clear_dataset.py.
+    """
+    rng = np.random.default_rng(seed)
+    defaults = SYMBOL_DEFAULTS.get(symbol, {'price': 100.0, 'volume': 50_000})
+
+    sessions = session_calendar(start, years)
+    bars_per_day = (sessions['close_minute'].to_numpy() - MARKET_OPEN_MINUTE) // timeframe + 1
+    n_bars = int(bars_per_day.sum())
+
+    # Indice della barra all'interno della propria sessione
+    day_start = np.repeat(np.cumsum(bars_per_day) - bars_per_day, bars_per_day)
+    bar_in_day = np.arange(n_bars) - day_start
+    minute_of_day = MARKET_OPEN_MINUTE + bar_in_day * timeframe
+    session_pos = bar_in_day / (MARKET_CLOSE_MINUTE - MARKET_OPEN_MINUTE) * timeframe
+
+    # Rendimenti per barra con volatilità a U
+    bar_vol = daily_vol * np.sqrt(timeframe / 390) * u_shape(session_pos, 1.5)
+    returns = rng.normal(0, 1, n_bars) * bar_vol
+
+    # Gap overnight sulla prima barra di ogni sessione
+    gaps = rng.normal(0, gap_vol, len(sessions))
+    jumps = rng.random(len(sessions)) < gap_jump_prob
+    gaps[jumps] += rng.normal(0, gap_vol * 5, jumps.sum())
+    gaps[0] = 0
+    is_first = bar_in_day == 0
+    returns_gap = np.zeros(n_bars)
+    returns_gap[is_first] = gaps
+
+    log_close = np.log(defaults['price']) + np.cumsum(returns_gap + returns)
+    close = np.exp(log_close)
+    open_ = np.exp(log_close - returns)
+
+    wick = np.abs(rng.normal(0, 0.5, (2, n_bars))) * bar_vol
+    high = np.maximum(open_, close) * np.exp(wick[0])
+    low = np.minimum(open_, close) * np.exp(-wick[1])
+
+    volume = defaults['volume'] * timeframe * u_shape(session_pos, 2.0) * rng.lognormal(0, 0.4, n_bars)
+    volume = np.maximum(volume.astype(np.int64), 1)
+
+    # Prezzi al centesimo (tick dei futures a 0.25)
+    tick = 0.25 if symbol == 'MNQ' else 0.01
+    open_, high, low, close = (np.round(p / tick) * tick for p in (open_, high, low, close))
+
+    # VWAP cumulativo della sessione sul prezzo tipico
+    average = (high + low + close) / 3
+    cum_pv = np.cumsum(average * volume)
+    cum_vol = np.cumsum(volume)
+    first_idx = np.flatnonzero(is_first)
+    prev_pv = np.concatenate([[0.0], cum_pv[first_idx[1:] - 1]])
+    prev_vol = np.concatenate([[0], cum_vol[first_idx[1:] - 1]])
+    vwap = (cum_pv - np.repeat(prev_pv, bars_per_day)) / (cum_vol - np.repeat(prev_vol, bars_per_day))
+
+    trading_day = np.repeat(sessions['trading_day'].to_numpy(), bars_per_day)
+    timestamp = pd.DatetimeIndex(trading_day + pd.to_timedelta(minute_of_day, unit='m'))
+    timestamp = timestamp.tz_localize(MARKET_TIMEZONE)
+
+    return pd.DataFrame({
+        'timestamp': timestamp,
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume,
+        'average': average,
+        'vwap': vwap,
+        'trading_day': pd.DatetimeIndex(trading_day).date,
+    })
+
+def format_timestamps(df, ts_format):
+    """
+    Formatta i timestamp come nei diversi CSV della repo:
+    'utc' (Alpaca), 'local' (ET con offset) oppure 'naive' (IB dopo clear_dataset_IB.py)
+    """
+    df = df.copy()
+    if ts_format == 'utc':
+        df['timestamp'] = df['timestamp'].dt.tz_convert('UTC')
+    elif ts_format == 'naive':
+        df['timestamp'] = df['timestamp'].dt.tz_localize(None)
+    return df
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generatore di barre intraday sintetiche')
+    parser.add_argument('--symbols', nargs='+', default=['QQQ'])
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--timeframe', type=int, default=5, help='minuti per barra')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--start', default='2016-01-04')
+    parser.add_argument('--ts-format', choices=['utc', 'local', 'naive'], default='utc')
+    parser.add_argument('--out', default='data/synthetic')
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for i, symbol in enumerate(args.symbols):
+        df = generate_bars(symbol, args.years, args.timeframe, seed=args.seed + i, start=args.start)
+        df = format_timestamps(df, args.ts_format)
+        path = os.path.join(args.out, f'{symbol}_{args.timeframe}Min.csv')
+        df.to_csv(path, index=False)
+        print(f"{symbol}: {len(df)} barre, {df['trading_day'].nunique()} sessioni salvate in '{path}'")
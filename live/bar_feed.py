@@ -0,0 +1,80 @@
+import asyncio
+import inspect
+
+class BarFeed:
+    """
+    Sottoscrizione persistente alle candele di un contratto (reqHistoricalData con keepUpToDate).
+    IB aggiorna la candela in formazione a ogni tick di aggiornamento: quando ne compare una nuova,
+    la precedente è chiusa e viene passata a on_bar_close. Nessuna richiesta di rete per candela.
+    on_bar_close può essere una coroutine: viene schedulata sul loop senza bloccare gli eventi di IB.
+    """
+
+    def __init__(self, ib, contract, bar_minutes=5, on_bar_close=None, use_rth=True, pacing=None):
+        self.ib = ib
+        self.pacing = pacing
+        self.contract = contract
+        self.bar_size = f'{bar_minutes} mins'
+        self.on_bar_close = on_bar_close
+        self.use_rth = use_rth
+        self.bars = None
+        self.last_closed = None
+
+    async def start(self):
+        """
+        Avvia la sottoscrizione. Le date delle candele sono in UTC (formatDate=2).
+        Returns: candele già chiuse della giornata (storico iniziale, senza quella in formazione)
+        """
+        request = lambda: self.ib.reqHistoricalDataAsync(
+            self.contract,
+            endDateTime='',
+            durationStr='1 D',
+            barSizeSetting=self.bar_size,
+            whatToShow='TRADES',
+            useRTH=self.use_rth,
+            formatDate=2,
+            keepUpToDate=True
+        )
+        # Anche la sottoscrizione conta come richiesta storica per i limiti di IB
+        self.bars = await (self.pacing.historical(self.contract.conId, request) if self.pacing else request())
+        self.bars.updateEvent += self._on_update
+        closed = list(self.bars[:-1])
+        if closed and self.last_closed is None:
+            self.last_closed = closed[-1].date
+        return closed
+
+    def _on_update(self, bars, has_new_bar):
+        if not has_new_bar or len(bars) < 2:
+            return
+        bar = bars[-2]
+        # Dopo una riconnessione lo storico viene riconsegnato: ogni candela esce una sola volta
+        if self.last_closed is not None and bar.date <= self.last_closed:
+            return
+        self.last_closed = bar.date
+        self._emit(bar)
+
+    def _emit(self, bar):
+        if self.on_bar_close is None:
+            return
+        result = self.on_bar_close(bar)
+        if inspect.isawaitable(result):
+            asyncio.ensure_future(result)
+
+    def stop(self):
+        if self.bars is not None:
+            self.bars.updateEvent -= self._on_update
+            if self.ib.isConnected():
+                self.ib.cancelHistoricalData(self.bars)
+            self.bars = None
+
+    async def restart(self):
+        """
+        Da chiamare dopo una riconnessione: la sottoscrizione precedente non esiste più lato IB.
+        Le candele chiuse durante la disconnessione vengono consegnate in ordine.
+        """
+        last_closed = self.last_closed
+        self.stop()
+        missed = [bar for bar in await self.start() if last_closed is not None and bar.date > last_closed]
+        for bar in missed:
+            self.last_closed = bar.date
+            self._emit(bar)
+        return missed
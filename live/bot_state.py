@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from typing import Any, Optional
+
+# Stati della posizione del giorno: bracket inviato -> entrata eseguita -> uscita (TP, SL o chiusura esterna).
+# CANCELLED: entrata cancellata o rifiutata prima dell'esecuzione. Un solo bracket al giorno in ogni caso.
+PENDING = 'PENDING'
+FILLED = 'FILLED'
+EXITED = 'EXITED'
+CANCELLED = 'CANCELLED'
+
+@dataclass
+class OpeningRange:
+    """
+    Candela di apertura (9:30 - 9:35 ET) catturata dal feed live
+    """
+    start: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+
+    @classmethod
+    def from_bar(cls, bar, bar_time):
+        return cls(bar_time, bar.open, bar.high, bar.low, bar.close)
+
+    def to_dict(self):
+        return {'start': self.start.isoformat(), 'open': self.open, 'high': self.high, 'low': self.low, 'close': self.close}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(datetime.fromisoformat(data['start']), data['open'], data['high'], data['low'], data['close'])
+
+    @property
+    def direction(self):
+        """
+        'LONG' se la candela è bullish, 'SHORT' se bearish, None se doji (nessun trade)
+        """
+        if self.close > self.open:
+            return 'LONG'
+        if self.close < self.open:
+            return 'SHORT'
+        return None
+
+@dataclass
+class SessionPlan:
+    """
+    Risultato del warm-up pre-apertura: tutto ciò che serve al trade, calcolato prima delle 9:30
+    """
+    day: date
+    atr: Optional[float]
+    stop_distance: Optional[float]  # Distanza dello stop in punti (ATR * 0.1)
+    account_size: float
+    market_open: Optional[datetime]  # None se oggi il mercato è chiuso
+    market_close: Optional[datetime]
+    last_entry: time
+
+    @property
+    def is_trading_day(self):
+        return self.market_open is not None
+
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'atr': self.atr,
+            'stop_distance': self.stop_distance,
+            'account_size': self.account_size,
+            'market_open': None if self.market_open is None else self.market_open.isoformat(),
+            'market_close': None if self.market_close is None else self.market_close.isoformat(),
+            'last_entry': self.last_entry.isoformat(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            day=date.fromisoformat(data['day']),
+            atr=data['atr'],
+            stop_distance=data['stop_distance'],
+            account_size=data['account_size'],
+            market_open=None if data['market_open'] is None else datetime.fromisoformat(data['market_open']),
+            market_close=None if data['market_close'] is None else datetime.fromisoformat(data['market_close']),
+            last_entry=time.fromisoformat(data['last_entry']),
+        )
+
+@dataclass
+class BotState:
+    """
+    Stato del bot per la sessione corrente: la decisione d'ingresso legge solo da qui, senza richieste al broker
+    """
+    current_day: Optional[date] = None
+    opening_range: Optional[OpeningRange] = None
+    position: Optional[str] = None  # None (nessun bracket oggi), PENDING, FILLED, EXITED o CANCELLED
+    trade_details: Optional[dict] = None  # Info sul trade in corso (prezzi, id, esecuzioni, P&L realizzato)
+    order: Any = None  # Oggetto ordine di ib_insync
+    plan: Optional[SessionPlan] = None  # Mantenuto al cambio di giorno: lo aggiorna il warm-up
+    warmup_day: Optional[date] = None  # Ultimo giorno per cui il warm-up è stato tentato
+    brackets: Optional[dict] = None  # Template di bracket LONG/SHORT preparati dal warm-up
+
+    @property
+    def dr_calculated_today(self):
+        return self.opening_range is not None
+
+    @property
+    def in_trade(self):
+        """
+        Bracket già inviato oggi (in attesa, in posizione o concluso): nessun nuovo ingresso
+        """
+        return self.position is not None
+
+    def to_dict(self):
+        """
+        Stato serializzabile in JSON per il journal: dei Trade di ib_insync si salvano solo gli id degli ordini
+        (order_ids in trade_details), i template dei bracket si ricostruiscono
+        """
+        details = None
+        if self.trade_details is not None:
+            details = {key: value for key, value in self.trade_details.items() if key != 'trades'}
+        return {
+            'current_day': None if self.current_day is None else self.current_day.isoformat(),
+            'opening_range': None if self.opening_range is None else self.opening_range.to_dict(),
+            'position': self.position,
+            'trade_details': details,
+            'plan': None if self.plan is None else self.plan.to_dict(),
+            'warmup_day': None if self.warmup_day is None else self.warmup_day.isoformat(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            current_day=None if data['current_day'] is None else date.fromisoformat(data['current_day']),
+            opening_range=None if data['opening_range'] is None else OpeningRange.from_dict(data['opening_range']),
+            # Snapshot precedenti alla macchina a stati: solo il flag in_trade (la riconciliazione lo precisa)
+            position=data['position'] if 'position' in data else (PENDING if data.get('in_trade') else None),
+            trade_details=data['trade_details'],
+            plan=None if data['plan'] is None else SessionPlan.from_dict(data['plan']),
+            warmup_day=None if data['warmup_day'] is None else date.fromisoformat(data['warmup_day']),
+        )
+
+    def new_day(self, day):
+        """
+        Reset giornaliero dello stato
+        """
+        self.current_day = day
+        self.opening_range = None
+        self.position = None
+        self.trade_details = None
+        self.order = None
@@ -0,0 +1,348 @@
+import asyncio
+import itertools
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from eventkit import Event
+from ib_insync import (BarData, BarDataList, CommissionReport, ContractDetails, Execution, Fill,
+                       MarketOrder, OrderStatus, Position, Trade)
+
+from orders import EOD_ORDER_REF
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backtesting'))
+from orb_engine import ibkr_commission
+
+EXCHANGE_TIMEZONE = 'America/New_York'  # timeZoneId dei ContractDetails simulati
+MARKET_TZ = ZoneInfo(EXCHANGE_TIMEZONE)
+
+class FakeClient:
+    """
+    Il minimo di ib.client usato dal bot: id degli ordini crescenti
+    """
+
+    def __init__(self, first_id=1):
+        self._ids = itertools.count(first_id)
+
+    def getReqId(self):
+        return next(self._ids)
+
+class FakeIB:
+    """
+    Broker finto con il sottoinsieme dell'interfaccia di ib_insync usato dal bot live: connessione ed eventi,
+    qualifica dei contratti, storico (giornaliere e sottoscrizione keepUpToDate), calendario della sessione,
+    ordini con ack e fill dei bracket contro le candele. Il tempo è simulato: avanza solo con push_bar.
+    Convenzioni di esecuzione di execute_trade (orb_engine.py): entrata stop al prezzo di stop, figli attivi
+    dalla candela dopo l'entrata, SL prioritario sul TP nella stessa candela. Commissioni del backtest,
+    metà per lato.
+    """
+
+    def __init__(self, timeframe=5, ack_delay=0):
+        self.timeframe = timeframe
+        self.ack_delay = ack_delay  # Secondi (reali) tra placeOrder e la conferma
+        self.client = FakeClient()
+        self.connectedEvent = Event('connectedEvent')
+        self.disconnectedEvent = Event('disconnectedEvent')
+        self.orderStatusEvent = Event('orderStatusEvent')
+        self.execDetailsEvent = Event('execDetailsEvent')
+        self.commissionReportEvent = Event('commissionReportEvent')
+        self.errorEvent = Event('errorEvent')
+        self.now_utc = datetime.now(timezone.utc)
+        self._connected = False
+        self._con_ids = itertools.count(1)
+        self._exec_ids = itertools.count(1)
+        self._contracts = {}  # conId -> contratto qualificato
+        self._by_symbol = {}  # simbolo -> conId
+        self._daily = {}  # simbolo -> DataFrame giornaliere (date, open, high, low, close, volume)
+        self._sessions = {}  # simbolo -> {giorno: [BarData in UTC]}
+        self._played = {}  # conId -> candele di oggi già uscite (l'ultima è in formazione)
+        self._subscriptions = {}  # conId -> [BarDataList keepUpToDate]
+        self._bar_index = {}  # conId -> numero di candele giocate (per attivare i figli dopo l'entrata)
+        self._fill_index = {}  # orderId -> candela in cui l'ordine è stato eseguito
+        self._held = {}  # orderId del padre -> Trade non ancora trasmessi (transmit=False)
+        self.trades = {}  # orderId -> Trade
+        self._fills = []
+        self._positions = {}  # conId -> quantità (negativa se short)
+
+    # --- Dati ---
+
+    def add_symbol(self, symbol, daily, sessions):
+        """
+        Registra i dati di un simbolo: giornaliere (tutto lo storico) e candele intraday delle sessioni da giocare
+        """
+        self._daily[symbol] = daily
+        self._sessions[symbol] = sessions
+
+    def now(self, tz=None):
+        """ Stessa firma di datetime.now: l'orologio simulato da passare al bot """
+        return self.now_utc.astimezone(tz) if tz is not None else self.now_utc.astimezone().replace(tzinfo=None)
+
+    def set_time(self, when):
+        self.now_utc = when.astimezone(timezone.utc)
+
+    # --- Connessione ---
+
+    async def connectAsync(self, host='127.0.0.1', port=7497, clientId=1, timeout=4, **kwargs):
+        self._connected = True
+        self.connectedEvent.emit()
+        return self
+
+    def isConnected(self):
+        return self._connected
+
+    def disconnect(self):
+        if not self._connected:
+            return
+        self._connected = False
+        # Come in IB: le sottoscrizioni non sopravvivono alla disconnessione, gli ordini sì (sono sul server)
+        self._subscriptions.clear()
+        self.disconnectedEvent.emit()
+
+    def drop_connection(self):
+        """ Simula la perdita della connessione lato TWS/Gateway """
+        self.disconnect()
+
+    def _check_connected(self):
+        if not self._connected:
+            raise ConnectionError('Not connected')
+
+    # --- Contratti e calendario ---
+
+    async def qualifyContractsAsync(self, *contracts):
+        self._check_connected()
+        for contract in contracts:
+            if contract.conId and contract.conId in self._contracts:
+                # Es. Future(conId=...) dal CONTFUT: si completa dal contratto già noto
+                known = self._contracts[contract.conId]
+                contract.symbol = contract.symbol or known.symbol
+                contract.exchange = contract.exchange or known.exchange
+                contract.currency = contract.currency or known.currency
+                continue
+            if contract.symbol not in self._sessions:
+                raise ValueError(f"Nessun dato di replay per {contract.symbol}")
+            if contract.symbol not in self._by_symbol:
+                self._by_symbol[contract.symbol] = next(self._con_ids)
+            contract.conId = self._by_symbol[contract.symbol]
+            self._contracts[contract.conId] = contract
+        return list(contracts)
+
+    async def reqContractDetailsAsync(self, contract):
+        self._check_connected()
+        today = self.now(MARKET_TZ).date()
+        bars = self._sessions[contract.symbol].get(today)
+        if bars:
+            start = bars[0].date.astimezone(MARKET_TZ)
+            end = bars[-1].date.astimezone(MARKET_TZ) + timedelta(minutes=self.timeframe)
+            hours = f"{start:%Y%m%d:%H%M}-{end:%Y%m%d:%H%M}"
+        else:
+            hours = f"{today:%Y%m%d}:CLOSED"
+        return [ContractDetails(contract=contract, timeZoneId=EXCHANGE_TIMEZONE, liquidHours=hours, tradingHours=hours)]
+
+    # --- Storico ---
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime='', durationStr='1 D', barSizeSetting='5 mins',
+                                     whatToShow='TRADES', useRTH=True, formatDate=1, keepUpToDate=False, **kwargs):
+        self._check_connected()
+        if barSizeSetting == '1 day':
+            # Solo sessioni concluse: la barra di oggi non serve al warm-up (pre-apertura)
+            today = self.now(MARKET_TZ).date()
+            daily = self._daily[contract.symbol]
+            daily = daily[daily['date'] < today].tail(int(durationStr.split()[0]))
+            return [BarData(date=row.date, open=row.open, high=row.high, low=row.low, close=row.close,
+                            volume=row.volume) for row in daily.itertuples()]
+
+        bars = BarDataList(self._played.get(contract.conId, []))
+        bars.contract = contract
+        bars.barSizeSetting = barSizeSetting
+        bars.keepUpToDate = keepUpToDate
+        if keepUpToDate:
+            self._subscriptions.setdefault(contract.conId, []).append(bars)
+        return bars
+
+    def cancelHistoricalData(self, bars):
+        subscriptions = self._subscriptions.get(bars.contract.conId, [])
+        if bars in subscriptions:
+            subscriptions.remove(bars)
+
+    # --- Replay ---
+
+    def open_session(self, symbol, day, at):
+        """
+        Nuova sessione: l'orologio va a `at` (es. l'orario del warm-up) e lo storico di oggi riparte da zero
+        """
+        self.set_time(at)
+        con_id = self._by_symbol.get(symbol)
+        if con_id is not None:
+            self._played[con_id] = []
+        return self._sessions[symbol].get(day, [])
+
+    async def push_bar(self, contract, bar):
+        """
+        Inizia una nuova candela: la precedente si chiude (aggiornamento con hasNewBar ai sottoscrittori),
+        si attende che il bot abbia reagito e poi gli ordini attivi vengono eseguiti contro la nuova candela
+        """
+        self.set_time(bar.date)
+        con_id = contract.conId
+        self._played.setdefault(con_id, []).append(bar)
+        for bars in list(self._subscriptions.get(con_id, [])):
+            bars.append(bar)
+            bars.updateEvent.emit(bars, True)
+        await self.settle()
+        self._bar_index[con_id] = self._bar_index.get(con_id, 0) + 1
+        self._match(contract, bar)
+
+    async def settle(self):
+        """
+        Attende tutte le coroutine schedulate dal bot (gestione della candela, invio e conferma degli ordini)
+        """
+        current = asyncio.current_task()
+        while True:
+            pending = [task for task in asyncio.all_tasks() if task is not current and not task.done()]
+            if not pending:
+                return
+            await asyncio.wait(pending)
+
+    def close_session(self, contract):
+        """
+        Fine sessione: gli ordini DAY ancora attivi vengono cancellati, come fa IB alla chiusura
+        """
+        for trade in list(self.trades.values()):
+            if trade.contract.conId == contract.conId and trade.isActive() and trade.order.tif == 'DAY':
+                self._cancel(trade)
+
+    def flatten(self, contract, price):
+        """
+        Chiude la posizione aperta a mercato a `price` (uscita a fine giornata del backtest).
+        Returns: Trade dell'ordine di chiusura, oppure None se non c'è posizione
+        """
+        position = self._positions.get(contract.conId, 0)
+        if position == 0:
+            return None
+        order = MarketOrder('SELL' if position > 0 else 'BUY', abs(position), orderId=self.client.getReqId(),
+                            orderRef=EOD_ORDER_REF)
+        trade = self._new_trade(contract, order)
+        self._fill(trade, price)
+        return trade
+
+    # --- Ordini ---
+
+    def placeOrder(self, contract, order):
+        self._check_connected()
+        if not order.orderId:
+            order.orderId = self.client.getReqId()
+        trade = self._new_trade(contract, order)
+        # I figli con transmit=False aspettano l'ultimo ordine del bracket, come in TWS
+        group = order.parentId or order.orderId
+        self._held.setdefault(group, []).append(trade)
+        if order.transmit:
+            transmitted = self._held.pop(group)
+            loop = asyncio.get_running_loop()
+            if self.ack_delay:
+                loop.call_later(self.ack_delay, self._ack, transmitted)
+            else:
+                loop.call_soon(self._ack, transmitted)
+        return trade
+
+    def openTrades(self):
+        return [trade for trade in self.trades.values() if trade.isActive()]
+
+    def fills(self):
+        return list(self._fills)
+
+    def positions(self):
+        return [Position('FAKE', self._contracts[con_id], quantity, 0.0)
+                for con_id, quantity in self._positions.items() if quantity != 0]
+
+    def _new_trade(self, contract, order):
+        trade = Trade(contract, order, OrderStatus(orderId=order.orderId, status='PendingSubmit',
+                                                   remaining=order.totalQuantity), [], [])
+        self.trades[order.orderId] = trade
+        return trade
+
+    def _set_status(self, trade, status):
+        trade.orderStatus.status = status
+        trade.statusEvent.emit(trade)
+        self.orderStatusEvent.emit(trade)
+
+    def _ack(self, trades):
+        for trade in trades:
+            if trade.orderStatus.status != 'PendingSubmit':
+                continue
+            # I figli restano in attesa finché il padre non è eseguito
+            self._set_status(trade, 'PreSubmitted' if trade.order.parentId else 'Submitted')
+
+    def _cancel(self, trade):
+        self._set_status(trade, 'Cancelled')
+        trade.cancelledEvent.emit(trade)
+
+    def _trigger_price(self, order, bar):
+        if order.orderType == 'STP':
+            if order.action == 'BUY' and bar.high >= order.auxPrice:
+                return order.auxPrice
+            if order.action == 'SELL' and bar.low <= order.auxPrice:
+                return order.auxPrice
+        elif order.orderType == 'LMT':
+            if order.action == 'SELL' and bar.high >= order.lmtPrice:
+                return order.lmtPrice
+            if order.action == 'BUY' and bar.low <= order.lmtPrice:
+                return order.lmtPrice
+        elif order.orderType == 'MKT':
+            return bar.open
+        return None
+
+    def _match(self, contract, bar):
+        index = self._bar_index[contract.conId]
+        working = [trade for trade in self.trades.values()
+                   if trade.contract.conId == contract.conId and trade.orderStatus.status in ('Submitted', 'PreSubmitted')]
+        # Stop prima dei limit: nella stessa candela lo SL ha priorità sul TP
+        working.sort(key=lambda trade: trade.order.orderType != 'STP')
+        for trade in working:
+            order = trade.order
+            if not trade.isActive():
+                continue  # Cancellato (OCA) da un fratello eseguito in questa candela
+            if order.parentId:
+                parent = self.trades[order.parentId]
+                if parent.orderStatus.status != 'Filled' or self._fill_index[parent.order.orderId] >= index:
+                    continue
+            price = self._trigger_price(order, bar)
+            if price is None:
+                continue
+            self._fill(trade, price)
+            self._fill_index[order.orderId] = index
+            if order.parentId:
+                # TP e SL sono un gruppo OCA: eseguito uno, l'altro viene cancellato
+                for sibling in self.trades.values():
+                    if sibling.order.parentId == order.parentId and sibling is not trade and sibling.isActive():
+                        self._cancel(sibling)
+            else:
+                for child in self.trades.values():
+                    if child.order.parentId == order.orderId and child.orderStatus.status == 'PreSubmitted':
+                        self._set_status(child, 'Submitted')
+
+    def _fill(self, trade, price):
+        order = trade.order
+        quantity = order.totalQuantity
+        execution = Execution(execId=f'fake.{next(self._exec_ids)}', time=self.now_utc, acctNumber='FAKE',
+                              side='BOT' if order.action == 'BUY' else 'SLD', shares=quantity, price=price,
+                              orderId=order.orderId, cumQty=quantity, avgPrice=price, orderRef=order.orderRef)
+        report = CommissionReport(execId=execution.execId, commission=ibkr_commission(quantity) / 2, currency='USD')
+        fill = Fill(trade.contract, execution, report, self.now_utc)
+        trade.fills.append(fill)
+        self._fills.append(fill)
+
+        signed = quantity if order.action == 'BUY' else -quantity
+        con_id = trade.contract.conId
+        self._positions[con_id] = self._positions.get(con_id, 0) + signed
+
+        status = trade.orderStatus
+        status.filled = quantity
+        status.remaining = 0
+        status.avgFillPrice = price
+        status.lastFillPrice = price
+        trade.fillEvent.emit(trade, fill)
+        self.execDetailsEvent.emit(trade, fill)
+        trade.commissionReportEvent.emit(trade, fill, report)
+        self.commissionReportEvent.emit(trade, fill, report)
+        self._set_status(trade, 'Filled')
+        trade.filledEvent.emit(trade)
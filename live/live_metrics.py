@@ -0,0 +1,163 @@
+import asyncio
+import bisect
+import os
+
+# Bucket dei tempi del percorso candela -> ordine (secondi) e dello slippage (tick, positivo = peggio del segnale)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SLIPPAGE_BUCKETS = (-5, -2, -1, 0, 1, 2, 5, 10, 20, 50)
+METRICS_PORT = 9108
+METRICS_INTERVAL = 15  # Secondi tra due scritture del file delle metriche
+
+HELP = {
+    'orb_stage_seconds': 'Durata degli stadi del percorso candela -> ordine',
+    'orb_slippage_ticks': "Prezzo eseguito dell'entrata rispetto al prezzo del segnale, in tick",
+    'orb_bars_total': 'Candele chiuse ricevute',
+    'orb_orders_submitted_total': 'Bracket inviati',
+    'orb_orders_rejected_total': 'Ordini rifiutati (invio fallito o errore di IB)',
+    'orb_orders_ack_timeout_total': 'Bracket senza conferma entro il timeout',
+    'orb_fills_total': 'Entrate eseguite',
+    'orb_trades_closed_total': 'Trade chiusi (TP, SL o chiusura esterna) con commissioni ricevute',
+    'orb_realized_pnl': 'P&L realizzato dei trade chiusi, commissioni incluse',
+    'orb_disconnects_total': 'Connessioni a IB perse',
+    'orb_reconnects_total': 'Riconnessioni riuscite',
+    'orb_pacing_violations_total': 'Violazioni di pacing segnalate da IB',
+    'orb_pacing_delayed_total': 'Richieste o invii ritardati dalla coda di pacing',
+}
+
+class Histogram:
+    """
+    Istogramma a bucket fissi (come quelli di Prometheus): conteggi per bucket, somma e numero di osservazioni
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # L'ultimo è +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """ Returns: [(limite, conteggio cumulativo)], con '+Inf' come ultimo limite """
+        total = 0
+        rows = []
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            rows.append((bound, total))
+        return rows
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+class LiveMetrics:
+    """
+    Metriche del bot live in memoria: istogrammi dei tempi per stadio, slippage e contatori.
+    Esposte in formato testo di Prometheus su un endpoint HTTP locale e/o scritte periodicamente su file.
+    """
+
+    def __init__(self, port=None, path=None, interval=METRICS_INTERVAL, host='127.0.0.1'):
+        self.port = port
+        self.path = path
+        self.interval = interval
+        self.host = host
+        self.histograms = {}  # (nome, etichette) -> Histogram
+        self.counters = {}  # (nome, etichette) -> valore
+        self.gauges = {}  # (nome, etichette) -> (funzione letta a ogni esportazione, tipo)
+        self._server = None
+        self._writer = None
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def stage(self, symbol, stage, seconds):
+        self.observe('orb_stage_seconds', seconds, symbol=symbol, stage=stage)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def watch(self, name, read, kind='counter', **labels):
+        """ Valore letto al momento dell'esportazione (es. il contatore delayed della PacingQueue, il P&L realizzato) """
+        self.gauges[(name, tuple(sorted(labels.items())))] = (read, kind)
+
+    def render(self):
+        """
+        Returns: tutte le metriche nel formato testo di Prometheus (0.0.4)
+        """
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            header(name, 'histogram')
+            for bound, count in histogram.cumulative():
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        values = {key: (value, 'counter') for key, value in self.counters.items()}
+        values.update({key: (read(), kind) for key, (read, kind) in self.gauges.items()})
+        for (name, labels), (value, kind) in sorted(values.items()):
+            header(name, kind)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path=None):
+        """ Scrittura atomica del file (file temporaneo e poi rename), leggibile dal textfile collector """
+        path = path or self.path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    async def _handle(self, reader, writer):
+        try:
+            await reader.readline()  # Qualsiasi percorso restituisce le metriche
+            body = self.render().encode()
+            writer.write(b"HTTP/1.1 200 OK\r\n"
+                         b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                         b"Connection: close\r\n\r\n" + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _write_loop(self):
+        while True:
+            self.write()
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        """
+        Avvia l'endpoint HTTP (se port) e la scrittura periodica (se path) sul loop del bot
+        """
+        if self.port:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            print(f"Metriche su http://{self.host}:{self.port}/metrics")
+        if self.path:
+            self._writer = asyncio.ensure_future(self._write_loop())
+
+    def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if self._writer is not None:
+            if not self._writer.done():
+                self._writer.cancel()
+            self._writer = None
+        if self.path:
+            self.write()  # Ultimo stato su file
@@ -0,0 +1,492 @@
+import os
+import sys
+import time as time_module
+from datetime import time, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from bot_state import CANCELLED, EXITED, FILLED, PENDING, BotState, OpeningRange
+from live_metrics import SLIPPAGE_BUCKETS
+from orders import EOD_ORDER_REF, prepare_brackets, submit_bracket, wait_for_ack
+from warmup import warm_up
+
+# Accumulatore delle metriche di backtest, per il P&L realizzato del bot
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backtesting'))
+from online_metrics import MetricsAccumulator
+
+# --- Parametri della strategia ---
+TIMEFRAME = 5
+MARKET_TIMEZONE = ZoneInfo("America/New_York") # Orario sessione New York
+MARKET_OPEN = time(9, 30)
+LAST_ENTRY_TIME = time(15, 50) # Ultimo orario per un'entrata
+ORDER_ACK_TIMEOUT = 5 # Secondi di attesa della conferma di IB dopo l'invio
+INACTIVE_STATUSES = ('Cancelled', 'ApiCancelled', 'Inactive') # Ordine non più eseguibile
+
+def calculate_position_size(entry_price, stop_loss, account_size, risk_percent=1, multiplier=1):
+    """
+    Calcola la size della posizione basata sul rischio (multiplier: valore di un punto, es. 2$ per MNQ)
+    """
+    risk_amount = account_size * (risk_percent / 100)
+    risk_per_share = abs(entry_price - stop_loss) * multiplier
+
+    if risk_per_share == 0:
+        return 0
+
+    position_size = int(risk_amount / risk_per_share)
+
+    # Limita la leva a 4x
+    max_position_value = account_size * 4
+    max_shares = int(max_position_value / (entry_price * multiplier))
+
+    return min(position_size, max_shares)
+
+def round_to_tick(price, tick_size=0.01):
+    """
+    Arrotonda il prezzo al tick più vicino.
+    """
+    return round(round(price / tick_size) * tick_size, 8)
+
+def validate_prices(entry_price, tp_price, stop_loss, tick_size=0.01):
+    """Validazione dei prezzi per evitare ordini non validi"""
+    if entry_price <= 0 or tp_price <= 0 or stop_loss <= 0:
+        return False
+
+    # Verifica che i prezzi siano multipli del tick size (confronto sui tick interi: il modulo
+    # in virgola mobile scarta prezzi validi, es. 104.0 % 0.01 = 0.00999...)
+    if any(abs(price / tick_size - round(price / tick_size)) > 1e-6 for price in [entry_price, tp_price, stop_loss]):
+        print(f"Prezzi non validi: Entry={entry_price}, TP={tp_price}, SL={stop_loss}")
+        return False
+
+    return True
+
+class OrbStrategy:
+    """
+    ORB live su un simbolo: stato, piano della sessione e bracket propri, isolati dalle altre istanze.
+    Candele, richieste storiche e ordini passano dal runner (connessione e coda di pacing condivise).
+    """
+
+    def __init__(self, ib, pacing, name, contract, account_size, tick_size=0.01, multiplier=1,
+                 clock=datetime.now, cache_path=None, metrics=None, journal=None):
+        self.ib = ib
+        self.pacing = pacing
+        self.name = name
+        self.contract = contract
+        self.account_size = account_size
+        self.tick_size = tick_size
+        self.multiplier = multiplier
+        self.clock = clock  # Come datetime.now(tz): nel replay è l'orologio simulato del broker finto
+        self.cache_path = cache_path  # Cache delle giornaliere (None: quella di default del warm-up)
+        self.metrics = metrics  # LiveMetrics condiviso (None: solo log)
+        self.journal = journal  # StateJournal condiviso (None: stato solo in memoria)
+        self.state = BotState()
+        self.results = MetricsAccumulator(account_size)  # Trade chiusi, dalle esecuzioni del broker
+        self.submitted = None  # perf_counter dell'invio dell'ultimo bracket (tempo fino all'esecuzione)
+        self.carried_day = None  # Ultimo giorno in cui è stata segnalata una posizione di una sessione precedente
+        if metrics is not None:
+            metrics.watch('orb_realized_pnl', lambda: self.results.equity - self.results.starting_capital,
+                          kind='gauge', symbol=name)
+
+    def log(self, message):
+        print(f"[{self.name}] {message}")
+
+    def observe(self, stage, seconds):
+        if self.metrics is not None:
+            self.metrics.stage(self.name, stage, seconds)
+
+    def count(self, name, **labels):
+        if self.metrics is not None:
+            self.metrics.inc(name, symbol=self.name, **labels)
+
+    def save_state(self, event):
+        if self.journal is not None:
+            self.journal.record(self.name, event, self.state)
+
+    async def on_bar_close(self, bar):
+        """ Chiamata dal runner appena una candela è chiusa (data in UTC, convertita in orario di mercato). """
+        received = time_module.perf_counter()
+        state = self.state
+        self.count('orb_bars_total')
+        self.observe('receipt', self.close_to_receipt(bar, received))
+        bar_time = bar.date.astimezone(MARKET_TIMEZONE)
+        self.log(f"Candela chiusa ({bar_time.strftime('%H:%M')}): Open:{bar.open:.2f} High:{bar.high:.2f} Low:{bar.low:.2f} Close:{bar.close:.2f}")
+
+        current_market_time = bar_time.time()
+        today = bar_time.date()
+        if state.current_day is not None and today < state.current_day:
+            return  # Candela di una sessione precedente (es. l'ultima di ieri, chiusa all'apertura di oggi)
+
+        # Transizioni salvate nel journal a decisione presa, fuori dal percorso dell'ordine
+        events = []
+        try:
+            # Reset giornaliero dello stato
+            if today != state.current_day:
+                self.log(f"Nuovo giorno di trading: {today}. Reset dello stato.")
+                state.new_day(today)
+                events.append('new_day')
+
+            # --- Logica del Daily Range (DR) ---
+            if not state.dr_calculated_today:
+                if current_market_time != MARKET_OPEN:
+                    if current_market_time > MARKET_OPEN:
+                        self.log("Candela di apertura non ricevuta oggi, nessun DR.")
+                    return
+                state.opening_range = OpeningRange.from_bar(bar, bar_time)
+                events.append('opening_range')
+                self.log(f"DR calcolato per oggi: High={bar.high}, Low={bar.low}")
+            updated = time_module.perf_counter()
+            self.observe('state', updated - received)
+
+            # --- Logica di Ingresso (se non siamo già in un trade) ---
+            if not state.in_trade:
+                # Controlla solo fino all'ultimo orario di entrata (anticipato nelle giornate corte)
+                plan = state.plan
+                last_entry = plan.last_entry if plan is not None and plan.day == today else LAST_ENTRY_TIME
+                if current_market_time > last_entry:
+                    return
+
+                signal_type = state.opening_range.direction
+                if signal_type is None:
+                    return  # Candela doji, no trade
+                self.observe('signal', time_module.perf_counter() - updated)
+
+                await self.place_trade(signal_type, state.opening_range, bar, received)
+        finally:
+            if events:
+                self.save_state('+'.join(events))
+
+    async def run_warmup(self):
+        """
+        Warm-up pre-apertura (una volta al giorno): giornaliere in cache, ATR e calendario della sessione
+        """
+        today = self.clock(MARKET_TIMEZONE).date()
+        self.state.warmup_day = today
+        try:
+            self.state.plan = await warm_up(self.ib, self.contract, self.account_size, MARKET_TIMEZONE,
+                                            LAST_ENTRY_TIME, today, cache_path=self.cache_path, pacing=self.pacing)
+            # Bracket LONG e SHORT pronti prima della chiusura della OR
+            self.state.brackets = prepare_brackets()
+            self.save_state('warmup')
+            if not self.state.plan.is_trading_day:
+                self.log(f"Mercato chiuso oggi ({today}), nessun trade.")
+        except Exception as e:
+            self.log(f"Errore durante il warm-up: {e}")
+
+    def restore_session(self, bars):
+        """
+        Ricostruisce il DR di oggi dallo storico consegnato dal feed (avvio a sessione iniziata), senza altre richieste.
+        Lo stato già ripristinato dal journal (trade in corso compreso) non viene azzerato.
+        """
+        for bar in bars:
+            bar_time = bar.date.astimezone(MARKET_TIMEZONE)
+            if bar_time.time() == MARKET_OPEN and bar_time.date() == self.clock(MARKET_TIMEZONE).date():
+                if self.state.current_day != bar_time.date():
+                    self.state.new_day(bar_time.date())
+                if not self.state.dr_calculated_today:
+                    self.state.opening_range = OpeningRange.from_bar(bar, bar_time)
+                    self.log(f"DR di oggi dallo storico: High={bar.high}, Low={bar.low}")
+                    self.save_state('opening_range')
+
+    def restore(self):
+        """
+        Riavvio: riprende l'ultimo snapshot di oggi dal journal (OR, trade in corso, piano del warm-up)
+        e lo riconcilia con ordini e posizioni del broker. Con il piano di oggi il warm-up non viene ripetuto.
+        Returns: True se lo stato di oggi è stato ripristinato dal journal
+        """
+        today = self.clock(MARKET_TIMEZONE).date()
+        saved, event = self.journal.latest(self.name) if self.journal is not None else (None, None)
+        if self.journal is not None:
+            self.results = MetricsAccumulator(self.account_size)
+            for details in self.journal.closed_trades(self.name):
+                self.add_result(details)
+        restored = saved is not None and saved.current_day == today
+        if restored:
+            self.state = saved
+            self.log(f"Stato di oggi ripristinato dal journal (ultima transizione: {event}): "
+                     f"DR={'sì' if saved.dr_calculated_today else 'no'}, posizione={saved.position}")
+        elif saved is not None and saved.plan is not None and saved.plan.day == today:
+            # Warm-up di oggi già fatto prima dell'apertura: basta il piano
+            self.state.plan = saved.plan
+        if self.state.plan is not None and self.state.plan.day == today:
+            self.state.warmup_day = today
+            self.state.brackets = prepare_brackets()
+        self.reconcile(today)
+        return restored
+
+    def reconcile(self, today=None):
+        """
+        Allinea lo stato a ordini aperti e posizione del broker (al riavvio e dopo ogni riconnessione):
+        ricollega i Trade del bracket salvato, riprende le esecuzioni avvenute mentre il bot era scollegato
+        (IB non le ripete come eventi) e, se il broker ha ordini aperti o una posizione nata da esecuzioni
+        di oggi che lo stato non conosce (es. crash tra invio e snapshot), blocca nuovi ingressi per oggi.
+        Una posizione portata da una sessione precedente viene solo segnalata: non blocca i giorni successivi.
+        """
+        today = today or self.clock(MARKET_TIMEZONE).date()
+        state = self.state
+        con_id = self.contract.conId
+        open_trades = {trade.order.orderId: trade for trade in self.ib.openTrades() if trade.contract.conId == con_id}
+        position = sum(p.position for p in self.ib.positions() if p.contract.conId == con_id)
+        fills = [fill for fill in self.ib.fills() if fill.contract.conId == con_id]
+        filled_today = any(fill.time.astimezone(MARKET_TIMEZONE).date() == today for fill in fills)
+
+        details = state.trade_details
+        if details and details.get('order_ids'):
+            # Dopo il riavvio restano None i Trade degli ordini già eseguiti o cancellati
+            previous = details.get('trades') or [None] * len(details['order_ids'])
+            details['trades'] = [open_trades.get(order_id, trade) for order_id, trade in zip(details['order_ids'], previous)]
+            # Le esecuzioni già registrate vengono scartate per execId
+            for fill in fills:
+                self.on_execution(None, fill)
+                if fill.commissionReport.execId:
+                    self.on_commission(None, fill, fill.commissionReport)
+            if state.position == FILLED and not position and not open_trades:
+                # Posizione chiusa senza che il bot ne abbia visto le esecuzioni: P&L non disponibile
+                state.position = EXITED
+                self.log("⚠️ Posizione chiusa dal broker durante la disconnessione, esecuzioni non disponibili")
+                self.save_state('reconciled')
+
+        if state.in_trade:
+            return
+        if open_trades or (position and filled_today):
+            if state.current_day != today:
+                state.new_day(today)
+            state.position = FILLED if position else PENDING
+            self.log(f"⚠️ Il broker ha {len(open_trades)} ordini aperti e posizione {position} non presenti nello stato: "
+                     f"nessun nuovo bracket oggi")
+            self.save_state('reconciled')
+        elif position and self.carried_day != today:
+            self.carried_day = today
+            self.log(f"⚠️ Posizione {position} aperta da una sessione precedente (nessuna esecuzione oggi): "
+                     f"non gestita dal bot, da chiudere a mano; gli ingressi di oggi restano attivi")
+
+    def close_to_receipt(self, bar, received):
+        """
+        Secondi tra la chiusura della candela (orologio di borsa) e la ricezione (perf_counter `received`)
+        """
+        bar_end = bar.date + timedelta(minutes=TIMEFRAME)
+        return (self.clock(timezone.utc) - bar_end).total_seconds() - (time_module.perf_counter() - received)
+
+    def log_latency(self, bar, received, submitted, acked):
+        """
+        Tempi del percorso decisionale: chiusura candela (orario di borsa) -> ricezione -> invio -> conferma
+        """
+        close_to_receipt = self.close_to_receipt(bar, received)
+        if acked is not None:
+            self.observe('total', close_to_receipt + acked - received)
+        self.log(f"⏱️ Latenza: chiusura candela → ricezione {close_to_receipt * 1000:.0f} ms, "
+                 f"ricezione → invio {(submitted - received) * 1000:.1f} ms, "
+                 f"invio → conferma {'n/d' if acked is None else f'{(acked - submitted) * 1000:.1f} ms'}, "
+                 f"chiusura → conferma {'n/d' if acked is None else f'{(close_to_receipt + acked - received) * 1000:.0f} ms'}")
+
+    async def place_trade(self, signal_type, entry_candle, bar, received):
+        """Piazza il trade con la logica della nostra strategia"""
+        state = self.state
+        sizing_start = time_module.perf_counter()
+
+        # ATR e calendario arrivano dal warm-up pre-apertura: nessuna richiesta storica qui
+        plan = state.plan
+        if plan is None or plan.day != state.current_day or plan.atr is None:
+            self.log("❌ Warm-up mancante per oggi (ATR non disponibile), trade annullato")
+            return
+        atr_value = plan.atr
+
+        # Calcola entry, stop loss e take profit
+        if signal_type == 'LONG':
+            entry_price = entry_candle.high
+            stop_loss = entry_price - (atr_value * 0.1)
+            risk = abs(entry_price - stop_loss)
+            take_profit = entry_price + (risk * 10)
+        else:  # SHORT
+            entry_price = entry_candle.low
+            stop_loss = entry_price + (atr_value * 0.1)
+            risk = abs(entry_price - stop_loss)
+            take_profit = entry_price - (risk * 10)
+
+        # Calcola position size
+        position_size = calculate_position_size(entry_price, stop_loss, plan.account_size, multiplier=self.multiplier)
+
+        if position_size < 1:
+            self.log("Position size troppo piccola")
+            return
+
+        # Arrotonda i prezzi al tick size
+        entry_price = round_to_tick(entry_price, self.tick_size)
+        stop_loss = round_to_tick(stop_loss, self.tick_size)
+        take_profit = round_to_tick(take_profit, self.tick_size)
+
+        # Validazione prezzi
+        if not validate_prices(entry_price, take_profit, stop_loss, self.tick_size):
+            return
+
+        # Template preparato dal warm-up (ricostruito solo se manca, es. warm-up fallito)
+        brackets = state.brackets or prepare_brackets()
+        state.brackets = None  # Ogni template si usa una sola volta
+        sized = time_module.perf_counter()
+        self.observe('sizing', sized - sizing_start)
+
+        try:
+            trades = await self.pacing.orders(3, lambda: submit_bracket(
+                self.ib, self.contract, brackets[signal_type], position_size, entry_price, take_profit, stop_loss))
+            submitted = time_module.perf_counter()
+        except Exception as e:
+            self.count('orb_orders_rejected_total', reason='submit')
+            self.log(f"❌ Errore nel piazzamento degli ordini: {e}")
+            return None
+        self.observe('submit', submitted - sized)
+        self.count('orb_orders_submitted_total')
+        self.submitted = submitted
+
+        # Aggiorna lo stato prima di attendere la conferma: le candele che arrivano nel frattempo non duplicano il trade.
+        # Da qui la posizione avanza solo con gli eventi di IB (on_execution, on_commission, on_order_status)
+        state.position = PENDING
+        state.trade_details = {
+            "type": signal_type,
+            "entry_price": entry_price,
+            "stop_loss": stop_loss,
+            "take_profit": take_profit,
+            "position_size": position_size,
+            "order_ids": [trade.order.orderId for trade in trades],
+            "trades": trades,
+            "exec_ids": [],  # Esecuzioni già contate (IB può riconsegnarle dopo una riconnessione)
+            "report_ids": [],  # Commissioni già contate
+            "cancelled_ids": [],
+            "entry_qty": 0,
+            "entry_value": 0.0,
+            "exit_qty": 0,
+            "exit_value": 0.0,
+            "exit_reason": None,
+            "commission": 0.0,
+            "pnl": None,
+        }
+        self.save_state('trade_placed')
+
+        self.log(f"""
+            Trade piazzato:
+            Direction: {signal_type}
+            Size: {position_size}
+            Entry Stop: {entry_price}
+            Stop Loss: {stop_loss}
+            Take Profit: {take_profit}
+            Risk: ${risk * position_size * self.multiplier:.2f}
+                    """)
+
+        # L'ultimo ordine trasmette il bracket: la sua conferma vale per tutti
+        acked = None
+        if await wait_for_ack(trades[-1], ORDER_ACK_TIMEOUT):
+            acked = time_module.perf_counter()
+            self.observe('ack', acked - submitted)
+        else:
+            self.count('orb_orders_ack_timeout_total')
+            self.log(f"⚠️ Nessuna conferma da IB entro {ORDER_ACK_TIMEOUT}s (stato: {trades[-1].orderStatus.status})")
+        self.log_latency(bar, received, submitted, acked)
+
+    def on_entry_fill(self, details, price):
+        """
+        Prima esecuzione dell'entrata: tempo dall'invio e slippage in tick (positivo = prezzo peggiore di quello del segnale)
+        """
+        signal_price = details['entry_price']
+        slippage = (price - signal_price) / self.tick_size
+        if details['type'] == 'SHORT':
+            slippage = -slippage
+        if self.submitted is not None:
+            self.observe('fill', time_module.perf_counter() - self.submitted)
+        self.count('orb_fills_total')
+        if self.metrics is not None:
+            self.metrics.observe('orb_slippage_ticks', round(slippage, 6), SLIPPAGE_BUCKETS, symbol=self.name)
+        self.log(f"Entrata eseguita a {price} (segnale {signal_price}, slippage {slippage:+.1f} tick)")
+
+    def on_execution(self, trade, fill):
+        """
+        Esecuzione sul contratto (ib.execDetailsEvent, instradato dal runner): l'entrata porta la posizione
+        da PENDING a FILLED; TP, SL o un ordine opposto fuori dal bracket (chiusura di fine giornata con
+        orderRef EOD, altrimenti EXTERNAL: chiusura manuale, liquidazione) la portano a EXITED
+        quando la quantità uscita copre quella entrata. Le esecuzioni già contate vengono ignorate.
+        """
+        state = self.state
+        details = state.trade_details
+        execution = fill.execution
+        if details is None or state.position not in (PENDING, FILLED) or execution.execId in details['exec_ids']:
+            return
+        entry_id, take_profit_id, stop_loss_id = details['order_ids']
+        closing_side = 'SLD' if details['type'] == 'LONG' else 'BOT'
+        if execution.orderId == entry_id:
+            details['exec_ids'].append(execution.execId)
+            details['entry_qty'] += execution.shares
+            details['entry_value'] += execution.shares * execution.price
+            if state.position == PENDING:
+                state.position = FILLED
+                details['entry_time'] = fill.time.isoformat()
+                self.on_entry_fill(details, execution.price)
+                self.save_state('filled')
+            return
+        if state.position != FILLED:
+            return
+        if execution.orderId not in (take_profit_id, stop_loss_id):
+            # Ordine esterno al bracket: conta solo se chiude la posizione dopo l'entrata (ib.fills() ha anche i giorni prima)
+            if execution.side != closing_side or fill.time < datetime.fromisoformat(details['entry_time']):
+                return
+
+        details['exec_ids'].append(execution.execId)
+        details['exit_qty'] += execution.shares
+        details['exit_value'] += execution.shares * execution.price
+        details['exit_reason'] = {take_profit_id: 'TP', stop_loss_id: 'SL'}.get(
+            execution.orderId, 'EOD' if execution.orderRef == EOD_ORDER_REF else 'EXTERNAL')
+        if details['exit_qty'] >= details['entry_qty']:
+            state.position = EXITED
+            self.log(f"Uscita {details['exit_reason']} eseguita a {execution.price}")
+            self.save_state('exited')
+        self.close_trade()
+
+    def on_commission(self, trade, fill, report):
+        """
+        Commissione di un'esecuzione del bracket (ib.commissionReportEvent): arriva dopo l'esecuzione
+        """
+        details = self.state.trade_details
+        if details is None or report.execId not in details['exec_ids'] or report.execId in details['report_ids']:
+            return
+        details['report_ids'].append(report.execId)
+        details['commission'] += report.commission
+        self.close_trade()
+
+    def on_order_status(self, trade):
+        """
+        Stato di un ordine del bracket (ib.orderStatusEvent): entrata cancellata o rifiutata prima
+        dell'esecuzione -> CANCELLED; TP e SL entrambi cancellati con la posizione aperta -> avviso
+        """
+        state = self.state
+        details = state.trade_details
+        order_id = trade.order.orderId
+        if details is None or order_id not in details['order_ids'] or trade.orderStatus.status not in INACTIVE_STATUSES:
+            return
+        if order_id in details['cancelled_ids']:
+            return
+        details['cancelled_ids'].append(order_id)
+        entry_id, take_profit_id, stop_loss_id = details['order_ids']
+        if order_id == entry_id and state.position == PENDING:
+            state.position = CANCELLED
+            self.log(f"Entrata {trade.orderStatus.status}: nessun trade oggi")
+            self.save_state('cancelled')
+        elif state.position == FILLED and {take_profit_id, stop_loss_id} <= set(details['cancelled_ids']):
+            self.log(f"⚠️ TP e SL cancellati con la posizione ancora aperta ({details['entry_qty'] - details['exit_qty']})")
+
+    def close_trade(self):
+        """
+        Trade concluso (EXITED) con tutte le commissioni: P&L realizzato nell'accumulatore delle metriche e nel journal
+        """
+        state = self.state
+        details = state.trade_details
+        if (state.position != EXITED or details['pnl'] is not None or not details['entry_qty']
+                or len(details['report_ids']) < len(details['exec_ids'])):
+            return
+        entry_price = details['entry_value'] / details['entry_qty']
+        exit_price = details['exit_value'] / details['exit_qty']
+        gross_points = exit_price - entry_price if details['type'] == 'LONG' else entry_price - exit_price
+        risk = abs(entry_price - details['stop_loss'])
+        details['pnl'] = gross_points * details['entry_qty'] * self.multiplier - details['commission']
+        details['rr'] = abs(exit_price - entry_price) / risk if risk > 0 else 0
+        self.add_result(details)
+        self.count('orb_trades_closed_total', reason=details['exit_reason'])
+        self.log(f"💰 Trade chiuso ({details['exit_reason']}): P&L {details['pnl']:+.2f}, "
+                 f"commissioni {details['commission']:.2f}, realizzato {self.results.equity - self.results.starting_capital:+.2f}")
+        self.save_state('closed')
+
+    def add_result(self, details):
+        self.results.update(details['pnl'], details['exit_reason'], details['type'], details['rr'], details['commission'])
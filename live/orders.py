@@ -0,0 +1,80 @@
+import asyncio
+
+from ib_insync import LimitOrder, StopOrder
+
+EOD_ORDER_REF = 'EOD'  # orderRef delle chiusure a fine giornata: le altre chiusure fuori dal bracket sono EXTERNAL
+
+class BracketTemplate:
+    """
+    Bracket (entrata stop, take profit limit, stop loss) costruito prima dell'apertura per una direzione.
+    Alla chiusura della OR si riempiono solo quantità, prezzi e id: nessun oggetto da creare sul percorso critico.
+    """
+
+    def __init__(self, direction, tif='DAY'):
+        self.direction = direction
+        action = 'BUY' if direction == 'LONG' else 'SELL'
+        reverse = 'SELL' if direction == 'LONG' else 'BUY'
+        # Solo durante le ore di mercato, validi solo per oggi
+        self.entry = StopOrder(action, 0, 0, outsideRth=False, tif=tif, transmit=False)
+        self.take_profit = LimitOrder(reverse, 0, 0, outsideRth=False, tif=tif, transmit=False)
+        # Ultimo ordine del bracket: trasmette tutto
+        self.stop_loss = StopOrder(reverse, 0, 0, outsideRth=False, tif=tif, transmit=True)
+
+    def fill(self, order_ids, quantity, entry_price, take_profit, stop_loss):
+        """
+        Completa il bracket. Gli id vanno assegnati prima di collegare i figli al padre
+        (con orderId ancora a 0 i figli resterebbero senza parentId valido).
+        Returns: [entrata, take profit, stop loss] nell'ordine di invio
+        """
+        parent_id, tp_id, sl_id = order_ids
+        self.entry.orderId = parent_id
+        self.entry.totalQuantity = quantity
+        self.entry.auxPrice = entry_price
+
+        self.take_profit.orderId = tp_id
+        self.take_profit.parentId = parent_id
+        self.take_profit.totalQuantity = quantity
+        self.take_profit.lmtPrice = take_profit
+
+        self.stop_loss.orderId = sl_id
+        self.stop_loss.parentId = parent_id
+        self.stop_loss.totalQuantity = quantity
+        self.stop_loss.auxPrice = stop_loss
+        return [self.entry, self.take_profit, self.stop_loss]
+
+def prepare_brackets():
+    """
+    Template LONG e SHORT per la sessione: a OR chiusa se ne usa uno solo
+    """
+    return {direction: BracketTemplate(direction) for direction in ('LONG', 'SHORT')}
+
+def submit_bracket(ib, contract, template, quantity, entry_price, take_profit, stop_loss):
+    """
+    Riserva gli id, completa il template e invia i tre ordini uno dopo l'altro nello stesso giro del loop:
+    IB li riceve come un unico bracket alla trasmissione dello stop loss.
+    Returns: lista dei Trade di ib_insync
+    """
+    order_ids = [ib.client.getReqId() for _ in range(3)]
+    orders = template.fill(order_ids, quantity, entry_price, take_profit, stop_loss)
+    return [ib.placeOrder(contract, order) for order in orders]
+
+async def wait_for_ack(trade, timeout):
+    """
+    Attende che IB confermi l'ordine (stato diverso da PendingSubmit), senza bloccare il loop.
+    Il callback si registra subito: una conferma che arriva al giro successivo del loop non va persa
+    (asyncio.wait_for sull'evento si iscrive solo quando il suo task parte).
+    """
+    acked = asyncio.get_running_loop().create_future()
+
+    def on_status(trade):
+        if trade.orderStatus.status not in ('', 'PendingSubmit') and not acked.done():
+            acked.set_result(True)
+
+    on_status(trade)
+    trade.statusEvent += on_status
+    try:
+        return await asyncio.wait_for(acked, timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        trade.statusEvent -= on_status
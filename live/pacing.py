@@ -0,0 +1,74 @@
+import asyncio
+from collections import defaultdict, deque
+
+# Limiti di IB (documentazione API): richieste storiche per finestra, per contratto e messaggi d'ordine al secondo
+HISTORICAL_LIMIT = 60
+HISTORICAL_WINDOW = 600
+CONTRACT_LIMIT = 6
+CONTRACT_WINDOW = 2
+ORDERS_PER_SECOND = 40  # Margine rispetto ai 50 messaggi/s di IB
+
+def _wait_time(times, limit, window, now, n=1):
+    """
+    Secondi da attendere perché altri n eventi stiano nella finestra scorrevole (0 se c'è posto)
+    """
+    while times and times[0] <= now - window:
+        times.popleft()
+    if len(times) + n <= limit:
+        return 0
+    return times[len(times) + n - limit - 1] + window - now
+
+class PacingQueue:
+    """
+    Coda condivisa da tutte le strategie sulla stessa connessione: richieste storiche e invii d'ordine
+    passano da qui e vengono ritardati solo quando si supererebbero i limiti di IB.
+    """
+
+    def __init__(self, historical_limit=HISTORICAL_LIMIT, historical_window=HISTORICAL_WINDOW,
+                 contract_limit=CONTRACT_LIMIT, contract_window=CONTRACT_WINDOW, orders_per_second=ORDERS_PER_SECOND):
+        self.historical_limit = historical_limit
+        self.historical_window = historical_window
+        self.contract_limit = contract_limit
+        self.contract_window = contract_window
+        self.orders_per_second = orders_per_second
+        self._historical = deque()
+        self._by_contract = defaultdict(deque)
+        self._orders = deque()
+        self._historical_lock = asyncio.Lock()
+        self._orders_lock = asyncio.Lock()
+        self.delayed = 0  # Richieste o invii rallentati per rispettare i limiti
+
+    async def historical(self, key, request):
+        """
+        Esegue una richiesta storica (request: funzione che restituisce la coroutine) rispettando
+        il limite globale e quello per contratto (key, es. conId)
+        """
+        loop = asyncio.get_running_loop()
+        async with self._historical_lock:
+            while True:
+                now = loop.time()
+                wait = max(_wait_time(self._historical, self.historical_limit, self.historical_window, now),
+                           _wait_time(self._by_contract[key], self.contract_limit, self.contract_window, now))
+                if wait <= 0:
+                    break
+                self.delayed += 1
+                await asyncio.sleep(wait)
+            self._historical.append(now)
+            self._by_contract[key].append(now)
+        return await request()
+
+    async def orders(self, n_messages, send):
+        """
+        Invia n_messages ordini con send() (sincrona, es. i tre ordini di un bracket nello stesso giro del loop)
+        """
+        loop = asyncio.get_running_loop()
+        async with self._orders_lock:
+            while True:
+                now = loop.time()
+                wait = _wait_time(self._orders, self.orders_per_second, 1, now, n_messages)
+                if wait <= 0:
+                    break
+                self.delayed += 1
+                await asyncio.sleep(wait)
+            self._orders.extend([now] * n_messages)
+            return send()
@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time as time_module
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from ib_insync import BarData
+
+from fake_ib import FakeIB
+from live_metrics import LiveMetrics
+from live_trading_IB import ACCOUNT_SIZE, IB_CLIENT_ID, IB_HOST, IB_PORT, SYMBOLS
+from orb_strategy import MARKET_TIMEZONE, TIMEFRAME, OrbStrategy
+from pacing import CONTRACT_WINDOW, HISTORICAL_WINDOW, PacingQueue
+from runner import RECONNECT_DELAYS, LiveRunner
+from warmup import WARMUP_TIME
+
+# Motore di backtest e ledger, per il confronto con le decisioni del bot
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backtesting'))
+from ledger import _to_utc, from_trading_results, save_ledger, to_frame
+from metrics import compute_metrics, format_stats
+from streaming import iter_sessions, run_streaming_backtest
+
+REPLAY_DIR = 'outputs/replay'
+COMPARED_STATS = ('Numero di Trade', 'Profitto Totale', 'Win Rate (%)', 'Profit Factor', 'Uscite SL', 'Uscite TP',
+                  'Uscite EOD', 'Max Drawdown (%)', 'Sharpe Ratio')
+
+def load_bar_store(path, start=None, end=None, day_col='trading_day', naive_tz='America/New_York'):
+    """
+    Legge il CSV pulito una sessione alla volta: giornaliere di tutto lo storico (per il warm-up)
+    e candele in UTC delle sole sessioni da giocare.
+    Returns: (DataFrame giornaliere, {giorno: [BarData]})
+    """
+    daily = []
+    sessions = {}
+    for day, day_data in iter_sessions(path, day_col=day_col):
+        day = pd.Timestamp(day).date()
+        opens = day_data['open'].to_numpy(dtype=float)
+        highs = day_data['high'].to_numpy(dtype=float)
+        lows = day_data['low'].to_numpy(dtype=float)
+        closes = day_data['close'].to_numpy(dtype=float)
+        volumes = day_data['volume'].to_numpy(dtype=float)
+        daily.append({'date': day, 'open': opens[0], 'high': highs.max(), 'low': lows.min(),
+                      'close': closes[-1], 'volume': volumes.sum()})
+        if (start and day < start) or (end and day > end):
+            continue
+        times = pd.DatetimeIndex(_to_utc(day_data['timestamp'], naive_tz)).tz_localize('UTC').to_pydatetime()
+        sessions[day] = [BarData(date=t, open=o, high=h, low=l, close=c, volume=v)
+                         for t, o, h, l, c, v in zip(times, opens, highs, lows, closes, volumes)]
+    return pd.DataFrame(daily), sessions
+
+def round_trip(strategy, session_bars, eod_trade):
+    """
+    Trade della sessione ricostruito dai fill del broker finto (None se il bot non è entrato).
+    eod_trade: chiusura a fine giornata di FakeIB.flatten, se la posizione era ancora aperta
+    """
+    details = strategy.state.trade_details
+    if not details or strategy.state.current_day != session_bars[0].date.astimezone(MARKET_TIMEZONE).date():
+        return None
+    entry, take_profit, stop_loss = details['trades']
+    if not entry.fills:
+        return None
+
+    exit_trade, reason = eod_trade, 'EOD'
+    for trade, name in ((take_profit, 'TP'), (stop_loss, 'SL')):
+        if trade.fills:
+            exit_trade, reason = trade, name
+
+    entry_price = entry.orderStatus.avgFillPrice
+    exit_price = exit_trade.orderStatus.avgFillPrice
+    size = details['position_size']
+    gross_points = exit_price - entry_price if details['type'] == 'LONG' else entry_price - exit_price
+    commission = sum(fill.commissionReport.commission for trade in (entry, exit_trade) for fill in trade.fills)
+    risk = abs(entry_price - details['stop_loss'])
+    return {
+        'entry_price': entry_price,
+        'exit_price': exit_price,
+        'stop_loss': details['stop_loss'],
+        'direction': details['type'],
+        'exit_reason': reason,
+        'position_size': size,
+        'pnl': gross_points * size * strategy.multiplier - commission,
+        'R:R': abs(exit_price - entry_price) / risk if risk > 0 else 0,
+        'commission': commission,
+        'gross_points': gross_points,
+        'point_value': strategy.multiplier,
+        'entry_time': entry.fills[0].time,
+        'exit_time': exit_trade.fills[0].time,
+        'date': session_bars[0].date,
+        'ATR': strategy.state.plan.atr,
+    }
+
+async def replay(path, symbol, start=None, end=None, speed=0, drop_every=None, account_size=ACCOUNT_SIZE,
+                 day_col='trading_day', out=sys.stdout, metrics=None):
+    """
+    Gioca le sessioni del bar store attraverso il bot live (OrbStrategy + LiveRunner) collegato a FakeIB.
+    speed: multiplo del tempo reale (1000 = una candela da 5 minuti ogni 0.3 s), 0 = il più veloce possibile.
+    drop_every: simula la perdita della connessione ogni N candele (riconnessione e recupero del feed).
+    metrics: LiveMetrics in cui il bot registra tempi per stadio e contatori, come in produzione.
+    Returns: (DataFrame dei trade del bot nel formato dei risultati del backtest, sessioni giocate,
+              MetricsAccumulator del bot alimentato dagli eventi di esecuzione)
+    """
+    daily, sessions = load_bar_store(path, start, end, day_col)
+    fake = FakeIB(TIMEFRAME)
+    fake.add_symbol(symbol, daily, sessions)
+
+    # Limiti di pacing e attese di riconnessione scalati sul tempo simulato (nessuna attesa alla massima velocità)
+    scale = 1 / speed if speed else 0
+    pacing = PacingQueue(historical_window=HISTORICAL_WINDOW * scale, contract_window=CONTRACT_WINDOW * scale)
+    os.makedirs(REPLAY_DIR, exist_ok=True)
+    cache_path = os.path.join(REPLAY_DIR, f'daily_{symbol.lower()}.csv')
+    if os.path.exists(cache_path):
+        os.remove(cache_path)  # Il warm-up riparte dallo storico del bar store
+
+    strategy = OrbStrategy(fake, pacing, symbol, account_size=account_size, clock=fake.now,
+                           cache_path=cache_path, metrics=metrics, **SYMBOLS[symbol])
+    runner = LiveRunner(fake, [strategy], IB_HOST, IB_PORT, IB_CLIENT_ID, TIMEFRAME, pacing, metrics, clock=fake.now,
+                        reconnect_delays=tuple(delay * scale for delay in RECONNECT_DELAYS))
+    await fake.connectAsync(IB_HOST, IB_PORT, clientId=IB_CLIENT_ID)
+    await runner.qualify()
+    runner.attach_orders()
+    fake.disconnectedEvent += runner.on_disconnected
+
+    trades = []
+    pushed = 0
+    bar_seconds = TIMEFRAME * 60 / speed if speed else 0
+    days = sorted(sessions)
+    try:
+        for i, day in enumerate(days):
+            bars = fake.open_session(symbol, day, datetime.combine(day, WARMUP_TIME, tzinfo=MARKET_TIMEZONE))
+            await strategy.run_warmup()
+            if not runner.feeds:
+                await runner.subscribe()
+
+            for bar in bars:
+                if drop_every and pushed and pushed % drop_every == 0:
+                    fake.drop_connection()
+                await fake.push_bar(strategy.contract, bar)
+                pushed += 1
+                if bar_seconds:
+                    await asyncio.sleep(bar_seconds)
+
+            # Ordini DAY cancellati alla chiusura; la posizione ancora aperta esce a fine giornata come nel backtest
+            fake.close_session(strategy.contract)
+            eod_trade = fake.flatten(strategy.contract, bars[-1].close) if bars else None
+            trade = round_trip(strategy, bars, eod_trade)
+            if trade is not None:
+                trades.append(trade)
+            if i == len(days) - 1 or days[i + 1].month != day.month:
+                print(f"{day:%Y-%m}: {len(trades)} trade finora", file=out)
+    finally:
+        fake.disconnectedEvent -= runner.on_disconnected
+        runner.detach_orders()
+        runner.stop()
+    return pd.DataFrame(trades), days, strategy.results
+
+def session_dates(trading_results):
+    """ Giorno di sessione (ET) di ogni trade """
+    return to_frame(from_trading_results(trading_results))['date'].dt.date.to_numpy()
+
+def compare(live, backtest, days, starting_capital=ACCOUNT_SIZE, results=None):
+    """
+    Confronto trade per trade (stessa sessione) e delle statistiche tra bot in replay e backtest.
+    results: MetricsAccumulator del bot (P&L realizzato dagli eventi), da confrontare con i trade ricostruiti dai fill
+    """
+    backtest = backtest[np.isin(session_dates(backtest), list(days))].reset_index(drop=True) if len(backtest) else backtest
+    print(f"\n📊 Replay di {len(days)} sessioni: {len(live)} trade del bot, {len(backtest)} del backtest")
+
+    if len(live) and len(backtest):
+        left = live.assign(day=session_dates(live))
+        right = backtest.assign(day=session_dates(backtest))
+        both = left.merge(right, on='day', suffixes=('_live', '_bt'))
+        n = len(both)
+        print(f"Sessioni con trade in entrambi: {n}")
+        if n:
+            print(f"  Stessa direzione: {(both['direction_live'] == both['direction_bt']).sum()}/{n}")
+            print(f"  Stesso motivo di uscita: {(both['exit_reason_live'] == both['exit_reason_bt']).sum()}/{n}")
+            for column in ('entry_price', 'exit_price', 'position_size'):
+                diff = (both[f'{column}_live'] - both[f'{column}_bt']).abs()
+                print(f"  Differenza media {column}: {diff.mean():.4f} (max {diff.max():.4f})")
+        only_live = sorted(set(left['day']) - set(right['day']))
+        only_backtest = sorted(set(right['day']) - set(left['day']))
+        print(f"Solo bot: {len(only_live)} {only_live[:5]}")
+        print(f"Solo backtest: {len(only_backtest)} {only_backtest[:5]}")
+
+    rows = {}
+    for name, trades in (('Bot (replay)', live), ('Backtest', backtest)):
+        if len(trades):
+            stats = format_stats(compute_metrics(from_trading_results(trades), starting_capital))
+            rows[name] = {key: stats[key] for key in COMPARED_STATS}
+    if results is not None and results.n_trades:
+        stats = format_stats(results.snapshot())
+        rows['Bot (eventi)'] = {key: stats.get(key) for key in COMPARED_STATS}
+    if rows:
+        print(pd.DataFrame(rows).to_string())
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay accelerato del bot live su FakeIB e confronto con il backtest')
+    parser.add_argument('data', nargs='?', default='./data/qqq_5Min.csv',
+                        help='CSV pulito con colonne timestamp, open, high, low, close, volume, trading_day')
+    parser.add_argument('--symbol', default='QQQ', choices=sorted(SYMBOLS))
+    parser.add_argument('--start', type=date.fromisoformat, help='prima sessione da giocare (YYYY-MM-DD)')
+    parser.add_argument('--end', type=date.fromisoformat, help='ultima sessione da giocare (YYYY-MM-DD)')
+    parser.add_argument('--speed', type=float, default=0, help='multiplo del tempo reale (es. 1000), 0 = massima velocità')
+    parser.add_argument('--drop-every', type=int, help='simula una disconnessione ogni N candele')
+    parser.add_argument('--day-col', default='trading_day')
+    parser.add_argument('--verbose', action='store_true', help='mostra i log del bot')
+    args = parser.parse_args()
+
+    started = time_module.perf_counter()
+    out = sys.stdout
+    metrics = LiveMetrics()
+    with contextlib.redirect_stdout(out if args.verbose else open(os.devnull, 'w')):
+        live, days, results = asyncio.run(replay(args.data, args.symbol, args.start, args.end, args.speed, args.drop_every,
+                                        day_col=args.day_col, out=out, metrics=metrics))
+    elapsed = time_module.perf_counter() - started
+
+    ledger_path = os.path.join(REPLAY_DIR, f'replay_{args.symbol.lower()}.npz')
+    if len(live):
+        save_ledger(ledger_path, live, variant='replay', data_path=args.data,
+                    params={'symbol': args.symbol, 'speed': args.speed, 'drop_every': args.drop_every})
+    metrics_path = os.path.join(REPLAY_DIR, f'metrics_{args.symbol.lower()}.prom')
+    metrics.write(metrics_path)
+    print(f"Replay completato in {elapsed:.1f}s, ledger del bot in '{ledger_path}', metriche in '{metrics_path}'")
+
+    backtest = pd.DataFrame(list(run_streaming_backtest(args.data, starting_capital=ACCOUNT_SIZE, day_col=args.day_col)))
+    compare(live, backtest, days, results=results)
@@ -0,0 +1,210 @@
+import asyncio
+import time as time_module
+from datetime import datetime, timedelta
+
+from ib_insync import Future
+
+from bar_feed import BarFeed
+from orb_strategy import MARKET_TIMEZONE, TIMEFRAME
+from warmup import WARMUP_TIME
+
+RECONNECT_DELAYS = (1, 2, 5, 10, 30) # Attese (secondi) tra i tentativi di riconnessione
+PACING_ERRORS = (100, 162, 420)  # Codici di errore di IB per superamento dei limiti (messaggi o storico)
+REJECTED_ERRORS = (201, 203)  # Ordine rifiutato, titolo non disponibile per l'account
+
+def seconds_until(at, tz=MARKET_TIMEZONE, clock=datetime.now):
+    """
+    Secondi fino al prossimo orario `at` nel fuso della borsa (oggi o domani), secondo `clock`
+    """
+    now = clock(tz)
+    target = datetime.combine(now.date(), at, tzinfo=tz)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+class LiveRunner:
+    """
+    Esegue N strategie (una o più per simbolo) su un'unica connessione IB: una sola sottoscrizione
+    di candele per contratto, distribuita a tutte le strategie che lo tradano, warm-up comune e
+    riconnessione unica. Ogni strategia mantiene il proprio stato.
+    """
+
+    def __init__(self, ib, strategies, host, port, client_id, timeframe=TIMEFRAME, pacing=None, metrics=None,
+                 journal=None, clock=datetime.now, reconnect_delays=RECONNECT_DELAYS):
+        self.ib = ib
+        self.strategies = strategies
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.timeframe = timeframe
+        self.pacing = pacing
+        self.metrics = metrics
+        self.journal = journal
+        self.clock = clock  # Stesso orologio delle strategie (nel replay quello simulato di FakeIB)
+        self.reconnect_delays = reconnect_delays  # Nel replay scalate sul tempo simulato
+        self.feeds = {}  # conId -> BarFeed
+        self.routes = {}  # conId -> strategie che ricevono le candele del contratto
+        self.reconnect_task = None
+
+    async def qualify(self):
+        """
+        Qualifica tutti i contratti con una sola richiesta; i future continui (CONTFUT) diventano
+        il contratto del mese attivo, su cui si possono inviare ordini
+        """
+        contracts = [strategy.contract for strategy in self.strategies]
+        await self.ib.qualifyContractsAsync(*contracts)
+        for strategy in self.strategies:
+            if strategy.contract.secType == 'CONTFUT':
+                future = Future(conId=strategy.contract.conId)
+                await self.ib.qualifyContractsAsync(future)
+                strategy.contract = future
+
+        self.routes = {}
+        for strategy in self.strategies:
+            self.routes.setdefault(strategy.contract.conId, []).append(strategy)
+            print(f"✅ Contratto qualificato per {strategy.name}: {strategy.contract}")
+
+    def restore(self):
+        """
+        Riavvio: stato di ogni strategia dal journal, riconciliato con ordini e posizioni che IB
+        consegna alla connessione (nessuna richiesta storica)
+        """
+        started = time_module.perf_counter()
+        restored = sum(strategy.restore() for strategy in self.strategies)
+        print(f"Stato ripristinato per {restored}/{len(self.strategies)} strategie "
+              f"in {(time_module.perf_counter() - started) * 1000:.1f} ms")
+
+    async def _fan_out(self, con_id, bar):
+        # Tutte le strategie dello stesso contratto ricevono la candela in parallelo sullo stesso loop
+        strategies = self.routes.get(con_id, [])
+        results = await asyncio.gather(*(s.on_bar_close(bar) for s in strategies), return_exceptions=True)
+        for strategy, result in zip(strategies, results):
+            if isinstance(result, Exception):
+                strategy.log(f"Errore nella gestione della candela: {result}")
+
+    async def subscribe(self):
+        """
+        Una sottoscrizione di candele per contratto; lo storico iniziale ricostruisce il DR di ogni strategia
+        """
+        for con_id, strategies in self.routes.items():
+            feed = BarFeed(self.ib, strategies[0].contract, self.timeframe,
+                           on_bar_close=lambda bar, con_id=con_id: self._fan_out(con_id, bar), pacing=self.pacing)
+            history = await feed.start()
+            self.feeds[con_id] = feed
+            for strategy in strategies:
+                strategy.restore_session(history)
+            print(f"Sottoscrizione candele {strategies[0].contract.symbol} attiva "
+                  f"({len(history)} candele già chiuse oggi, {len(strategies)} strategie)")
+
+    async def warmup_loop(self):
+        """
+        Warm-up di tutte le strategie subito all'avvio, poi ogni giorno all'orario WARMUP_TIME della borsa
+        """
+        while True:
+            today = self.clock(MARKET_TIMEZONE).date()
+            pending = [s for s in self.strategies if s.state.warmup_day != today]
+            await asyncio.gather(*(s.run_warmup() for s in pending))
+            await asyncio.sleep(seconds_until(WARMUP_TIME, clock=self.clock))
+
+    async def reconnect(self):
+        """
+        Riconnessione non bloccante con attese crescenti; ripristina contratti e sottoscrizioni di tutte le strategie
+        """
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.reconnect_delays[min(attempt, len(self.reconnect_delays) - 1)])
+            attempt += 1
+            try:
+                print(f"Riconnessione a IB (tentativo {attempt})...")
+                await self.ib.connectAsync(self.host, self.port, clientId=self.client_id)
+                await self.ib.qualifyContractsAsync(*[s.contract for s in self.strategies])
+                # Le sottoscrizioni alle candele non sopravvivono alla disconnessione
+                for feed in self.feeds.values():
+                    missed = await feed.restart()
+                    print(f"Sottoscrizione candele {feed.contract.symbol} ripristinata ({len(missed)} candele recuperate)")
+                # Ordini eseguiti o cancellati durante la disconnessione
+                for strategy in self.strategies:
+                    strategy.reconcile()
+                if self.metrics is not None:
+                    self.metrics.inc('orb_reconnects_total')
+                return
+            except Exception as e:
+                print(f"Errore durante la riconnessione: {e}")
+                self.ib.disconnect()  # Si riparte da zero al prossimo tentativo
+
+    def on_disconnected(self):
+        print("⚠️ Connessione a IB persa")
+        if self.metrics is not None:
+            self.metrics.inc('orb_disconnects_total')
+        # Un solo tentativo di riconnessione alla volta
+        if self.reconnect_task is None or self.reconnect_task.done():
+            self.reconnect_task = asyncio.ensure_future(self.reconnect())
+
+    def on_error(self, req_id, error_code, error_string, contract):
+        """
+        Errori di IB che finiscono nelle metriche: violazioni di pacing e ordini rifiutati
+        """
+        if self.metrics is None:
+            return
+        symbol = contract.symbol if contract is not None else ''
+        if error_code in PACING_ERRORS:
+            self.metrics.inc('orb_pacing_violations_total', code=error_code)
+        elif error_code in REJECTED_ERRORS:
+            self.metrics.inc('orb_orders_rejected_total', symbol=symbol, reason='broker')
+
+    def on_order_status(self, trade):
+        for strategy in self.routes.get(trade.contract.conId, []):
+            strategy.on_order_status(trade)
+
+    def on_execution(self, trade, fill):
+        for strategy in self.routes.get(fill.contract.conId, []):
+            strategy.on_execution(trade, fill)
+
+    def on_commission(self, trade, fill, report):
+        for strategy in self.routes.get(fill.contract.conId, []):
+            strategy.on_commission(trade, fill, report)
+
+    def attach_orders(self):
+        """
+        Stati degli ordini, esecuzioni e commissioni di IB alle strategie del contratto: la posizione
+        avanza a eventi (PENDING -> FILLED -> EXITED), senza interrogare ib.trades()
+        """
+        self.ib.orderStatusEvent += self.on_order_status
+        self.ib.execDetailsEvent += self.on_execution
+        self.ib.commissionReportEvent += self.on_commission
+
+    def detach_orders(self):
+        self.ib.orderStatusEvent -= self.on_order_status
+        self.ib.execDetailsEvent -= self.on_execution
+        self.ib.commissionReportEvent -= self.on_commission
+
+    async def run(self):
+        if self.metrics is not None:
+            await self.metrics.start()
+            if self.pacing is not None:
+                self.metrics.watch('orb_pacing_delayed_total', lambda: self.pacing.delayed)
+        self.ib.errorEvent += self.on_error
+        self.attach_orders()
+        await self.ib.connectAsync(self.host, self.port, clientId=self.client_id)
+        await self.qualify()
+        self.restore()
+        await self.subscribe()
+
+        self.ib.disconnectedEvent += self.on_disconnected
+        print(f"Bot avviato su {len(self.strategies)} strategie. In attesa delle prossime candele...")
+        try:
+            # Il warm-up giornaliero gira per sempre; candele e ordini arrivano come eventi sullo stesso loop
+            await self.warmup_loop()
+        finally:
+            self.ib.disconnectedEvent -= self.on_disconnected
+            self.ib.errorEvent -= self.on_error
+            self.detach_orders()
+
+    def stop(self):
+        for feed in self.feeds.values():
+            feed.stop()
+        self.ib.disconnect()
+        if self.metrics is not None:
+            self.metrics.stop()
+        if self.journal is not None:
+            self.journal.close()
@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+import sqlite3
+from datetime import date, datetime
+
+from bot_state import BotState
+
+JOURNAL_PATH = 'outputs/bot_state.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    created TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    day TEXT,
+    event TEXT NOT NULL,
+    state_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_symbol ON snapshots(symbol, id);
+"""
+
+class StateJournal:
+    """
+    Journal append-only (SQLite in WAL) dello stato del bot: uno snapshot a ogni transizione
+    (nuovo giorno, OR, warm-up, trade, riconciliazione). Al riavvio l'ultimo snapshot di oggi
+    ripristina lo stato senza richieste storiche.
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # In WAL con synchronous=NORMAL un commit sopravvive al crash del processo (non a quello della macchina)
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def record(self, symbol, event, state):
+        """
+        Aggiunge uno snapshot dello stato (un commit per transizione)
+        """
+        day = None if state.current_day is None else state.current_day.isoformat()
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO snapshots (created, symbol, day, event, state_json) VALUES (?, ?, ?, ?, ?)',
+                (datetime.now().isoformat(timespec='milliseconds'), symbol, day, event, json.dumps(state.to_dict())))
+
+    def latest(self, symbol):
+        """
+        Returns: (BotState dell'ultimo snapshot del simbolo, evento) oppure (None, None)
+        """
+        row = self.conn.execute(
+            'SELECT state_json, event FROM snapshots WHERE symbol = ? ORDER BY id DESC LIMIT 1', (symbol,)).fetchone()
+        if row is None:
+            return None, None
+        return BotState.from_dict(json.loads(row[0])), row[1]
+
+    def history(self, symbol, day):
+        """
+        Returns: [(created, evento, stato JSON)] delle transizioni del giorno, in ordine
+        """
+        return self.conn.execute(
+            'SELECT created, event, state_json FROM snapshots WHERE symbol = ? AND day = ? ORDER BY id',
+            (symbol, day.isoformat())).fetchall()
+
+    def closed_trades(self, symbol):
+        """
+        Returns: trade_details dei trade chiusi del simbolo (snapshot 'closed', con P&L realizzato), in ordine
+        """
+        rows = self.conn.execute(
+            "SELECT state_json FROM snapshots WHERE symbol = ? AND event = 'closed' ORDER BY id", (symbol,)).fetchall()
+        return [json.loads(row[0])['trade_details'] for row in rows]
+
+    def close(self):
+        self.conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Transizioni di stato del bot live registrate nel journal')
+    parser.add_argument('symbol')
+    parser.add_argument('--day', type=date.fromisoformat, default=date.today(), help='giorno di sessione (YYYY-MM-DD)')
+    parser.add_argument('--path', default=JOURNAL_PATH)
+    args = parser.parse_args()
+
+    journal = StateJournal(args.path)
+    for created, event, state_json in journal.history(args.symbol, args.day):
+        print(f"{created}  {event:<28} {state_json}")
+    journal.close()
@@ -0,0 +1,113 @@
+import os
+import sys
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+from bot_state import SessionPlan
+
+# Formula dell'ATR e parametri condivisi con il motore di backtest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backtesting'))
+from orb_engine import ATR_PERIOD, STOP_ATR_MULT, atr_from_daily
+
+WARMUP_TIME = time(9, 0)  # Orario ET del warm-up pre-apertura
+DAILY_CACHE = './data/daily_{symbol}.csv'
+HISTORY_DAYS = 60  # Giorni richiesti quando la cache è vuota
+
+def load_daily_cache(path):
+    """
+    Candele giornaliere già scaricate (vuoto se la cache non esiste)
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+    daily = pd.read_csv(path)
+    daily['date'] = pd.to_datetime(daily['date']).dt.date
+    return daily
+
+async def _historical(ib, contract, pacing, **kwargs):
+    request = lambda: ib.reqHistoricalDataAsync(contract, **kwargs)
+    return await (pacing.historical(contract.conId, request) if pacing else request())
+
+async def update_daily_bars(ib, contract, path, today, pacing=None):
+    """
+    Aggiorna la cache delle giornaliere con le sole sessioni mancanti (di solito una al giorno).
+    Tiene solo sessioni complete: la barra di oggi non entra mai in cache.
+    Returns: (DataFrame delle giornaliere, numero di barre aggiunte)
+    """
+    daily = load_daily_cache(path)
+    if len(daily):
+        missing = int(np.busday_count(daily['date'].iloc[-1] + timedelta(days=1), today))
+        if missing == 0:
+            return daily, 0
+        duration = f'{missing + 1} D'
+    else:
+        duration = f'{HISTORY_DAYS} D'
+
+    bars = await _historical(
+        ib, contract, pacing,
+        endDateTime='',
+        durationStr=duration,
+        barSizeSetting='1 day',
+        whatToShow='TRADES',
+        useRTH=True
+    )
+    new = pd.DataFrame([{'date': b.date, 'open': b.open, 'high': b.high, 'low': b.low,
+                         'close': b.close, 'volume': b.volume} for b in bars if b.date < today])
+    if new.empty:
+        return daily, 0
+
+    before = len(daily)
+    daily = pd.concat([daily, new]) if before else new
+    daily = daily.drop_duplicates('date', keep='last').sort_values('date').reset_index(drop=True)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    daily.to_csv(path, index=False)
+    return daily, len(daily) - before
+
+async def session_hours(ib, contract, today):
+    """
+    Apertura e chiusura della sessione regolare di oggi dal calendario del contratto.
+    Returns: (apertura, chiusura) con timezone, oppure None se oggi il mercato è chiuso
+    """
+    details = await ib.reqContractDetailsAsync(contract)
+    if not details:
+        return None
+    for session in details[0].liquidSessions():
+        if session.start.date() == today:
+            return session.start, session.end
+    return None
+
+async def warm_up(ib, contract, account_size, market_tz, last_entry_time, today=None, cache_path=None, pacing=None):
+    """
+    Stadio pre-apertura: aggiorna la cache delle giornaliere, calcola ATR e input della size
+    e legge il calendario della sessione. Dopo il warm-up il percorso del trade non usa la rete
+    se non per l'invio degli ordini. Con più simboli le richieste storiche passano dalla coda di pacing.
+    Returns: SessionPlan (atr None se lo storico non basta)
+    """
+    today = today or datetime.now(market_tz).date()
+    cache_path = cache_path or DAILY_CACHE.format(symbol=contract.symbol.lower())
+
+    daily, added = await update_daily_bars(ib, contract, cache_path, today, pacing)
+    atr = None
+    if len(daily) >= ATR_PERIOD:
+        last = daily.tail(ATR_PERIOD)
+        atr = atr_from_daily(last['high'], last['low'], last['close'])
+
+    hours = await session_hours(ib, contract, today)
+    last_entry = last_entry_time
+    if hours is not None:
+        # Nelle giornate a chiusura anticipata l'ultimo ingresso si sposta di conseguenza
+        close = hours[1].astimezone(market_tz)
+        last_entry = min(last_entry_time, (close - timedelta(minutes=10)).time())
+
+    print(f"[{contract.symbol}] Warm-up {today}: {len(daily)} giornaliere in cache (+{added}), "
+          f"ATR={atr if atr is None else round(atr, 4)}, sessione={'chiusa' if hours is None else 'aperta'}")
+    return SessionPlan(
+        day=today,
+        atr=atr,
+        stop_distance=None if atr is None else atr * STOP_ATR_MULT,
+        account_size=account_size,
+        market_open=None if hours is None else hours[0].astimezone(market_tz),
+        market_close=None if hours is None else hours[1].astimezone(market_tz),
+        last_entry=last_entry,
+    )